@@ -0,0 +1,1358 @@
+#!/usr/bin/env python
+"""
+MDN Web Scraper のベンチマーク
+
+使い方:
+  python benchmark.py startup [--runs N] [--target-ms MS] [--importtime] -- <command...>
+  python benchmark.py rtt [--requests N] [--concurrency C]
+  python benchmark.py keepalive [--requests N]
+  python benchmark.py tail [--requests N] [--stall-probability P] [--stall-seconds S]
+  python benchmark.py fairness [--heavy-threads N] [--requests N]
+  python benchmark.py snapshot [--corpus PATH] [--pages N] [--revisions N] [--reads N]
+  python benchmark.py mirror [--pages N] [--changed P] [--bumped P] [--touched P] [--added N]
+  python benchmark.py client [--documents N] [--concurrency C] [--batch-size N]
+  python benchmark.py cluster [--nodes 1,2,4] [--pages N] [--requests N] [--concurrency C]
+  python benchmark.py memory [--requests N] [--concurrency C] [--max-rss-mb MB] [--track-memory]
+  python benchmark.py export [--pages N] [--format ndjson|arrow|parquet] [--concurrency C]
+  python benchmark.py locales [--pages N] [--requests N] [--locales ja,fr,...] [--translated P]
+
+例:
+  python benchmark.py startup -- python main.py --stdio
+  python benchmark.py startup --importtime -- python main.py --stdio
+  python benchmark.py rtt --requests 500 --concurrency 8
+  python benchmark.py keepalive --requests 2000
+  python benchmark.py tail --requests 400 --stall-probability 0.03
+  python benchmark.py fairness --heavy-threads 32
+  python benchmark.py snapshot --corpus ./snapshots
+  python benchmark.py mirror --pages 2000
+  python benchmark.py client --documents 500 --concurrency 8
+  python benchmark.py cluster --nodes 1,2,3,4 --pages 300
+  python benchmark.py memory --requests 400 --concurrency 16 --max-rss-mb 400
+  python benchmark.py export --pages 5000
+  python benchmark.py locales --requests 3000 --translated 0.2
+
+上流へのリクエストはローカルのスタブサーバー（StubUpstream）に向けるため、
+MDN 本体には一切アクセスしません。
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# stdio モードの初回応答までの目標時間（ミリ秒）
+STARTUP_TARGET_MS = 1000.0
+
+INITIALIZE_REQUEST = {
+    "jsonrpc": "2.0",
+    "id": 1,
+    "method": "initialize",
+    "params": {
+        "protocolVersion": "2024-11-05",
+        "capabilities": {},
+        "clientInfo": {"name": "mdn-scraper-benchmark", "version": "1.0.0"},
+    },
+}
+
+
+STUB_PAGE = """<!doctype html>
+<html><head><title>{name} - MDN</title>
+<meta name="description" content="Stub page for {name}.">
+{alternates}</head><body>
+<nav class="sidebar"><a href="/en-US/docs/Web">Web</a></nav>
+<main id="content"><article class="main-page-content">
+<h1>{name}</h1>
+{paragraphs}
+</article></main></body></html>
+"""
+
+
+# スタブが翻訳を持つロケール
+STUB_LOCALES = ("en-US", "de", "es", "fr", "ja", "ko", "pt-BR", "ru", "zh-CN", "zh-TW")
+
+
+class StubUpstream:
+    """
+    MDN を模したローカルのスタブサーバー
+
+    任意のパスに対して MDN 風のHTMLを返します。stall_probability を指定すると、
+    その確率で応答を stall_seconds 秒止めます（テールレイテンシの再現用）。
+
+    応答には ETag を付け、If-None-Match が一致すれば 304 を返します。versions でパスごとの
+    版を変えると本文が変わり、touched に含まれるパスはHTMLのコメントだけが変わります。
+
+    名前が "Huge" で始まるページは huge_paragraphs 段落で生成します（メモリの上限の検証用）。
+
+    /<ロケール>/docs/... のページは、en-US 以外は translated の割合だけ翻訳が存在するものとし、
+    存在しない翻訳には 404 を返します。各ページには存在する翻訳への hreflang の代替リンクを付けます。
+    """
+    def __init__(
+        self,
+        paragraphs: int = 50,
+        huge_paragraphs: int = 0,
+        delay: float = 0.0,
+        stall_probability: float = 0.0,
+        stall_seconds: float = 1.0,
+        seed: Optional[int] = None,
+        translated: float = 1.0
+    ):
+        self.paragraphs = paragraphs
+        self.huge_paragraphs = huge_paragraphs
+        self.delay = delay
+        self.stall_probability = stall_probability
+        self.stall_seconds = stall_seconds
+        self.stalls = 0
+        self._random = random.Random(seed)
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self.versions: Dict[str, int] = {}
+        self.translated = translated
+        self.not_found = 0
+        # パスごとの取得回数（404 を含む）
+        self.paths: Counter = Counter()
+        self.touched: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                    stub.paths[urlsplit(self.path).path] += 1
+                    stall = stub._random.random() < stub.stall_probability
+                    if stall:
+                        stub.stalls += 1
+                if stub.delay:
+                    time.sleep(stub.delay)
+                if stall:
+                    time.sleep(stub.stall_seconds)
+                if not stub.exists(self.path):
+                    with stub._lock:
+                        stub.not_found += 1
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = stub.render(self.path).encode()
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+                not_modified = self.headers.get("If-None-Match") == etag
+                with stub._lock:
+                    stub.not_modified += not_modified
+                    stub.bytes_sent += 0 if not_modified else len(body)
+                try:
+                    if not_modified:
+                        self.send_response(304)
+                        self.send_header("ETag", etag)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # ヘッジで負けたリクエストはクライアント側で切断される
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.origin = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def exists(self, path: str, locale: Optional[str] = None) -> bool:
+        """ページの翻訳が存在するか（locale を指定すると、パスのロケールをそれに置き換えて判定する）"""
+        parts = urlsplit(path).path.split("/", 3)
+        if len(parts) < 4 or parts[2] != "docs":
+            return True
+        locale = locale or parts[1]
+        if locale == "en-US":
+            return True
+        digest = hashlib.sha1(f"{locale}/{parts[3]}".encode()).digest()
+        return int.from_bytes(digest[:4], "big") < self.translated * 2 ** 32
+
+    def render(self, path: str) -> str:
+        path = urlsplit(path).path
+        name = path.rstrip("/").rsplit("/", 1)[-1] or "Index"
+        count = self.huge_paragraphs if self.huge_paragraphs and name.startswith("Huge") else self.paragraphs
+        paragraphs = "\n".join(
+            f"<p>{name} paragraph {i}: <code>{name}.example()</code> returns a value.</p>"
+            for i in range(count)
+        )
+        version = self.versions.get(path, 0)
+        if version:
+            paragraphs += f"\n<p>{name} was revised (version {version}).</p>"
+        if path in self.touched:
+            paragraphs += f"\n<!-- build {self.touched[path]} -->"
+        alternates = ""
+        parts = path.split("/", 3)
+        if len(parts) == 4 and parts[2] == "docs":
+            alternates = "".join(
+                f'<link rel="alternate" hreflang="{locale}" href="https://developer.mozilla.org/{locale}/docs/{parts[3]}">\n'
+                for locale in STUB_LOCALES if self.exists(path, locale)
+            )
+        return STUB_PAGE.format(name=name, paragraphs=paragraphs, alternates=alternates)
+
+    def __enter__(self) -> "StubUpstream":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def free_port() -> int:
+    """空いているTCPポートを取得する"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_env(upstream: StubUpstream, **extra: str) -> Dict[str, str]:
+    """スタブを上流とするサーバープロセス用の環境変数"""
+    env = dict(os.environ)
+    env["MDN_UPSTREAM"] = upstream.origin
+    env.update(extra)
+    return env
+
+
+def wait_for_port(port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+class StdioClient:
+    """
+    stdio MCPサーバーのクライアント
+
+    リクエストをパイプラインで送信し、応答を id で対応付けます。
+    """
+    def __init__(self, command: List[str], env: Optional[Dict[str, str]] = None):
+        self.proc = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=env,
+            cwd=HERE,
+        )
+        self._next_id = 0
+        self._waiters: Dict[int, list] = {}
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    def _read_loop(self) -> None:
+        for line in self.proc.stdout:
+            message = json.loads(line)
+            with self._lock:
+                waiter = self._waiters.pop(message.get("id"), None)
+            if waiter is not None:
+                waiter[1] = message
+                waiter[0].set()
+
+    def call(self, method: str, params: Optional[Dict] = None) -> Dict:
+        with self._lock:
+            self._next_id += 1
+            request_id = self._next_id
+            waiter = [threading.Event(), None]
+            self._waiters[request_id] = waiter
+            self.proc.stdin.write((json.dumps({
+                "jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}
+            }) + "\n").encode())
+            self.proc.stdin.flush()
+        waiter[0].wait()
+        return waiter[1]
+
+    def close(self) -> None:
+        self.proc.stdin.close()
+        self.proc.wait(timeout=10)
+
+
+def http_post_new_connection(port: int, path: str, payload: Dict) -> Dict:
+    """リクエストごとに新しいTCP接続を張ってPOSTする（従来のクライアントの挙動）"""
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    try:
+        conn.request("POST", path, body=json.dumps(payload), headers={"Content-Type": "application/json"})
+        return json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+
+
+class KeepAliveClient:
+    """1本の HTTP/1.1 接続を使い回してPOSTするクライアント"""
+    def __init__(self, port: int):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port)
+
+    def post(self, path: str, payload: Dict, headers: Optional[Dict[str, str]] = None) -> Dict:
+        self.conn.request(
+            "POST", path, body=json.dumps(payload), headers=dict({"Content-Type": "application/json"}, **(headers or {}))
+        )
+        return json.loads(self.conn.getresponse().read())
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def start_http_server(
+    upstream: StubUpstream,
+    script: str = "claude_desktop_mcp.py",
+    port: Optional[int] = None,
+    **extra_env: str
+) -> tuple:
+    """スタブを上流とする標準ライブラリ版HTTPサーバーを起動し、(プロセス, ポート) を返す"""
+    port = port or free_port()
+    proc = subprocess.Popen(
+        [sys.executable, script, "--http"],
+        env=server_env(upstream, PORT=str(port), **extra_env),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        cwd=HERE,
+    )
+    wait_for_port(port)
+    return proc, port
+
+
+def timed_run(func, count: int, concurrency: int) -> tuple:
+    """func を count 回実行し、(各回のレイテンシ, 全体の秒数) を返す"""
+    def one(_):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        samples = [one(i) for i in range(count)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(one, range(count)))
+    return samples, time.perf_counter() - start
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """サンプルのパーセンタイル値（最近傍法）"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """レイテンシ（秒）の要約統計をミリ秒で返す"""
+    return {
+        "n": len(samples),
+        "mean_ms": statistics.mean(samples) * 1000,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+
+
+def print_summary(label: str, samples: List[float]) -> None:
+    stats = summarize(samples)
+    print(
+        f"{label:<28} n={stats['n']:<5} mean={stats['mean_ms']:8.2f}ms "
+        f"p50={stats['p50_ms']:8.2f}ms p95={stats['p95_ms']:8.2f}ms "
+        f"p99={stats['p99_ms']:8.2f}ms max={stats['max_ms']:8.2f}ms"
+    )
+
+
+def measure_first_response(command: List[str]) -> float:
+    """
+    コマンドを起動し、initialize リクエストへの最初の応答までの時間を計測する
+
+    Args:
+        command: stdio MCPサーバーを起動するコマンド
+
+    Returns:
+        起動から初回応答までの秒数
+    """
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        command,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        proc.stdin.write((json.dumps(INITIALIZE_REQUEST) + "\n").encode())
+        proc.stdin.flush()
+        line = proc.stdout.readline()
+        elapsed = time.perf_counter() - start
+        if not line:
+            raise RuntimeError(f"No response from: {' '.join(command)}")
+        return elapsed
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def report_importtime(command: List[str], top: int = 15) -> None:
+    """
+    python -X importtime で読み込みに時間のかかるモジュールを表示する
+    """
+    if os.path.basename(command[0]).startswith("python"):
+        command = [command[0], "-X", "importtime"] + command[1:]
+    else:
+        command = [sys.executable, "-X", "importtime"] + command
+    proc = subprocess.Popen(
+        command,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        proc.stdin.write((json.dumps(INITIALIZE_REQUEST) + "\n").encode())
+        proc.stdin.flush()
+        proc.stdout.readline()
+    finally:
+        proc.kill()
+        _, stderr = proc.communicate()
+
+    rows = []
+    for line in stderr.decode(errors="replace").splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        parts = line.split("|")
+        self_us = int(parts[0].split(":", 1)[1])
+        cumulative_us = int(parts[1])
+        rows.append((cumulative_us, self_us, parts[2].rstrip()))
+
+    print(f"Slowest imports (cumulative) for: {' '.join(command)}")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:8.2f}ms  (self {self_us / 1000:6.2f}ms)  {name}")
+
+
+def run_startup(args) -> int:
+    samples = [measure_first_response(args.command) for _ in range(args.runs)]
+    print_summary("time-to-first-response", samples)
+    p50_ms = percentile(samples, 50) * 1000
+    verdict = "PASS" if p50_ms <= args.target_ms else "FAIL"
+    print(f"target p50 <= {args.target_ms:.0f}ms: {verdict}")
+    if args.importtime:
+        report_importtime(args.command)
+    return 0 if verdict == "PASS" else 1
+
+
+def run_rtt(args) -> int:
+    """stdio トランスポートと HTTP ハンドラーの往復レイテンシを比較する"""
+    url = "https://developer.mozilla.org/en-US/docs/Web/JavaScript/Reference/Global_Objects/Array"
+    tool_params = {"name": "fetch_mdn_page", "arguments": {"url": url}}
+
+    with StubUpstream() as upstream:
+        env = server_env(upstream)
+
+        http_proc, port = start_http_server(upstream)
+        stdio = StdioClient([sys.executable, "claude_desktop_mcp.py"], env=env)
+        try:
+            stdio.call("initialize")
+            # 1回目で上流から取得してキャッシュさせ、トランスポートのみを計測する
+            stdio.call("tools/call", tool_params)
+            http_post_new_connection(port, "/mcp", {"parameters": {"url": url}})
+
+            for concurrency in sorted({1, args.concurrency}):
+                http_samples, http_total = timed_run(
+                    lambda: http_post_new_connection(port, "/mcp", {"parameters": {"url": url}}),
+                    args.requests, concurrency,
+                )
+                stdio_samples, stdio_total = timed_run(
+                    lambda: stdio.call("tools/call", tool_params),
+                    args.requests, concurrency,
+                )
+                print(f"concurrency={concurrency}")
+                print_summary("  http /mcp", http_samples)
+                print(f"  {'':<26} throughput={args.requests / http_total:8.1f} req/s")
+                print_summary("  stdio tools/call", stdio_samples)
+                print(f"  {'':<26} throughput={args.requests / stdio_total:8.1f} req/s")
+        finally:
+            stdio.close()
+            http_proc.terminate()
+            http_proc.wait()
+    return 0
+
+
+def run_keepalive(args) -> int:
+    """接続を毎回張り直す場合と、持続的接続を再利用する場合のスループットを比較する"""
+    url = "https://developer.mozilla.org/en-US/docs/Web/API/Fetch_API"
+    payload = {"url": url}
+
+    with StubUpstream() as upstream:
+        proc, port = start_http_server(upstream)
+        try:
+            # キャッシュを温めてからトランスポートのみを計測する
+            http_post_new_connection(port, "/fetch-mdn", payload)
+
+            new_samples, new_total = timed_run(
+                lambda: http_post_new_connection(port, "/fetch-mdn", payload), args.requests, 1
+            )
+            client = KeepAliveClient(port)
+            try:
+                reused_samples, reused_total = timed_run(
+                    lambda: client.post("/fetch-mdn", payload), args.requests, 1
+                )
+            finally:
+                client.close()
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print_summary("new connection / request", new_samples)
+    print(f"  {'':<26} throughput={args.requests / new_total:8.1f} req/s")
+    print_summary("reused keep-alive conn", reused_samples)
+    print(f"  {'':<26} throughput={args.requests / reused_total:8.1f} req/s")
+    return 0
+
+
+def run_tail(args) -> int:
+    """上流がランダムに停止する場合のテールレイテンシを、ヘッジの有無で比較する"""
+    sys.path.insert(0, HERE)
+    from mdn_core.errors import FetchError
+    from mdn_core.fetch import Fetcher
+
+    url = "https://developer.mozilla.org/en-US/docs/Web/API/Fetch_API"
+    for hedge in (False, True):
+        with StubUpstream(
+            stall_probability=args.stall_probability, stall_seconds=args.stall_seconds, seed=args.seed
+        ) as upstream:
+            fetcher = Fetcher(origin=upstream.origin, hedge=hedge, hedge_ratio=args.hedge_ratio)
+            errors = 0
+
+            def fetch_once():
+                nonlocal errors
+                try:
+                    fetcher.fetch(url)
+                except FetchError:
+                    errors += 1
+
+            # パーセンタイルの計算に必要なサンプルを集める
+            for _ in range(args.warmup):
+                fetch_once()
+            samples, _ = timed_run(fetch_once, args.requests, args.concurrency)
+            stats = fetcher.stats()
+
+        print_summary("hedged" if hedge else "single request", samples)
+        print(
+            f"  {'':<26} stalls={upstream.stalls} hedged={stats['hedged']} "
+            f"hedge_wins={stats['hedge_wins']} errors={errors}"
+        )
+    return 0
+
+
+def run_fairness(args) -> int:
+    """
+    高負荷のクライアントがサーバーを飽和させている間の、行儀の良いクライアントのレイテンシを
+    公平なキューイングの有無で比較する
+    """
+    base = "https://developer.mozilla.org/en-US/docs/Fairness/"
+
+    def light_samples(port: int, prefix: str) -> List[float]:
+        client = KeepAliveClient(port)
+        samples = []
+        try:
+            for i in range(args.requests):
+                start = time.perf_counter()
+                client.post("/fetch-mdn", {"url": f"{base}{prefix}{i}"}, {"X-API-Key": "light"})
+                samples.append(time.perf_counter() - start)
+                time.sleep(args.interval)
+        finally:
+            client.close()
+        return samples
+
+    for label, slots in (("without fair queuing", "0"), ("with fair queuing", str(args.slots))):
+        with StubUpstream(delay=args.upstream_delay) as upstream:
+            proc, port = start_http_server(
+                upstream,
+                MDN_FAIR_SLOTS=slots,
+                MDN_WORK_SLOTS=str(args.slots),
+                MDN_PREFETCH="false",
+                MDN_CLIENT_REQUESTS_PER_MINUTE=str(args.heavy_rpm),
+                # 同じ接続元アドレスから送るため、APIキーで別のクライアントとして数える
+                MDN_CLIENT_API_KEYS="light,heavy",
+            )
+            stop = threading.Event()
+            counts = {"served": 0, "throttled": 0}
+            counts_lock = threading.Lock()
+
+            def heavy(worker: int) -> None:
+                client = KeepAliveClient(port)
+                i = 0
+                try:
+                    while not stop.is_set():
+                        i += 1
+                        response = client.post(
+                            "/fetch-mdn", {"url": f"{base}heavy-{worker}-{i}"}, {"X-API-Key": "heavy"}
+                        )
+                        with counts_lock:
+                            counts["throttled" if "retry_after" in response else "served"] += 1
+                        if "retry_after" in response:
+                            time.sleep(min(response["retry_after"], 0.5))
+                finally:
+                    client.close()
+
+            try:
+                alone = light_samples(port, f"{slots}-alone-")
+                threads = [threading.Thread(target=heavy, args=(n,), daemon=True) for n in range(args.heavy_threads)]
+                for thread in threads:
+                    thread.start()
+                time.sleep(0.5)
+                loaded = light_samples(port, f"{slots}-loaded-")
+                stop.set()
+                for thread in threads:
+                    thread.join()
+            finally:
+                proc.terminate()
+                proc.wait()
+
+        print(label)
+        print_summary("  light client alone", alone)
+        print_summary("  light client, heavy load", loaded)
+        print(f"  {'':<26} heavy served={counts['served']} throttled={counts['throttled']}")
+    return 0
+
+
+def record_corpus(pages: int, revisions: int, duplicates: float, seed: int) -> List[tuple]:
+    """
+    スタブのHTMLから抽出したドキュメントの版の列を作る
+
+    ページごとに段落数を変え、版ごとに数行を書き換えます。duplicates の割合のページは
+    別のURL（リダイレクト先など）からも同じ内容を取得したものとして加えます。
+
+    Returns:
+        保存する順の (URL, ドキュメント) のリスト
+    """
+    sys.path.insert(0, HERE)
+    from mdn_core.extract import Document, extract_document
+
+    rng = random.Random(seed)
+    stub = StubUpstream()
+    stub.server.server_close()
+    sections = ["Web/API", "Web/JavaScript/Reference/Global_Objects", "Web/CSS", "Web/HTML/Element"]
+    corpus = []
+    latest = {}
+    for i in range(pages):
+        url = f"https://developer.mozilla.org/en-US/docs/{rng.choice(sections)}/Page{i}"
+        stub.paragraphs = rng.randint(10, 120)
+        doc = extract_document(stub.render(url), url)
+        corpus.append((url, doc))
+        latest[url] = doc
+        if rng.random() < duplicates:
+            alias = url.replace("/Page", "/Alias")
+            corpus.append((alias, Document(alias, doc.title, doc.description, doc.text, doc.links)))
+    for revision in range(1, revisions):
+        for url, doc in list(latest.items()):
+            lines = doc.text.split("\n")
+            for _ in range(max(1, len(lines) // 30)):
+                n = rng.randrange(len(lines))
+                lines[n] = f"{lines[n]} (revised {revision})"
+            doc = Document(url, doc.title, doc.description, "\n".join(lines), doc.links)
+            corpus.append((url, doc))
+            latest[url] = doc
+    return corpus
+
+
+def load_corpus(path: str) -> List[tuple]:
+    """
+    記録済みのコーパスを読み込む
+
+    path がディレクトリの場合はスナップショットストア（MDN_SNAPSHOT_DIR）の全ての版を、
+    ファイルの場合は1行1件の Document.to_dict() 形式のJSONを読み込みます。
+    """
+    sys.path.insert(0, HERE)
+    from mdn_core.extract import Document
+    from mdn_core.snapshot import SnapshotStore
+
+    if os.path.isdir(path):
+        store = SnapshotStore(path, train_samples=0)
+        try:
+            return [
+                (url, store.get(url, n))
+                for url in store.urls()
+                for n in range(len(store.revisions(url)))
+            ]
+        finally:
+            store.close()
+    with open(path, encoding="utf-8") as f:
+        return [(data["url"], Document.from_dict(data)) for data in map(json.loads, f) if data]
+
+
+def run_snapshot(args) -> int:
+    """スナップショットストアの圧縮率と読み込みレイテンシを、辞書と差分の有無で比較する"""
+    import shutil
+    import tempfile
+
+    sys.path.insert(0, HERE)
+    from mdn_core.snapshot import SnapshotStore, encode_document
+
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+        source = args.corpus
+    else:
+        corpus = record_corpus(args.pages, args.revisions, args.duplicates, args.seed)
+        source = "synthetic (stub pages)"
+    raw = sum(len(encode_document(doc)) for _, doc in corpus)
+    print(f"corpus: {source}, {len(corpus)} documents, {len({url for url, _ in corpus})} urls, {raw / 1e6:.2f} MB")
+
+    modes = (
+        ("per-document", 0, 0),
+        ("+ dictionary", args.train, 0),
+        ("+ dictionary + deltas", args.train, args.max_delta_chain),
+    )
+    rng = random.Random(args.seed)
+    for label, train, chain in modes:
+        directory = tempfile.mkdtemp(prefix="mdn-snapshot-")
+        try:
+            store = SnapshotStore(
+                directory, codec=args.codec, train_samples=train, max_delta_chain=chain
+            )
+            start = time.perf_counter()
+            for url, doc in corpus:
+                store.put(url, doc)
+            write_seconds = time.perf_counter() - start
+            stats = store.stats()
+            store.close()
+
+            # 開き直して、索引の読み込みとランダムな版の読み込みを計測する
+            start = time.perf_counter()
+            store = SnapshotStore(directory, codec=args.codec, train_samples=0)
+            open_ms = (time.perf_counter() - start) * 1000
+            targets = [(url, rng.randrange(len(store.revisions(url)))) for url in rng.choices(store.urls(), k=args.reads)]
+            samples = []
+            for url, n in targets:
+                start = time.perf_counter()
+                store.get(url, n)
+                samples.append(time.perf_counter() - start)
+            store.close()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        print(label)
+        print(
+            f"  {'':<26} codec={stats['codec']} ratio={stats['ratio']:.1f}x "
+            f"stored={stats['stored_bytes'] / 1e6:.2f}MB blobs={stats['blobs']} deltas={stats['deltas']} "
+            f"dedup_hits={stats['dedup_hits']} write={len(corpus) / write_seconds:.0f} docs/s open={open_ms:.1f}ms"
+        )
+        print_summary("  random read", samples)
+    return 0
+
+
+def write_sitemap(path: str, entries: Dict[str, str]) -> None:
+    """URLと lastmod からサイトマップ（.xml.gz）のフィクスチャを書き出す"""
+    import gzip
+    from xml.sax.saxutils import escape
+
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+        for url, lastmod in entries.items():
+            f.write(f"<url><loc>{escape(url)}</loc><lastmod>{lastmod}</lastmod></url>\n")
+        f.write("</urlset>\n")
+
+
+def run_mirror(args) -> int:
+    """
+    ローカルのサイトマップのフィクスチャに対して、初回のミラーと差分更新の上流への負荷を比較する
+
+    差分更新の前に、一部のページの内容を変え（changed）、lastmod だけを更新し（bumped）、
+    HTMLのコメントだけを変え（touched）、新しいページを追加します（added）。
+    """
+    import shutil
+    import tempfile
+
+    sys.path.insert(0, HERE)
+    from mdn_core.fetch import Fetcher
+    from mdn_core.pipeline import MDNPipeline
+    from mdn_core.snapshot import SnapshotStore
+
+    rng = random.Random(args.seed)
+    base = "https://developer.mozilla.org/en-US/docs/Web/API/Mirror"
+    directory = tempfile.mkdtemp(prefix="mdn-mirror-")
+    sitemap = os.path.join(directory, "sitemap.xml.gz")
+    entries = {f"{base}{i}": "2024-01-01T00:00:00Z" for i in range(args.pages)}
+    try:
+        with StubUpstream(paragraphs=40) as upstream:
+            store = SnapshotStore(os.path.join(directory, "store"))
+            pipeline = MDNPipeline(fetcher=Fetcher(origin=upstream.origin, hedge=False), snapshots=store)
+            pipeline.mirror.concurrency = args.concurrency
+
+            def measured(label: str) -> None:
+                requests, sent = upstream.requests, upstream.bytes_sent
+                result = pipeline.mirror.refresh(sitemap)
+                print(label)
+                print(
+                    f"  {'':<26} upstream requests={upstream.requests - requests} "
+                    f"bytes={(upstream.bytes_sent - sent) / 1e6:.2f}MB seconds={result['seconds']:.2f}"
+                )
+                outcomes = " ".join(f"{name}={value}" for name, value in result.items() if name != "seconds")
+                print(f"  {'':<26} {outcomes}")
+
+            write_sitemap(sitemap, entries)
+            measured("initial mirror (full crawl)")
+
+            urls = list(entries)
+            rng.shuffle(urls)
+            counts = [int(len(urls) * share) for share in (args.changed, args.bumped, args.touched)]
+            changed, rest = urls[:counts[0]], urls[counts[0]:]
+            bumped, rest = rest[:counts[1]], rest[counts[1]:]
+            touched = rest[:counts[2]]
+            for url in changed:
+                upstream.versions[urlsplit(url).path] = 1
+            for url in touched:
+                upstream.touched[urlsplit(url).path] = 1
+            for url in changed + bumped + touched:
+                entries[url] = "2024-02-01T00:00:00Z"
+            for i in range(args.added):
+                entries[f"{base}New{i}"] = "2024-02-01T00:00:00Z"
+            write_sitemap(sitemap, entries)
+            measured(f"incremental refresh ({len(changed)} changed, {len(bumped)} bumped, "
+                     f"{len(touched)} touched, {args.added} added)")
+            measured("incremental refresh (no changes)")
+            store.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+def run_client(args) -> int:
+    """
+    クライアントSDK（mdn_client.py）のスループットを、ローカルのサーバーに対して計測する
+
+    1リクエストごとに接続を作る従来のクライアント、接続プールで1件ずつ並行に取得する場合、
+    一括取得を使う場合、取得済みのドキュメントを ETag で再検証する場合を比較します。
+    サーバー側のキャッシュを温めてから計測するため、差はクライアントとトランスポートによるものです。
+    """
+    import asyncio
+
+    import httpx
+
+    sys.path.insert(0, HERE)
+    from mdn_client import MDNClient
+
+    base = "https://developer.mozilla.org/en-US/docs/Web/API/Client"
+    urls = [f"{base}{i}" for i in range(args.documents)]
+
+    async def per_call_client(server: str) -> None:
+        # client_example.py の以前の実装と同じく、呼び出しごとに AsyncClient を作る
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one(url: str) -> None:
+            async with semaphore:
+                async with httpx.AsyncClient() as client:
+                    response = await client.post(f"{server}/fetch-mdn", json={"url": url})
+                    response.raise_for_status()
+
+        await asyncio.gather(*(one(url) for url in urls))
+
+    async def measure(server: str) -> None:
+        async with MDNClient(server, concurrency=args.concurrency, batch_size=args.batch_size) as warm:
+            await warm.fetch_many(urls)
+
+        def report(label: str, seconds: float, stats: Optional[Dict[str, int]] = None) -> None:
+            detail = " ".join(f"{name}={value}" for name, value in (stats or {}).items())
+            print(f"{label:<28} {len(urls) / seconds:8.1f} docs/s  {seconds:6.2f}s  {detail}")
+
+        start = time.perf_counter()
+        await per_call_client(server)
+        report("new client per request", time.perf_counter() - start)
+
+        for label, use_batch in (("pooled, one request per URL", False), ("pooled, batch endpoint", True)):
+            async with MDNClient(
+                server, concurrency=args.concurrency, batch_size=args.batch_size, use_batch=use_batch
+            ) as client:
+                start = time.perf_counter()
+                await client.fetch_many(urls)
+                report(label, time.perf_counter() - start, dict(client.stats))
+                start = time.perf_counter()
+                await client.fetch_many(urls)
+                report("  revalidate (ETag)", time.perf_counter() - start, dict(client.stats))
+
+    with StubUpstream() as upstream:
+        proc, port = start_http_server(upstream, MDN_PREFETCH="false", MDN_CLIENT_REQUESTS_PER_MINUTE="0")
+        try:
+            asyncio.run(measure(f"http://127.0.0.1:{port}"))
+        finally:
+            proc.terminate()
+            proc.wait()
+    return 0
+
+
+def run_cluster(args) -> int:
+    """
+    ローカルで複数ノードを起動し、ラウンドロビンで振り分けたリクエストによる上流への取得回数を、
+    各ノードが個別にキャッシュする場合とクラスターモードで比較する
+
+    アクセスするページは Zipf 分布で選ぶため、一部のページはホットキーとして複製されます。
+    """
+    rng = random.Random(args.seed)
+    base = "https://developer.mozilla.org/en-US/docs/Web/API/Cluster"
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(args.pages)]
+    paths = [f"{base}{i}" for i in rng.choices(range(args.pages), weights, k=args.requests)]
+    node_counts = [int(count) for count in args.nodes.split(",")]
+
+    def stats(port: int) -> Dict:
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        try:
+            conn.request("GET", "/metrics")
+            return json.loads(conn.getresponse().read())
+        finally:
+            conn.close()
+
+    print(f"{args.requests} requests over {args.pages} pages (zipf {args.zipf}), round-robin across nodes")
+    for nodes in node_counts:
+        for label, clustered in (("independent caches", False), ("cluster", True)):
+            ports = [free_port() for _ in range(nodes)]
+            peers = ",".join(f"http://127.0.0.1:{port}" for port in ports)
+            with StubUpstream(delay=args.upstream_delay) as upstream:
+                procs = []
+                try:
+                    for port in ports:
+                        extra = {"MDN_PREFETCH": "false", "MDN_CLIENT_REQUESTS_PER_MINUTE": "0"}
+                        if clustered:
+                            extra.update(
+                                MDN_CLUSTER_PEERS=peers,
+                                MDN_CLUSTER_SELF=f"http://127.0.0.1:{port}",
+                                MDN_CLUSTER_SECRET="benchmark"
+                            )
+                        procs.append(start_http_server(upstream, port=port, **extra)[0])
+
+                    local = threading.local()
+
+                    def request(index: int) -> float:
+                        # 各スレッドがノードごとに1本の持続的接続を使う
+                        clients = getattr(local, "clients", None)
+                        if clients is None:
+                            clients = local.clients = [KeepAliveClient(port) for port in ports]
+                        start = time.perf_counter()
+                        clients[index % nodes].post("/fetch-mdn", {"url": paths[index]})
+                        return time.perf_counter() - start
+
+                    started = time.perf_counter()
+                    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                        samples = list(pool.map(request, range(args.requests)))
+                    elapsed = time.perf_counter() - started
+                    clusters = [stats(port)["cluster"] or {} for port in ports]
+                finally:
+                    for proc in procs:
+                        proc.terminate()
+                        proc.wait()
+
+            print(f"{nodes} node(s), {label}")
+            print_summary("  request latency", samples)
+            line = f"  {'':<26} upstream fetches={upstream.requests} requests/sec={args.requests / elapsed:.0f}"
+            if clustered:
+                line += (
+                    f" peer loads={sum(c.get('peer_loads', 0) for c in clusters)}"
+                    f" hot replicas={sum(c.get('hot_replicas', 0) for c in clusters)}"
+                )
+            print(line)
+    return 0
+
+
+def process_rss(pid: int) -> int:
+    """プロセスの常駐メモリ（バイト、Linux のみ）"""
+    with open(f"/proc/{pid}/statm", "rb") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def run_memory(args) -> int:
+    """
+    大きなページへの並行リクエストで、サーバーの常駐メモリ（RSS）が上限内に収まることを確認するストレステスト
+
+    上限内の大きなページと、MDN_FETCH_MAX_BYTES を超える巨大なページを混ぜて並行に要求し、
+    サーバープロセスのRSSを一定間隔で採取します。RSSの最大値が --max-rss-mb を超えた場合は
+    終了コード1で失敗します。
+    """
+    base = "https://developer.mozilla.org/en-US/docs/Web/API/"
+    rng = random.Random(args.seed)
+    urls = [
+        f"{base}{'Huge' if rng.random() < args.huge_ratio else 'Large'}{i}"
+        for i in range(args.requests)
+    ]
+    with StubUpstream(paragraphs=args.paragraphs, huge_paragraphs=args.huge_paragraphs) as upstream:
+        page_mb = len(upstream.render("/Large").encode()) / 1e6
+        huge_mb = len(upstream.render("/Huge").encode()) / 1e6
+        proc, port = start_http_server(
+            upstream,
+            MDN_PREFETCH="false",
+            MDN_CLIENT_REQUESTS_PER_MINUTE="0",
+            MDN_CLIENT_BYTES_PER_MINUTE="0",
+            MDN_FETCH_MAX_BYTES=str(args.max_bytes_mb * 1024 * 1024),
+            MDN_CACHE_MAX_BYTES=str(args.cache_mb * 1024 * 1024),
+            MDN_MEMORY_TRACKING="true" if args.track_memory else "false",
+        )
+        baseline = process_rss(proc.pid)
+        rss_samples = [baseline]
+        stop = threading.Event()
+
+        def sample_rss() -> None:
+            while not stop.wait(0.05):
+                rss_samples.append(process_rss(proc.pid))
+
+        sampler = threading.Thread(target=sample_rss, daemon=True)
+        sampler.start()
+        outcomes = {"ok": 0, "rejected": 0, "error": 0}
+        outcomes_lock = threading.Lock()
+        local = threading.local()
+
+        def request(url: str) -> None:
+            client = getattr(local, "client", None)
+            if client is None:
+                client = local.client = KeepAliveClient(port)
+            response = client.post("/fetch-mdn", {"url": url})
+            error = response.get("error") or ""
+            outcome = "ok" if not error else "rejected" if "exceeds" in error or "Failed to fetch" in error else "error"
+            with outcomes_lock:
+                outcomes[outcome] += 1
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                list(pool.map(request, urls))
+            elapsed = time.perf_counter() - started
+            stop.set()
+            sampler.join()
+            conn = http.client.HTTPConnection("127.0.0.1", port)
+            conn.request("GET", "/metrics")
+            metrics = json.loads(conn.getresponse().read())
+            conn.close()
+        finally:
+            stop.set()
+            proc.terminate()
+            proc.wait()
+
+    peak_rss = max(rss_samples)
+    memory = metrics["memory"]
+    print(f"{args.requests} requests, concurrency {args.concurrency}: "
+          f"pages {page_mb:.1f}MB, huge pages {huge_mb:.1f}MB (limit {args.max_bytes_mb}MB)")
+    print(f"  outcomes                   ok={outcomes['ok']} rejected={outcomes['rejected']} "
+          f"error={outcomes['error']} seconds={elapsed:.1f}")
+    print(f"  upstream rejected          too_large={metrics['fetch']['too_large']}")
+    print(f"  cache                      entries={metrics['cache']['entries']} "
+          f"bytes={metrics['cache']['bytes'] / 2 ** 20:.1f}MiB (limit {args.cache_mb}MiB)")
+    if memory.get("measured"):
+        print(f"  per-request peak (traced)  p50={memory['peak_p50_bytes'] / 1e6:.1f}MB "
+              f"p95={memory['peak_p95_bytes'] / 1e6:.1f}MB max={memory['max_peak_bytes'] / 1e6:.1f}MB "
+              f"measured={memory['measured']} skipped={memory['skipped']}")
+    print(f"  server RSS                 baseline={baseline / 1e6:.1f}MB peak={peak_rss / 1e6:.1f}MB "
+          f"(limit {args.max_rss_mb}MB)")
+    if peak_rss > args.max_rss_mb * 1024 * 1024:
+        print("FAIL: RSS exceeded the limit")
+        return 1
+    print("OK: RSS stayed within the limit")
+    return 0
+
+
+def run_export(args) -> int:
+    """
+    ミラー済みのコーパスを /fetch-mdn でページごとに取得する場合と、/export で一括して取得する場合の比較
+
+    スタブのページから作ったコーパスをスナップショットストアに保存してサーバーを起動し、
+    /export のスループットとサーバーの常駐メモリ（RSS）の増加を、データファイルを
+    順に読むだけの速さ（ディスクの上限の目安）と並べて表示します。
+    """
+    import shutil
+    import tempfile
+
+    sys.path.insert(0, HERE)
+    from mdn_core.snapshot import SnapshotStore
+
+    corpus = record_corpus(args.pages, 1, 0.0, args.seed)
+    directory = tempfile.mkdtemp(prefix="mdn-export-")
+    try:
+        store = SnapshotStore(directory)
+        for url, doc in corpus:
+            store.put(url, doc)
+        stats = store.stats()
+        store.close()
+        urls = [url for url, _ in corpus]
+        data_path = os.path.join(directory, "blobs.dat")
+        start = time.perf_counter()
+        with open(data_path, "rb") as f:
+            while f.read(1024 * 1024):
+                pass
+        disk_seconds = time.perf_counter() - start
+        print(f"corpus: {len(urls)} documents, raw {stats['raw_bytes'] / 1e6:.1f}MB, "
+              f"stored {stats['stored_bytes'] / 1e6:.1f}MB ({stats['codec']})")
+        print(f"  sequential read of blobs.dat        {stats['stored_bytes'] / 1e6 / disk_seconds:.0f} MB/s")
+
+        with StubUpstream() as upstream:
+            proc, port = start_http_server(
+                upstream,
+                MDN_SNAPSHOT_DIR=directory,
+                MDN_PREFETCH="false",
+                MDN_CLIENT_REQUESTS_PER_MINUTE="0",
+                MDN_CLIENT_BYTES_PER_MINUTE="0",
+            )
+            try:
+                baseline = process_rss(proc.pid)
+                rss_samples = [baseline]
+                stop = threading.Event()
+
+                def sample_rss() -> None:
+                    while not stop.wait(0.02):
+                        rss_samples.append(process_rss(proc.pid))
+
+                sampler = threading.Thread(target=sample_rss, daemon=True)
+                sampler.start()
+                conn = http.client.HTTPConnection("127.0.0.1", port)
+                start = time.perf_counter()
+                conn.request("GET", f"/export?format={args.format}&source=snapshot")
+                response = conn.getresponse()
+                if response.status != 200:
+                    print(f"export failed: {response.status} {response.read().decode()}")
+                    return 1
+                exported = 0
+                lines = 0
+                while True:
+                    chunk = response.read(64 * 1024)
+                    if not chunk:
+                        break
+                    exported += len(chunk)
+                    lines += chunk.count(b"\n")
+                export_seconds = time.perf_counter() - start
+                conn.close()
+                stop.set()
+                sampler.join()
+                documents = lines if args.format == "ndjson" else len(urls)
+                print(f"  GET /export ({args.format:<7})             {documents / export_seconds:.0f} docs/s "
+                      f"{exported / 1e6 / export_seconds:.1f} MB/s ({exported / 1e6:.1f}MB, {export_seconds:.2f}s)")
+                print(f"  server RSS during export            baseline={baseline / 1e6:.1f}MB "
+                      f"peak={max(rss_samples) / 1e6:.1f}MB")
+
+                local = threading.local()
+
+                def fetch(url: str) -> None:
+                    client = getattr(local, "client", None)
+                    if client is None:
+                        client = local.client = KeepAliveClient(port)
+                    client.post("/fetch-mdn", {"url": url})
+
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                    list(pool.map(fetch, urls))
+                fetch_seconds = time.perf_counter() - start
+                print(f"  POST /fetch-mdn (concurrency {args.concurrency:<2})     "
+                      f"{len(urls) / fetch_seconds:.0f} docs/s ({fetch_seconds:.2f}s)")
+            finally:
+                proc.terminate()
+                proc.wait()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+def run_locales(args) -> int:
+    """
+    翻訳が一部にしか無いページをいくつかのロケールで要求し、クライアントが 404 を受けてから en-US で
+    取得し直す場合と、サーバー側のロケールのフォールバックを使う場合の上流への取得回数を比較する
+
+    フォールバックでは、同じページの en-US 版が要求したロケールの数によらず1回だけ取得されることも確認します。
+    """
+    rng = random.Random(args.seed)
+    locales = args.locales.split(",")
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(args.pages)]
+    pages = rng.choices(range(args.pages), weights, k=args.requests)
+    requests = [
+        (f"https://developer.mozilla.org/{rng.choice(locales)}/docs/Web/API/Locale{page}",
+         f"https://developer.mozilla.org/en-US/docs/Web/API/Locale{page}")
+        for page in pages
+    ]
+    print(
+        f"{args.requests} requests over {args.pages} pages (zipf {args.zipf}) in {','.join(locales)}, "
+        f"{args.translated:.0%} translated"
+    )
+    for label, fallback in (("client retries on 404", False), ("server-side fallback", True)):
+        with StubUpstream(delay=args.upstream_delay, translated=args.translated) as upstream:
+            proc, port = start_http_server(
+                upstream,
+                MDN_PREFETCH="false",
+                MDN_CLIENT_REQUESTS_PER_MINUTE="0",
+                # ヘッジによる重複した取得を数えないようにする
+                MDN_FETCH_HEDGE="false",
+                MDN_LOCALE_FALLBACK=str(fallback).lower(),
+            )
+            local = threading.local()
+            round_trips = Counter()
+
+            def request(index: int) -> float:
+                client = getattr(local, "client", None)
+                if client is None:
+                    client = local.client = KeepAliveClient(port)
+                url, english = requests[index]
+                start = time.perf_counter()
+                response = client.post("/fetch-mdn", {"url": url})
+                round_trips[index] = 1
+                if response.get("status") != "success":
+                    client.post("/fetch-mdn", {"url": english})
+                    round_trips[index] = 2
+                return time.perf_counter() - start
+
+            try:
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                    samples = list(pool.map(request, range(args.requests)))
+                elapsed = time.perf_counter() - started
+            finally:
+                proc.terminate()
+                proc.wait()
+
+        english = {path: count for path, count in upstream.paths.items() if path.startswith("/en-US/")}
+        print(label)
+        print_summary("  request latency", samples)
+        print(
+            f"  {'':<26} upstream fetches={upstream.requests} 404s={upstream.not_found} "
+            f"client round trips={sum(round_trips.values())} requests/sec={args.requests / elapsed:.0f}"
+        )
+        print(
+            f"  {'':<26} en-US pages fetched={len(english)} "
+            f"duplicate en-US fetches={sum(count - 1 for count in english.values())}"
+        )
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="MDN Web Scraper benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    startup = subparsers.add_parser("startup", help="cold start to first stdio MCP response")
+    startup.add_argument("--runs", type=int, default=10)
+    startup.add_argument("--target-ms", type=float, default=STARTUP_TARGET_MS)
+    startup.add_argument("--importtime", action="store_true", help="also report python -X importtime")
+    startup.add_argument("command", nargs=argparse.REMAINDER)
+    startup.set_defaults(func=run_startup)
+
+    rtt = subparsers.add_parser("rtt", help="stdio vs HTTP round-trip latency")
+    rtt.add_argument("--requests", type=int, default=200)
+    rtt.add_argument("--concurrency", type=int, default=8)
+    rtt.set_defaults(func=run_rtt)
+
+    keepalive = subparsers.add_parser("keepalive", help="requests/sec over a reused HTTP/1.1 connection")
+    keepalive.add_argument("--requests", type=int, default=1000)
+    keepalive.set_defaults(func=run_keepalive)
+
+    tail = subparsers.add_parser("tail", help="upstream tail latency with and without hedged requests")
+    tail.add_argument("--requests", type=int, default=400)
+    tail.add_argument("--concurrency", type=int, default=4)
+    tail.add_argument("--warmup", type=int, default=50)
+    tail.add_argument("--stall-probability", type=float, default=0.03)
+    tail.add_argument("--stall-seconds", type=float, default=1.0)
+    tail.add_argument("--hedge-ratio", type=float, default=0.1)
+    tail.add_argument("--seed", type=int, default=1)
+    tail.set_defaults(func=run_tail)
+
+    fairness = subparsers.add_parser("fairness", help="light-client latency while a heavy client saturates the server")
+    fairness.add_argument("--requests", type=int, default=50, help="requests sent by the light client")
+    fairness.add_argument("--interval", type=float, default=0.02, help="pause between light-client requests")
+    fairness.add_argument("--heavy-threads", type=int, default=32)
+    fairness.add_argument("--heavy-rpm", type=float, default=0, help="per-client request quota (0 = unlimited)")
+    fairness.add_argument("--slots", type=int, default=4)
+    fairness.add_argument("--upstream-delay", type=float, default=0.02)
+    fairness.set_defaults(func=run_fairness)
+
+    snapshot = subparsers.add_parser("snapshot", help="snapshot store compression ratio and read latency")
+    snapshot.add_argument("--corpus", help="snapshot directory or JSONL of recorded documents (default: synthetic)")
+    snapshot.add_argument("--pages", type=int, default=500)
+    snapshot.add_argument("--revisions", type=int, default=3, help="versions per page in the synthetic corpus")
+    snapshot.add_argument("--duplicates", type=float, default=0.1, help="share of pages also stored under an alias URL")
+    snapshot.add_argument("--reads", type=int, default=2000)
+    snapshot.add_argument("--codec", default="auto", choices=["auto", "zstd", "zlib"])
+    snapshot.add_argument("--train", type=int, default=64, help="documents stored before training the dictionary")
+    snapshot.add_argument("--max-delta-chain", type=int, default=8)
+    snapshot.add_argument("--seed", type=int, default=1)
+    snapshot.set_defaults(func=run_snapshot)
+
+    mirror = subparsers.add_parser("mirror", help="upstream load of incremental mirror refresh vs a full crawl")
+    mirror.add_argument("--pages", type=int, default=1000)
+    mirror.add_argument("--changed", type=float, default=0.02, help="share of pages whose content changes")
+    mirror.add_argument("--bumped", type=float, default=0.03, help="share of pages whose lastmod changes without content")
+    mirror.add_argument("--touched", type=float, default=0.01, help="share of pages whose HTML changes outside the content")
+    mirror.add_argument("--added", type=int, default=10, help="new pages added to the sitemap")
+    mirror.add_argument("--concurrency", type=int, default=4)
+    mirror.add_argument("--seed", type=int, default=1)
+    mirror.set_defaults(func=run_mirror)
+
+    client = subparsers.add_parser("client", help="client SDK throughput: per-call client vs pooled vs batch")
+    client.add_argument("--documents", type=int, default=500)
+    client.add_argument("--concurrency", type=int, default=8)
+    client.add_argument("--batch-size", type=int, default=25)
+    client.set_defaults(func=run_client)
+
+    cluster = subparsers.add_parser("cluster", help="upstream fetches with independent node caches vs cluster mode")
+    cluster.add_argument("--nodes", default="1,2,4", help="comma-separated node counts to compare")
+    cluster.add_argument("--pages", type=int, default=300)
+    cluster.add_argument("--requests", type=int, default=3000)
+    cluster.add_argument("--zipf", type=float, default=1.0, help="skew of page popularity")
+    cluster.add_argument("--concurrency", type=int, default=8)
+    cluster.add_argument("--upstream-delay", type=float, default=0.005)
+    cluster.add_argument("--seed", type=int, default=1)
+    cluster.set_defaults(func=run_cluster)
+
+    memory = subparsers.add_parser("memory", help="stress test: server RSS stays bounded under concurrent large pages")
+    memory.add_argument("--requests", type=int, default=200)
+    memory.add_argument("--concurrency", type=int, default=16)
+    memory.add_argument("--paragraphs", type=int, default=20000, help="paragraphs per large page (~2MB)")
+    memory.add_argument("--huge-paragraphs", type=int, default=120000, help="paragraphs per huge page (over the limit)")
+    memory.add_argument("--huge-ratio", type=float, default=0.2, help="share of requests for huge pages")
+    memory.add_argument("--max-bytes-mb", type=int, default=8, help="MDN_FETCH_MAX_BYTES for the server")
+    memory.add_argument("--cache-mb", type=int, default=64, help="MDN_CACHE_MAX_BYTES for the server")
+    memory.add_argument("--max-rss-mb", type=float, default=400)
+    memory.add_argument("--track-memory", action="store_true", help="also report tracemalloc per-request peaks (slower)")
+    memory.add_argument("--seed", type=int, default=1)
+    memory.set_defaults(func=run_memory)
+
+    export = subparsers.add_parser("export", help="bulk /export throughput and memory vs page-by-page /fetch-mdn")
+    export.add_argument("--pages", type=int, default=2000)
+    export.add_argument("--format", default="ndjson", choices=["ndjson", "arrow", "parquet"])
+    export.add_argument("--concurrency", type=int, default=8, help="concurrent /fetch-mdn clients for the comparison")
+    export.add_argument("--seed", type=int, default=1)
+    export.set_defaults(func=run_export)
+
+    locales = subparsers.add_parser("locales", help="upstream fetches with client-side 404 retries vs locale fallback")
+    locales.add_argument("--pages", type=int, default=300)
+    locales.add_argument("--requests", type=int, default=3000)
+    locales.add_argument("--locales", default="ja,fr,zh-CN,ko,es", help="comma-separated locales to request")
+    locales.add_argument("--translated", type=float, default=0.3, help="share of pages translated per locale")
+    locales.add_argument("--zipf", type=float, default=1.1)
+    locales.add_argument("--concurrency", type=int, default=8)
+    locales.add_argument("--upstream-delay", type=float, default=0.01)
+    locales.add_argument("--seed", type=int, default=1)
+    locales.set_defaults(func=run_locales)
+
+    args = parser.parse_args()
+    if args.benchmark == "startup":
+        if args.command and args.command[0] == "--":
+            args.command = args.command[1:]
+        if not args.command:
+            args.command = [sys.executable, "main.py", "--stdio"]
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
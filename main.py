@@ -5,35 +5,63 @@ MDN Web Scraper MCPサーバーのエントリーポイント
 このスクリプトはMDN Web Scraper MCPサーバーを起動します。
 MCPプロトコルに準拠し、MDNウェブドキュメントをスクレイピングして
 LLMアプリケーションに適したコンテキストとして提供します。
+
+使い方:
+  python main.py            # HTTPサーバー（FastAPI + SSE）として起動
+  python main.py --stdio    # stdio MCPサーバーとして起動（Claude Desktop向け）
+
+stdio モードは FastAPI / uvicorn を読み込まず、MCPサーバーのみを構築するため
+Claude Desktop からの起動が速くなります。環境変数 MCP_TRANSPORT=stdio でも指定できます。
 """
 
 import os
-import uvicorn
-from typing import Optional
+import sys
 
-def main():
+def run_stdio():
     """
-    MDN Web Scraper MCPサーバーのエントリーポイント
+    stdio MCPサーバーとして起動する
+
+    重いモジュール（MCP SDK）はここで初めて読み込みます。
     """
+    from mcp_app import mcp
+
+    mcp.run("stdio")
+
+def run_http():
+    """
+    HTTPサーバー（FastAPI + SSE）として起動する
+    """
+    import uvicorn
+
     print("Starting MDN Web Scraper MCP Server...")
-    
+
     # 環境変数からホストとポートを取得（デフォルト値あり）
     host = os.environ.get("HOST", "127.0.0.1")
     port = int(os.environ.get("PORT", 8000))
-    
+    reload = os.environ.get("DEBUG", "").lower() == "true"
+
     print(f"Server running at: http://{host}:{port}")
     print("Available endpoints:")
     print(f"  - POST http://{host}:{port}/fetch-mdn")
     print(f"  - GET  http://{host}:{port}/health")
     print(f"  - MCP  http://{host}:{port}/mcp")
-    
-    # FastAPIアプリケーションをuvicornで起動
-    uvicorn.run(
-        "server:app", 
-        host=host, 
-        port=port, 
-        reload=os.environ.get("DEBUG", "").lower() == "true"
-    )
+
+    # リロード時のみ uvicorn のインポート文字列による読み込みが必要
+    if reload:
+        uvicorn.run("server:app", host=host, port=port, reload=True)
+    else:
+        from server import app
+
+        uvicorn.run(app, host=host, port=port)
+
+def main():
+    """
+    MDN Web Scraper MCPサーバーのエントリーポイント
+    """
+    if "--stdio" in sys.argv[1:] or os.environ.get("MCP_TRANSPORT", "").lower() == "stdio":
+        run_stdio()
+    else:
+        run_http()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,101 @@
+"""
+MCPサーバー（ツール・リソース）の定義
+
+FastAPI版（server.py）は SSE トランスポートとしてマウントし、
+Claude Desktop から起動される stdio モード（main.py --stdio）は
+FastAPI アプリを構築せずにこのモジュールだけを読み込みます。
+"""
+
+# MCP SDK をインポート
+from mcp.server.fastmcp import FastMCP, Context
+
+from mdn_core import get_resolver, is_mdn_url, resource_url
+from mdn_core.admission import QuotaExceededError, client_identity
+from mdn_core.prefetch import navigation
+from mdn_core.stdio_transport import STDIO_CLIENT
+from web_scraper import fetch_mdn_doc
+
+# MCP サーバーの初期化
+mcp = FastMCP("MDN Web Scraper", 
+              description="MDNウェブドキュメントをスクレイピングして提供するMCPサーバー")
+
+async def _fetch(url: str, failure: str) -> str:
+    """
+    ドキュメントを取得する（失敗した場合は failure を返す）
+
+    SSE（server.py）で受けたリクエストは、HTTPのエンドポイントと同じくクライアントごとの
+    クォータと公平なキューイングを通します。stdio のクライアントは1つだけのため通しません。
+    """
+    request = _http_request()
+    if request is None:
+        with navigation(STDIO_CLIENT):
+            doc_content = await fetch_mdn_doc(url)
+    else:
+        client = client_identity(request.headers, request.client.host if request.client else "unknown")
+        try:
+            doc_content = await fetch_mdn_doc(url, client=client)
+        except QuotaExceededError as e:
+            return f"Error: Too many requests. Retry after {e.retry_after:.1f} seconds."
+    return doc_content or failure
+
+def _http_request():
+    """SSE で受けたリクエストの場合は Starlette の Request（stdio の場合はNone）"""
+    try:
+        return getattr(mcp.get_context().request_context, "request", None)
+    except (LookupError, ValueError):
+        return None
+
+# MCPリソースの定義
+@mcp.resource("mdn://{path}")
+async def get_mdn_doc(path: str) -> str:
+    """
+    MDNウェブドキュメントをリソースとして提供
+    
+    Args:
+        path: ドキュメントのパス、または Array.prototype.flatMap のようなシンボル
+        
+    Returns:
+        ドキュメントの内容
+    """
+    url = resource_url(path)
+    return await _fetch(url, f"Failed to fetch MDN document at {url}")
+
+# MCPツールの定義
+@mcp.tool()
+async def fetch_mdn_page(url: str, ctx: Context) -> str:
+    """
+    指定したURLのMDNページを取得して分析
+    
+    Args:
+        url: MDNドキュメントのURL（https://developer.mozilla.org/ で始まる必要があります）
+        
+    Returns:
+        取得したドキュメントの内容
+    """
+    # URLの検証
+    if not is_mdn_url(url):
+        return "Error: URL must start with https://developer.mozilla.org/"
+    
+    # 進捗報告
+    ctx.info(f"Fetching document from {url}")
+    
+    # ドキュメント取得（SSE ではクライアントごとのクォータを通す）
+    return await _fetch(url, f"Failed to fetch or parse MDN document from {url}")
+
+@mcp.tool()
+async def resolve_mdn(query: str, limit: int = 10) -> str:
+    """
+    APIシンボルからMDNのURL候補を検索
+    
+    Args:
+        query: シンボルまたはその先頭部分（例: Array.prototype.flatMap, fetch(), <dialog>）
+        limit: 返す候補の最大数
+        
+    Returns:
+        "シンボル: URL" 形式の候補一覧
+    """
+    matches = get_resolver().complete(query, limit)
+    if not matches:
+        return f"No MDN pages found for {query}"
+    
+    return "\n".join(f"{m['symbol']}: {m['url']}" for m in matches)
@@ -0,0 +1,496 @@
+#!/usr/bin/env python
+"""
+MDN Web Document Scraper の非同期クライアントSDK
+
+1つの接続プール（httpx.AsyncClient）を使い回し、複数のドキュメントを並行に取得します。
+
+- fetch: 1件の取得。取得済みのドキュメントは ETag と共に手元にキャッシュし、
+  次回は If-None-Match で再検証します（変わっていなければ本文は送られません）
+- fetch_many / stream_many: 複数件の取得。サーバーが一括取得（/fetch-mdn/batch）に
+  対応していればまとめて送り、終わった順に結果を受け取ります。対応していなければ
+  1件ずつ並行に取得します（対応はマニフェストの endpoints から判断します）
+
+使い方:
+  python mdn_client.py get <MDN URL> [--server URL] [--json]
+  python mdn_client.py bulk [<MDN URL> ...] [-i urls.txt] [-o out.jsonl] [--concurrency N] [--no-batch]
+
+例:
+  python mdn_client.py get https://developer.mozilla.org/en-US/docs/Web/API/Fetch_API
+  python mdn_client.py bulk -i urls.txt -o mdn.jsonl --concurrency 8
+
+ライブラリとしての利用:
+  async with MDNClient("http://127.0.0.1:8000") as client:
+      doc = await client.fetch(url)
+      docs = await client.fetch_many(urls)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+import httpx
+
+DEFAULT_SERVER_URL = os.environ.get("MDN_SERVER_URL", "http://127.0.0.1:8000")
+
+# Retry-After がこの秒数を超える場合は待たずにエラーにする
+MAX_RETRY_WAIT = 30.0
+
+
+class MDNClientError(Exception):
+    """サーバーがエラーを返した、または通信に失敗した場合の例外"""
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class _CacheEntry:
+    """手元にキャッシュしたドキュメントと、その版の ETag"""
+    def __init__(self, etag: str, data: Dict[str, Any]):
+        self.etag = etag
+        self.data = data
+        self.validated_at = time.monotonic()
+
+    @property
+    def age(self) -> float:
+        """最後にサーバーで確認してからの秒数"""
+        return time.monotonic() - self.validated_at
+
+
+class ResponseCache:
+    """URLごとのレスポンスを保持するLRUキャッシュ"""
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+
+    def get(self, url: str) -> Optional[_CacheEntry]:
+        entry = self._entries.get(url)
+        if entry is not None:
+            self._entries.move_to_end(url)
+        return entry
+
+    def put(self, url: str, etag: str, data: Dict[str, Any]) -> None:
+        self._entries[url] = _CacheEntry(etag, data)
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class MDNClient:
+    """MDN Web Document Scraper の非同期クライアント"""
+    def __init__(
+        self,
+        server_url: str = DEFAULT_SERVER_URL,
+        max_connections: int = 16,
+        concurrency: int = 8,
+        batch_size: int = 25,
+        use_batch: bool = True,
+        cache_size: int = 512,
+        max_age: float = 0.0,
+        retries: int = 2,
+        timeout: float = 60.0,
+        client_id: Optional[str] = None,
+        api_key: Optional[str] = None,
+        priority: Optional[str] = None
+    ):
+        """
+        Args:
+            server_url: サーバーのURL
+            max_connections: 接続プールの最大接続数
+            concurrency: fetch_many で同時に送るリクエスト（一括取得の場合はバッチ）の数
+            batch_size: 一括取得1回あたりのURL数
+            use_batch: サーバーが対応していれば一括取得を使うかどうか
+            cache_size: 手元にキャッシュするドキュメントの数（0の場合はキャッシュしない）
+            max_age: キャッシュしたドキュメントを再検証せずに返す秒数（0の場合は毎回再検証する）
+            retries: 429 / 503 や通信エラーの場合に再試行する回数
+            timeout: 1リクエストのタイムアウト（秒）
+            client_id: サーバーの公平なキューイングで使うクライアントID（X-Client-Id、クォータは接続元アドレスで共有）
+            api_key: APIキー（X-API-Key、サーバーの MDN_CLIENT_API_KEYS に含まれるもの）
+            priority: 優先度クラス（X-Priority: interactive / background / bulk）
+        """
+        headers = {"User-Agent": "mdn-client/1.0"}
+        if client_id:
+            headers["X-Client-Id"] = client_id
+        if api_key:
+            headers["X-API-Key"] = api_key
+        if priority:
+            headers["X-Priority"] = priority
+        self.server_url = server_url.rstrip("/")
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.use_batch = use_batch
+        self.max_age = max_age
+        self.retries = retries
+        self.cache = ResponseCache(cache_size) if cache_size > 0 else None
+        self._client = httpx.AsyncClient(
+            base_url=self.server_url,
+            headers=headers,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._manifest: Optional[Dict[str, Any]] = None
+        self._manifest_lock = asyncio.Lock()
+        self.stats = {"requests": 0, "cache_hits": 0, "revalidated": 0, "fetched": 0, "batched": 0, "errors": 0}
+
+    async def __aenter__(self) -> "MDNClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """接続プールを閉じる"""
+        await self._client.aclose()
+
+    # ---- サーバーの機能 ------------------------------------------------------
+
+    async def manifest(self) -> Dict[str, Any]:
+        """サーバーのマニフェスト（取得できない場合は空の辞書、結果は使い回す）"""
+        async with self._manifest_lock:
+            if self._manifest is None:
+                try:
+                    response = await self._client.get("/mcp-manifest.json")
+                    self._manifest = response.json() if response.status_code == 200 else {}
+                except (httpx.HTTPError, ValueError):
+                    self._manifest = {}
+            return self._manifest
+
+    async def _endpoint(self, name: str) -> Optional[str]:
+        endpoints = (await self.manifest()).get("endpoints") or {}
+        if name == "fetch":
+            return endpoints.get("fetch", "/fetch-mdn")
+        return endpoints.get(name)
+
+    # ---- 1件の取得 ----------------------------------------------------------
+
+    async def fetch(self, url: str) -> Dict[str, Any]:
+        """
+        ドキュメントを取得する
+
+        キャッシュにあれば If-None-Match で再検証し、変わっていなければキャッシュの値を返します。
+
+        Args:
+            url: MDNドキュメントのURL
+
+        Returns:
+            /fetch-mdn のレスポンス（url・title・content・source など）
+
+        Raises:
+            MDNClientError: サーバーがエラーを返した場合
+        """
+        entry = self.cache.get(url) if self.cache is not None else None
+        if entry is not None and entry.age < self.max_age:
+            self.stats["cache_hits"] += 1
+            return entry.data
+
+        headers = {"If-None-Match": entry.etag} if entry is not None else {}
+        response = await self._request("POST", await self._endpoint("fetch"), json={"url": url}, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            self.stats["revalidated"] += 1
+            entry.validated_at = time.monotonic()
+            return entry.data
+
+        data = _json_or_error(response)
+        self.stats["fetched"] += 1
+        etag = response.headers.get("ETag")
+        if etag and self.cache is not None:
+            self.cache.put(url, etag, data)
+        return data
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """リクエストを送信する（429 / 503 は Retry-After の秒数だけ待って再試行する）"""
+        for attempt in range(self.retries + 1):
+            self.stats["requests"] += 1
+            try:
+                response = await self._client.request(method, path, **kwargs)
+            except httpx.HTTPError as e:
+                if attempt < self.retries:
+                    continue
+                self.stats["errors"] += 1
+                raise MDNClientError(f"Request to {self.server_url}{path} failed: {e}") from e
+            if response.status_code in (429, 503) and attempt < self.retries:
+                wait = _retry_after(response)
+                if wait is not None and wait <= MAX_RETRY_WAIT:
+                    await asyncio.sleep(wait)
+                    continue
+            return response
+        return response
+
+    # ---- 複数件の取得 -------------------------------------------------------
+
+    async def fetch_many(
+        self,
+        urls: Iterable[str],
+        return_exceptions: bool = False
+    ) -> List[Union[Dict[str, Any], MDNClientError]]:
+        """
+        複数のドキュメントを並行に取得する
+
+        Args:
+            urls: MDNドキュメントのURL
+            return_exceptions: Trueの場合、失敗したURLの位置に例外を入れて返す
+
+        Returns:
+            urls と同じ順のレスポンスのリスト
+
+        Raises:
+            MDNClientError: return_exceptions が False で、いずれかの取得に失敗した場合
+        """
+        urls = list(urls)
+        results: Dict[str, Union[Dict[str, Any], MDNClientError]] = {}
+        async for url, result in self.stream_many(urls):
+            if isinstance(result, MDNClientError) and not return_exceptions:
+                raise result
+            results[url] = result
+        return [results[url] for url in urls]
+
+    async def stream_many(
+        self,
+        urls: Iterable[str]
+    ) -> AsyncIterator[Tuple[str, Union[Dict[str, Any], MDNClientError]]]:
+        """
+        複数のドキュメントを並行に取得し、終わった順に (URL, レスポンスまたは例外) を返す
+
+        サーバーが一括取得に対応していれば batch_size 件ずつまとめて送ります。
+        重複したURLは1回だけ取得します。
+        """
+        pending = []
+        for url in dict.fromkeys(urls):
+            entry = self.cache.get(url) if self.cache is not None else None
+            if entry is not None and entry.age < self.max_age:
+                self.stats["cache_hits"] += 1
+                yield url, entry.data
+            else:
+                pending.append(url)
+        if not pending:
+            return
+
+        batch = await self._endpoint("batch") if self.use_batch and len(pending) > 1 else None
+        queue: "asyncio.Queue[Tuple[str, Any]]" = asyncio.Queue()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        if batch:
+            jobs = [
+                self._batch_job(batch, pending[i:i + self.batch_size], semaphore, queue)
+                for i in range(0, len(pending), self.batch_size)
+            ]
+        else:
+            jobs = [self._fetch_job(url, semaphore, queue) for url in pending]
+        tasks = [asyncio.create_task(job) for job in jobs]
+        try:
+            for _ in range(len(pending)):
+                yield await queue.get()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _fetch_job(self, url: str, semaphore: asyncio.Semaphore, queue: asyncio.Queue) -> None:
+        async with semaphore:
+            try:
+                result: Any = await self.fetch(url)
+            except Exception as e:
+                # 想定外の例外でもキューに結果を入れる（入れないと stream_many が待ち続ける）
+                result = e if isinstance(e, MDNClientError) else MDNClientError(f"Failed to fetch {url}: {e}")
+        await queue.put((url, result))
+
+    async def _batch_job(self, path: str, urls: List[str], semaphore: asyncio.Semaphore, queue: asyncio.Queue) -> None:
+        """
+        一括取得を1回実行し、届いた順に結果をキューに入れる
+
+        全てのURLについて必ず1件ずつ結果を入れます（バッチ全体が失敗した場合は同じ例外）。
+        """
+        remaining = set(urls)
+        async with semaphore:
+            try:
+                async for url, result in self._batch(path, urls):
+                    if url in remaining:
+                        remaining.discard(url)
+                        await queue.put((url, result))
+            except Exception as error:
+                # 想定外の例外でも残りの全てのURLに結果を入れる（入れないと stream_many が待ち続ける）
+                e = error if isinstance(error, MDNClientError) else MDNClientError(
+                    f"Batch request to {self.server_url}{path} failed: {error}"
+                )
+                if e.status_code == 404:
+                    # 一括取得に対応していないサーバー: 以降は1件ずつ取得する
+                    self._manifest = dict(self._manifest or {}, endpoints={"fetch": await self._endpoint("fetch")})
+                    for url in list(remaining):
+                        remaining.discard(url)
+                        try:
+                            result = await self.fetch(url)
+                        except Exception as failure:
+                            result = failure if isinstance(failure, MDNClientError) else MDNClientError(
+                                f"Failed to fetch {url}: {failure}"
+                            )
+                        await queue.put((url, result))
+                for url in remaining:
+                    await queue.put((url, e))
+                return
+        for url in remaining:
+            await queue.put((url, MDNClientError(f"Missing from batch response: {url}")))
+
+    async def _batch(self, path: str, urls: List[str]) -> AsyncIterator[Tuple[str, Union[Dict[str, Any], MDNClientError]]]:
+        etags = {}
+        if self.cache is not None:
+            for url in urls:
+                entry = self.cache.get(url)
+                if entry is not None:
+                    etags[url] = entry.etag
+
+        self.stats["requests"] += 1
+        try:
+            async with self._client.stream("POST", path, json={"urls": urls, "etags": etags}) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    _json_or_error(response)
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        item = None
+                    if not isinstance(item, dict) or not isinstance(item.get("url"), str):
+                        self.stats["errors"] += 1
+                        raise MDNClientError(f"Malformed batch response line: {line[:200]}")
+                    yield item["url"], self._batch_result(item)
+        except httpx.HTTPError as e:
+            self.stats["errors"] += 1
+            raise MDNClientError(f"Batch request to {self.server_url}{path} failed: {e}") from e
+
+    def _batch_result(self, item: Dict[str, Any]) -> Union[Dict[str, Any], MDNClientError]:
+        url = item["url"]
+        status = item.get("status")
+        if status == "error":
+            self.stats["errors"] += 1
+            return MDNClientError(item.get("error", "Unknown error"), item.get("code"))
+        entry = self.cache.get(url) if self.cache is not None else None
+        if status == "not_modified":
+            if entry is None:
+                return MDNClientError(f"Server reported {url} as not modified, but it is no longer cached")
+            self.stats["revalidated"] += 1
+            entry.validated_at = time.monotonic()
+            return entry.data
+        self.stats["batched"] += 1
+        etag = item.pop("etag", None)
+        if etag and self.cache is not None:
+            self.cache.put(url, etag, item)
+        return item
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+def _json_or_error(response: httpx.Response) -> Dict[str, Any]:
+    """成功したレスポンスのJSONを返す（エラーの場合は例外を送出する）"""
+    try:
+        data = response.json()
+    except ValueError:
+        data = None
+    if response.status_code != 200:
+        detail = (data.get("error") or data.get("detail")) if isinstance(data, dict) else None
+        detail = detail or response.text
+        if isinstance(detail, dict):
+            detail = detail.get("error", detail)
+        raise MDNClientError(f"HTTP {response.status_code}: {detail}", response.status_code, _retry_after(response))
+    if not isinstance(data, dict):
+        # JSONのオブジェクト以外（配列やプロキシのHTMLなど）はレスポンスとして扱わない
+        raise MDNClientError(f"Unexpected response (not a JSON object): {response.text[:200]}", response.status_code)
+    return data
+
+
+# ---- コマンドライン ---------------------------------------------------------
+
+async def _get(args) -> int:
+    async with MDNClient(args.server) as client:
+        try:
+            data = await client.fetch(args.url)
+        except MDNClientError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+    if args.json:
+        print(json.dumps(data, ensure_ascii=False, indent=2))
+    else:
+        print(data.get("content", ""))
+    return 0
+
+
+async def _bulk(args) -> int:
+    urls = list(args.urls)
+    if args.input:
+        with (sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")) as f:
+            urls.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    if not urls:
+        print("No URLs given", file=sys.stderr)
+        return 1
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    errors = 0
+    start = time.perf_counter()
+    try:
+        async with MDNClient(
+            args.server,
+            concurrency=args.concurrency,
+            max_connections=max(args.concurrency, 1),
+            batch_size=args.batch_size,
+            use_batch=not args.no_batch,
+            client_id=args.client_id,
+            priority="bulk",
+        ) as client:
+            async for url, result in client.stream_many(urls):
+                if isinstance(result, MDNClientError):
+                    errors += 1
+                    result = {"url": url, "status": "error", "error": str(result), "code": result.status_code}
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            stats = client.stats
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    seconds = time.perf_counter() - start
+    count = len(set(urls))
+    print(
+        f"{count} documents, {errors} errors in {seconds:.2f}s ({count / seconds:.1f} docs/s); "
+        + " ".join(f"{name}={value}" for name, value in stats.items()),
+        file=sys.stderr
+    )
+    return 1 if errors else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="MDN Web Document Scraper client")
+    parser.add_argument("--server", default=DEFAULT_SERVER_URL, help="server URL (default: $MDN_SERVER_URL)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    get = subparsers.add_parser("get", help="fetch one document and print it")
+    get.add_argument("url")
+    get.add_argument("--json", action="store_true", help="print the full JSON response")
+    get.set_defaults(func=_get)
+
+    bulk = subparsers.add_parser("bulk", help="fetch many documents and write them as JSON lines")
+    bulk.add_argument("urls", nargs="*")
+    bulk.add_argument("-i", "--input", help="file with one URL per line ('-' for stdin)")
+    bulk.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    bulk.add_argument("--concurrency", type=int, default=8)
+    bulk.add_argument("--batch-size", type=int, default=25)
+    bulk.add_argument("--no-batch", action="store_true", help="send one request per URL")
+    bulk.add_argument("--client-id", help="client id used for the server's fair queuing")
+    bulk.set_defaults(func=_bulk)
+
+    args = parser.parse_args(argv)
+    return asyncio.run(args.func(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
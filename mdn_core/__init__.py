@@ -0,0 +1,116 @@
+"""
+MDN Web Scraper コアライブラリ
+
+取得（fetch）・キャッシュ（cache）・抽出（extract）のパイプラインと
+MCPプロトコルの共通実装を提供します。標準ライブラリのみに依存するため、
+FastAPI版（server.py）と軽量版（simple_mcp_server.py, claude_desktop_mcp.py）の
+全フロントエンドから利用できます。
+"""
+
+from importlib import import_module
+
+# 公開する名前と、それを定義するサブモジュール
+# サブモジュールは名前が最初に参照されたときに読み込む（stdio 起動など、一部だけを使う場合の起動時間を抑えるため）
+_EXPORTS = {
+    "AdmissionController": "admission",
+    "QuotaExceededError": "admission",
+    "get_admission": "admission",
+    "CircuitBreaker": "breaker",
+    "TTLCache": "cache",
+    "Cluster": "cluster",
+    "get_cluster": "cluster",
+    "CircuitOpenError": "errors",
+    "DeadlineExceededError": "errors",
+    "ExtractError": "errors",
+    "FetchError": "errors",
+    "InvalidURLError": "errors",
+    "MDNError": "errors",
+    "CorpusExporter": "export",
+    "ExportFilter": "export",
+    "get_exporter": "export",
+    "Document": "extract",
+    "extract_document": "extract",
+    "Fetcher": "fetch",
+    "FetchResult": "fetch",
+    "LocaleFallback": "locales",
+    "LocaleMap": "locales",
+    "MDNPipeline": "pipeline",
+    "get_pipeline": "pipeline",
+    "is_mdn_url": "pipeline",
+    "set_pipeline": "pipeline",
+    "MCPContext": "protocol",
+    "MCPResponse": "protocol",
+    "build_fetch_response": "protocol",
+    "build_mcp_response": "protocol",
+    "create_manifest": "protocol",
+    "create_mdn_context": "protocol",
+    "default_manifest": "protocol",
+    "Resolver": "resolver",
+    "get_resolver": "resolver",
+    "resource_url": "resolver",
+    "BACKGROUND": "scheduler",
+    "BULK": "scheduler",
+    "INTERACTIVE": "scheduler",
+    "PriorityScheduler": "scheduler",
+    "SnapshotStore": "snapshot",
+    "get_snapshot_store": "snapshot",
+}
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
+
+
+__all__ = [
+    "TTLCache",
+    "CircuitBreaker",
+    "MDNError",
+    "InvalidURLError",
+    "FetchError",
+    "CircuitOpenError",
+    "DeadlineExceededError",
+    "ExtractError",
+    "Document",
+    "extract_document",
+    "Fetcher",
+    "FetchResult",
+    "MDNPipeline",
+    "get_pipeline",
+    "set_pipeline",
+    "is_mdn_url",
+    "PriorityScheduler",
+    "SnapshotStore",
+    "get_snapshot_store",
+    "Cluster",
+    "get_cluster",
+    "CorpusExporter",
+    "ExportFilter",
+    "get_exporter",
+    "LocaleFallback",
+    "LocaleMap",
+    "AdmissionController",
+    "QuotaExceededError",
+    "get_admission",
+    "INTERACTIVE",
+    "BACKGROUND",
+    "BULK",
+    "Resolver",
+    "get_resolver",
+    "resource_url",
+    "MCPContext",
+    "MCPResponse",
+    "build_fetch_response",
+    "build_mcp_response",
+    "create_manifest",
+    "create_mdn_context",
+    "default_manifest",
+]
@@ -0,0 +1,145 @@
+"""
+コアライブラリのコマンドラインツール
+
+使い方:
+  python -m mdn_core index build <sitemap.xml[.gz]> [-o mdn_index.bin]
+  python -m mdn_core index lookup <symbol> [-n 10]
+  python -m mdn_core snapshot stats [-d DIR]
+  python -m mdn_core snapshot train [-d DIR]
+  python -m mdn_core mirror refresh <sitemap.xml[.gz] | URL> [-d DIR]
+  python -m mdn_core export [-d DIR] [-o FILE] [--format ndjson|arrow|parquet]
+                            [--prefix PATH] [--locale LOCALE ...] [--since TIME] [--until TIME]
+"""
+
+import argparse
+import sys
+from typing import List, Optional
+
+from . import config
+
+
+def _index(args) -> int:
+    from .resolver import Resolver, SymbolIndex, build_index, get_resolver, paths_from_sitemap
+
+    if args.action == "build":
+        count = build_index(paths_from_sitemap(args.source), args.output)
+        print(f"Wrote {count} entries to {args.output}")
+        return 0
+
+    resolver = Resolver(SymbolIndex(args.output)) if args.output != config.INDEX_PATH else get_resolver()
+    for match in resolver.complete(args.source, args.limit):
+        print(f"{match['symbol']:<40} {match['url']}")
+    return 0
+
+
+def _snapshot(args) -> int:
+    from .snapshot import SnapshotStore
+
+    if not args.directory:
+        print("Snapshot directory is not set (use -d or MDN_SNAPSHOT_DIR)", file=sys.stderr)
+        return 1
+    store = SnapshotStore(args.directory)
+    try:
+        if args.action == "train":
+            print(f"Trained dictionary {store.train()} ({store.codec.name})")
+        for name, value in store.stats().items():
+            print(f"{name:<12} {value}")
+    finally:
+        store.close()
+    return 0
+
+
+def _mirror(args) -> int:
+    from .pipeline import MDNPipeline
+    from .snapshot import SnapshotStore
+
+    if not args.directory:
+        print("Snapshot directory is not set (use -d or MDN_SNAPSHOT_DIR)", file=sys.stderr)
+        return 1
+    store = SnapshotStore(args.directory)
+    try:
+        pipeline = MDNPipeline(snapshots=store)
+        for name, value in pipeline.mirror.refresh(args.source).items():
+            print(f"{name:<12} {value}")
+    finally:
+        store.close()
+    return 0
+
+
+def _export(args) -> int:
+    from .errors import MDNError
+    from .export import CorpusExporter, ExportFilter, parse_time
+    from .snapshot import SnapshotStore
+
+    if not args.directory:
+        print("Snapshot directory is not set (use -d or MDN_SNAPSHOT_DIR)", file=sys.stderr)
+        return 1
+    try:
+        filters = ExportFilter(args.prefix, args.locale, parse_time(args.since), parse_time(args.until))
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    store = SnapshotStore(args.directory)
+    try:
+        export = CorpusExporter(batch_rows=args.batch_rows).open(store, None, args.format, filters, "snapshot")
+    except MDNError as e:
+        print(e, file=sys.stderr)
+        store.close()
+        return 1
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        for chunk in export:
+            out.write(chunk)
+    finally:
+        export.close()
+        if out is not sys.stdout.buffer:
+            out.close()
+        store.close()
+    seconds = max(export.elapsed, 1e-9)
+    print(
+        f"Exported {export.documents} documents ({export.bytes / 1e6:.1f} MB) in {seconds:.2f}s "
+        f"({export.documents / seconds:.0f} docs/s, {export.bytes / 1e6 / seconds:.1f} MB/s)",
+        file=sys.stderr
+    )
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m mdn_core", description="MDN Web Scraper core tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    index = subparsers.add_parser("index", help="build or query the symbol index")
+    index.add_argument("action", choices=["build", "lookup"])
+    index.add_argument("source", help="sitemap file (build) or symbol (lookup)")
+    index.add_argument("-o", "--output", default=config.INDEX_PATH, help="index file")
+    index.add_argument("-n", "--limit", type=int, default=10)
+    index.set_defaults(func=_index)
+
+    snapshot = subparsers.add_parser("snapshot", help="inspect the compressed snapshot store")
+    snapshot.add_argument("action", choices=["stats", "train"])
+    snapshot.add_argument("-d", "--directory", default=config.SNAPSHOT_DIR, help="snapshot directory")
+    snapshot.set_defaults(func=_snapshot)
+
+    mirror = subparsers.add_parser("mirror", help="incrementally refresh the mirror from a sitemap")
+    mirror.add_argument("action", choices=["refresh"])
+    mirror.add_argument("source", help="sitemap file or URL")
+    mirror.add_argument("-d", "--directory", default=config.SNAPSHOT_DIR, help="snapshot directory")
+    mirror.set_defaults(func=_mirror)
+
+    export = subparsers.add_parser("export", help="stream the mirrored corpus as NDJSON, Arrow or Parquet")
+    export.add_argument("-d", "--directory", default=config.SNAPSHOT_DIR, help="snapshot directory")
+    export.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    export.add_argument("--format", choices=["ndjson", "arrow", "parquet"], default="ndjson")
+    export.add_argument("--prefix", default="", help="path prefix, e.g. /en-US/docs/Web/CSS")
+    export.add_argument("--locale", action="append", help="locale to include (repeatable)")
+    export.add_argument("--since", help="modified at or after (UNIX time or ISO 8601)")
+    export.add_argument("--until", help="modified before (UNIX time or ISO 8601)")
+    export.add_argument("--batch-rows", type=int, default=config.EXPORT_BATCH_ROWS, help="rows per Arrow/Parquet batch")
+    export.set_defaults(func=_export)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
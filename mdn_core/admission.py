@@ -0,0 +1,403 @@
+"""
+クライアントごとの公平なキューイングとクォータ
+
+CORS で全オリジンを許可しているため、1つのクライアント（ループするエージェントなど）が
+`/fetch-mdn` を連打すると他のクライアントが待たされます。HTTPリクエストを
+クライアント（APIキー・セッション・接続元アドレス）ごとに集計し、次の2つで公平性を保ちます。
+
+- クォータ: クライアントごとに1分あたりのリクエスト数・レスポンスのバイト数を
+  トークンバケットで制限し、超えた場合は再試行できるまでの正確な秒数とともに 429 を返します。
+  一括取得はURLの数だけリクエストとして数えます。
+  セッションは検証できないため、同じ接続元アドレスのセッションはクォータを共有します
+  （リクエストごとに新しいセッションIDを送っても新しいクォータは得られません）。
+- 公平なキューイング: 同時に処理するリクエストを slots 件までに制限し、空きを待つ
+  リクエストにはクライアント間で deficit round robin（送信したバイト数で課金）で枠を割り当てます。
+"""
+
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, FrozenSet, List, Mapping, Optional
+
+from . import config
+from .errors import MDNError
+from .fetch import LatencyTracker
+
+# 統計情報に含める最大クライアント数（送信バイト数の多い順）
+_MAX_REPORTED_CLIENTS = 20
+# 集計を保持する最大クライアント数（超えた分は最も長く使われていないものから破棄する）
+_MAX_CLIENTS = 10000
+# 接続元アドレスとセッションIDの区切り
+_SESSION = "/session:"
+
+
+class QuotaExceededError(MDNError):
+    """クライアントのクォータを超えた場合の例外"""
+    status_code = 429
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def retry_after_header(seconds: float) -> str:
+    """Retry-After ヘッダーの値（整数秒、切り上げ）"""
+    return str(max(1, math.ceil(seconds)))
+
+
+def client_identity(headers: Mapping[str, str], peer: str) -> str:
+    """
+    リクエストのクライアントを識別する
+
+    APIキー（X-API-Key または Authorization: Bearer）、セッション
+    （Mcp-Session-Id または X-Client-Id）、接続元アドレスの順に使います。
+    APIキーは MDN_CLIENT_API_KEYS に含まれるものだけを使い、そのまま保持せずにハッシュの先頭だけを識別子にします。
+    セッションIDは検証できないため、接続元アドレスの下に区別します。
+
+    Args:
+        headers: リクエストヘッダー（大文字小文字を区別しないマッピング）
+        peer: 接続元アドレス
+
+    Returns:
+        "key:..."、"ip:<アドレス>/session:..."、"ip:..." 形式の識別子
+    """
+    api_key = headers.get("X-API-Key")
+    authorization = headers.get("Authorization") or ""
+    if not api_key and authorization.lower().startswith("bearer "):
+        api_key = authorization[7:].strip()
+    if api_key and api_key in _api_keys():
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:12]
+    session = headers.get("Mcp-Session-Id") or headers.get("X-Client-Id")
+    if session:
+        return f"ip:{peer}{_SESSION}{session.strip()[:64]}"
+    return "ip:" + peer
+
+
+def _api_keys() -> FrozenSet[str]:
+    return frozenset(key.strip() for key in config.CLIENT_API_KEYS.split(",") if key.strip())
+
+
+def quota_owner(client: str) -> str:
+    """クォータを課金するクライアント（セッションは接続元アドレスに課金する）"""
+    return client.partition(_SESSION)[0]
+
+
+class _TokenBucket:
+    """1分あたりの量を上限とするトークンバケット"""
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        # 呼び出し元が時刻を取得した後に作られたバケットでは now が updated より前になる
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """amount を消費できるまでの秒数（0なら今すぐ消費できる）"""
+        self._refill(now)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float, now: float) -> None:
+        """消費する（バイト数は応答後に課金するため、残高が負になることがある）"""
+        self._refill(now)
+        self.tokens -= amount
+
+    def refund(self, amount: float) -> None:
+        """処理しなかったリクエストの分を返す"""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _Waiter:
+    """枠の割り当てを待つリクエスト"""
+    def __init__(self, client: str, notify: Callable[[], None], cost: int = 1):
+        self.client = client
+        self.notify = notify
+        # リクエスト数のクォータから消費した量（割り当て前に取り消した場合は返す）
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+        self.granted_at = 0.0
+        self.granted = False
+        self.cancelled = False
+
+
+class _ClientState:
+    """クライアントごとの集計"""
+    def __init__(self, requests_per_minute: float, bytes_per_minute: float):
+        self.requests = _TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.bytes = _TokenBucket(bytes_per_minute) if bytes_per_minute > 0 else None
+        self.queue: Deque[_Waiter] = deque()
+        self.deficit = 0.0
+        self.running = 0
+        self.served = 0
+        self.sent_bytes = 0
+        self.throttled = 0
+        self.wait = LatencyTracker(size=128, min_samples=1)
+
+
+class AdmissionController:
+    """クライアントごとのクォータと deficit round robin による公平なキューイング"""
+    def __init__(
+        self,
+        slots: int = config.FAIR_SLOTS,
+        quantum: int = config.FAIR_QUANTUM,
+        max_queue: int = config.FAIR_MAX_QUEUE,
+        requests_per_minute: float = config.CLIENT_REQUESTS_PER_MINUTE,
+        bytes_per_minute: float = config.CLIENT_BYTES_PER_MINUTE
+    ):
+        """
+        Args:
+            slots: 同時に処理するリクエストの上限（0の場合は公平なキューイングを行わない）
+            quantum: 1巡ごとに各クライアントに与えるバイト数
+            max_queue: クライアントごとに待機できるリクエスト数
+            requests_per_minute: クライアントごとの1分あたりのリクエスト数（0の場合は無制限）
+            bytes_per_minute: クライアントごとの1分あたりのレスポンスのバイト数（0の場合は無制限）
+        """
+        self.slots = slots
+        self.quantum = quantum
+        self.max_queue = max_queue
+        self.requests_per_minute = requests_per_minute
+        self.bytes_per_minute = bytes_per_minute
+        self._lock = threading.Lock()
+        self._clients: "OrderedDict[str, _ClientState]" = OrderedDict()
+        # 待機中のリクエストがあるクライアント（巡回順）
+        self._active: "OrderedDict[str, None]" = OrderedDict()
+        self._running = 0
+        self._service = LatencyTracker(size=256, min_samples=1)
+
+    def _client(self, client: str) -> _ClientState:
+        state = self._clients.get(client)
+        if state is None:
+            state = self._clients[client] = _ClientState(self.requests_per_minute, self.bytes_per_minute)
+            while len(self._clients) > _MAX_CLIENTS:
+                oldest, oldest_state = next(iter(self._clients.items()))
+                if oldest_state.queue or oldest_state.running:
+                    break
+                del self._clients[oldest]
+        self._clients.move_to_end(client)
+        return state
+
+    # --- クォータ ---
+
+    def _check_quota(self, state: _ClientState, client: str, now: float, cost: int) -> None:
+        waits = []
+        if state.requests is not None:
+            # 1分あたりの上限を超える一括取得は満杯になるまで待たせ、超過分は借りとして課金する
+            waits.append(state.requests.wait_time(min(cost, state.requests.capacity), now))
+        if state.bytes is not None:
+            # バイト数は応答後に課金するため、超過した分を返済するまで待たせる
+            waits.append(state.bytes.wait_time(0, now))
+        retry_after = max(waits, default=0.0)
+        if retry_after > 0:
+            state.throttled += 1
+            raise QuotaExceededError(f"Quota exceeded for {client}", retry_after)
+        if state.requests is not None:
+            state.requests.consume(cost, now)
+
+    # --- 公平なキューイング ---
+
+    def enqueue(self, client: str, notify: Callable[[], None], cost: int = 1) -> _Waiter:
+        """
+        リクエストを受け付ける
+
+        クォータを確認し、空きがあればすぐに枠を割り当て（notify を呼び）、
+        無ければクライアントのキューに入れます。
+
+        Args:
+            client: client_identity で求めたクライアントの識別子
+            notify: 枠が割り当てられたときに呼ぶ関数（ロックを保持したまま呼ばれる）
+            cost: リクエスト数のクォータから消費する量（一括取得ではURLの数）
+
+        Returns:
+            待機中のリクエスト（処理後に release に渡す）
+
+        Raises:
+            QuotaExceededError: クォータを超えた場合、またはキューが満杯の場合
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._client(client)
+            owner = quota_owner(client)
+            quota = self._client(owner) if owner != client else state
+            immediate = self.slots <= 0 or (self._running < self.slots and not self._active)
+            # キューが満杯で断るリクエストにクォータを消費させない
+            if not immediate and len(state.queue) >= self.max_queue:
+                state.throttled += 1
+                raise QuotaExceededError(
+                    f"Too many queued requests for {client}", self._estimated_wait(len(state.queue))
+                )
+            self._check_quota(quota, client, now, cost)
+            waiter = _Waiter(client, notify, cost)
+            if immediate:
+                self._grant(state, waiter)
+                return waiter
+            state.queue.append(waiter)
+            self._active[client] = None
+            return waiter
+
+    def cancel(self, waiter: _Waiter) -> None:
+        """割り当て前に諦めたリクエストをキューから取り除き、消費したクォータを返す"""
+        with self._lock:
+            if waiter.granted or waiter.cancelled:
+                return
+            waiter.cancelled = True
+            state = self._clients.get(waiter.client)
+            if state is not None and waiter in state.queue:
+                state.queue.remove(waiter)
+                if not state.queue:
+                    self._deactivate(waiter.client, state)
+            quota = self._clients.get(quota_owner(waiter.client))
+            if quota is not None and quota.requests is not None:
+                quota.requests.refund(waiter.cost)
+
+    def release(self, waiter: _Waiter, sent_bytes: int = 0) -> None:
+        """
+        処理の完了を記録し、次のリクエストに枠を割り当てる
+
+        Args:
+            waiter: enqueue が返したリクエスト
+            sent_bytes: 送信したレスポンスのバイト数（公平性の課金とバイト数のクォータに使用）
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._running -= 1
+            state = self._clients.get(waiter.client)
+            if state is not None:
+                state.running -= 1
+                state.served += 1
+                state.sent_bytes += sent_bytes
+                state.deficit -= sent_bytes
+            quota = self._clients.get(quota_owner(waiter.client))
+            if quota is not None and quota.bytes is not None:
+                quota.bytes.consume(sent_bytes, now)
+            self._service.record(now - waiter.granted_at)
+            self._dispatch()
+
+    def _grant(self, state: _ClientState, waiter: _Waiter) -> None:
+        waiter.granted = True
+        waiter.granted_at = time.monotonic()
+        self._running += 1
+        state.running += 1
+        state.wait.record(waiter.granted_at - waiter.enqueued_at)
+        waiter.notify()
+
+    def _deactivate(self, client: str, state: _ClientState) -> None:
+        self._active.pop(client, None)
+        # 待機していない間に貯めた分は持ち越さない（超過分の借りは持ち越す）
+        state.deficit = min(state.deficit, 0.0)
+
+    def _dispatch(self) -> None:
+        while self._running < self.slots and self._active:
+            client = next(iter(self._active))
+            state = self._clients[client]
+            if state.deficit <= 0:
+                # 借りを返すまで quantum ずつ与え、次のクライアントに回す
+                state.deficit += self.quantum
+                self._active.move_to_end(client)
+                continue
+            waiter = state.queue.popleft()
+            self._active.move_to_end(client)
+            if not state.queue:
+                self._active.pop(client, None)
+            self._grant(state, waiter)
+
+    def _estimated_wait(self, queued: int) -> float:
+        mean = self._service.percentile(50) or 0.1
+        return mean * (queued + 1) / max(1, self.slots)
+
+    # --- 同期・非同期の待機 ---
+
+    def acquire(self, client: str, timeout: Optional[float] = None, cost: int = 1) -> _Waiter:
+        """
+        枠が割り当てられるまで待つ（スレッド用）
+
+        Raises:
+            QuotaExceededError: クォータを超えた場合、または timeout までに割り当てられなかった場合
+        """
+        event = threading.Event()
+        waiter = self.enqueue(client, event.set, cost)
+        if not event.wait(timeout):
+            self.cancel(waiter)
+            if not waiter.granted:
+                raise QuotaExceededError(
+                    f"Timed out waiting for a slot for {client}", self._estimated_wait(1)
+                )
+        return waiter
+
+    async def acquire_async(self, client: str, timeout: Optional[float] = None, cost: int = 1) -> _Waiter:
+        """
+        枠が割り当てられるまで待つ（asyncio 用）
+
+        待っているタスクが取り消された場合（クライアントの切断やサーバーの終了）は、
+        キューから取り除き、既に割り当てられていた枠は返してから取り消しを伝えます。
+
+        Raises:
+            QuotaExceededError: クォータを超えた場合、または timeout までに割り当てられなかった場合
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self.enqueue(client, notify, cost)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self.cancel(waiter)
+            if not waiter.granted:
+                raise QuotaExceededError(
+                    f"Timed out waiting for a slot for {client}", self._estimated_wait(1)
+                ) from None
+        except BaseException:
+            # 呼び出し元は waiter を受け取らないため、割り当て済みの枠はここで返す
+            self.cancel(waiter)
+            if waiter.granted:
+                self.release(waiter)
+            raise
+        return waiter
+
+    def stats(self) -> Dict[str, Any]:
+        """クライアントごとの集計（送信バイト数の多い順）"""
+        with self._lock:
+            clients = sorted(self._clients.items(), key=lambda item: item[1].sent_bytes, reverse=True)
+            report: List[Dict[str, Any]] = []
+            for client, state in clients[:_MAX_REPORTED_CLIENTS]:
+                p95 = state.wait.percentile(95)
+                report.append({
+                    "client": client,
+                    "served": state.served,
+                    "bytes": state.sent_bytes,
+                    "throttled": state.throttled,
+                    "queued": len(state.queue),
+                    "wait_p95_ms": p95 * 1000 if p95 is not None else None,
+                })
+            return {
+                "running": self._running,
+                "slots": self.slots,
+                "clients": len(self._clients),
+                "top": report,
+            }
+
+
+_default_admission: Optional[AdmissionController] = None
+_default_lock = threading.Lock()
+
+
+def get_admission() -> AdmissionController:
+    """プロセス共通の AdmissionController を取得する"""
+    global _default_admission
+    if _default_admission is None:
+        with _default_lock:
+            if _default_admission is None:
+                _default_admission = AdmissionController()
+    return _default_admission
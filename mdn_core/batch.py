@@ -0,0 +1,86 @@
+"""
+複数のドキュメントの一括取得
+
+/fetch-mdn/batch エンドポイント（標準ライブラリ版・FastAPI版で共通）の実装です。
+URLごとの取得をまとめて並行に実行し、終わった順に結果を返すため、
+クライアントは遅いページを待たずに先に届いたものから処理できます。
+"""
+
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Mapping, Optional
+
+from . import config
+from .errors import MDNError
+from .pipeline import MDNPipeline, get_pipeline
+from .prefetch import navigation
+from .protocol import build_batch_item
+from .scheduler import INTERACTIVE
+
+
+def validate_batch(body: Mapping[str, Any]) -> List[str]:
+    """
+    一括取得のリクエストボディからURLの一覧を取り出す
+
+    Raises:
+        ValueError: URLの一覧が無い、または多すぎる場合
+    """
+    urls = body.get("urls")
+    if not isinstance(urls, list) or not urls or not all(isinstance(url, str) for url in urls):
+        raise ValueError("'urls' must be a non-empty list of strings")
+    if len(urls) > config.BATCH_MAX_URLS:
+        raise ValueError(f"At most {config.BATCH_MAX_URLS} URLs per batch")
+    return urls
+
+
+def batch_cost(urls: List[str]) -> int:
+    """一括取得がクライアントのリクエスト数のクォータから消費する量（取得するURLの数）"""
+    return len(set(urls))
+
+
+def iter_batch(
+    urls: List[str],
+    etags: Optional[Mapping[str, str]] = None,
+    priority: str = INTERACTIVE,
+    deadline: Optional[float] = None,
+    pipeline: Optional[MDNPipeline] = None,
+    concurrency: int = config.BATCH_CONCURRENCY
+) -> Iterator[Dict[str, Any]]:
+    """
+    URLを並行に取得し、終わった順に結果（build_batch_item の形式）を返す
+
+    途中でジェネレーターを閉じた場合（クライアントの切断など）は、未開始の取得を取り消します。
+
+    Args:
+        urls: 取得するURL（重複は1回だけ取得する）
+        etags: クライアントが保持している版の ETag（URLごと、一致すれば本文を省略する）
+        priority: 優先度クラス
+        deadline: バッチ全体の期限
+        pipeline: 使用するパイプライン（省略時はプロセス共通のもの）
+        concurrency: 同時に取得するURLの上限
+    """
+    pipeline = pipeline or get_pipeline()
+    etags = etags or {}
+    unique = list(dict.fromkeys(urls))
+
+    def fetch(url: str) -> Dict[str, Any]:
+        try:
+            # 終わった順はクライアントのページ遷移ではないため、先読みの遷移として記録しない
+            with navigation(None):
+                doc = pipeline.get_document(url, priority, deadline)
+        except MDNError as e:
+            return build_batch_item(url, error=e)
+        except Exception as e:
+            return build_batch_item(url, error=MDNError(f"Internal server error: {e}"))
+        return build_batch_item(url, doc, known_etag=etags.get(url))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(unique))), thread_name_prefix="mdn-batch")
+    try:
+        # 遅いリクエストのログに各URLの段階ごとの時間を合算できるよう、呼び出し元の計測を引き継ぐ
+        pending = {executor.submit(contextvars.copy_context().run, fetch, url) for url in unique}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
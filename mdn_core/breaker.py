@@ -0,0 +1,138 @@
+"""
+上流への取得を保護するサーキットブレーカー
+
+MDN の障害中に全リクエストが期限まで待たされてワーカーを占有しないよう、
+直近の取得で失敗（または遅延）の割合がしきい値を超えたら回路を開き、
+一定時間は上流に問い合わせずに即座に失敗させます。
+
+開いてから open_seconds 秒経つと半開状態になり、少数の試行リクエストだけを通します。
+試行が成功すれば閉じ、失敗すれば再び開きます。
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict
+
+from . import config
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """失敗率と遅延にもとづくサーキットブレーカー"""
+    def __init__(
+        self,
+        failure_ratio: float = config.BREAKER_FAILURE_RATIO,
+        min_calls: int = config.BREAKER_MIN_CALLS,
+        window: int = config.BREAKER_WINDOW,
+        slow_call: float = config.BREAKER_SLOW_CALL,
+        open_seconds: float = config.BREAKER_OPEN_SECONDS,
+        half_open_probes: int = config.BREAKER_HALF_OPEN_PROBES
+    ):
+        """
+        Args:
+            failure_ratio: 回路を開く失敗（遅延を含む）の割合
+            min_calls: 割合を判定するのに必要な最小の呼び出し数
+            window: 割合を計算する直近の呼び出し数
+            slow_call: この秒数を超えた成功も失敗として数える
+            open_seconds: 回路を開いたままにする秒数
+            half_open_probes: 半開状態で同時に通す試行リクエストの数
+        """
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        """現在の状態（開いてから open_seconds 秒経っていれば半開）"""
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def allow(self) -> bool:
+        """
+        上流への呼び出しを許可するかどうか
+
+        許可された呼び出しは、必ず record_success・record_failure・record_cancelled のいずれかで結果を報告してください。
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def retry_after(self) -> float:
+        """回路が半開になるまでの秒数"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def record_success(self, seconds: float) -> None:
+        """呼び出しの成功を記録する（slow_call を超えた場合は失敗として扱う）"""
+        if seconds > self.slow_call:
+            self.record_failure()
+            return
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._outcomes.clear()
+            self._outcomes.append(False)
+
+    def record_cancelled(self) -> None:
+        """上流の状態と無関係に打ち切られた呼び出し（呼び出し元の期限切れなど）を記録する"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                # 試行の枠を返却し、次のリクエストで改めて試行する
+                self._probes -= 1
+
+    def record_failure(self) -> None:
+        """呼び出しの失敗を記録する"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trip()
+                return
+            self._outcomes.append(True)
+            failures = sum(self._outcomes)
+            if (
+                self._state == CLOSED
+                and len(self._outcomes) >= self.min_calls
+                and failures >= len(self._outcomes) * self.failure_ratio
+            ):
+                self._trip()
+
+    def _trip(self) -> None:
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.opened += 1
+
+    def stats(self) -> Dict[str, float]:
+        """ブレーカーの状態と統計情報"""
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
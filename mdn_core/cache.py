@@ -0,0 +1,191 @@
+"""
+スレッドセーフなTTL付きLRUキャッシュ
+
+抽出済みドキュメントをプロセス内に保持し、同じページへの
+繰り返しリクエストで上流への通信とHTML解析を省略します。
+
+期限切れのエントリはLRUで追い出されるまで保持されるため、
+stale-while-revalidate（期限切れの値を返しつつ裏で更新する）に利用できます。
+
+件数に加えて、sizeof で求めた値の大きさの合計にも上限を設けられます
+（大きなページばかりが載ってもメモリ使用量が上限を超えないようにするため）。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+# lookup() が返すエントリの状態
+FRESH = "fresh"
+STALE = "stale"
+MISS = "miss"
+
+
+class CacheEntry:
+    """キャッシュエントリ"""
+    def __init__(self, value: Any, ttl: float, size: int = 0):
+        self.value = value
+        self.size = size
+        self.stored_at = time.monotonic()
+        self.expires_at = self.stored_at + ttl
+
+    @property
+    def age(self) -> float:
+        """保存されてからの経過秒数"""
+        return time.monotonic() - self.stored_at
+
+    def is_fresh(self) -> bool:
+        """有効期限内かどうか"""
+        return time.monotonic() < self.expires_at
+
+    @property
+    def staleness(self) -> float:
+        """有効期限を過ぎてからの秒数（期限内なら0）"""
+        return max(0.0, time.monotonic() - self.expires_at)
+
+
+class TTLCache:
+    """有効期限と最大件数（と最大サイズ）を持つLRUキャッシュ"""
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl: float = 3600,
+        max_bytes: int = 0,
+        sizeof: Optional[Callable[[Any], int]] = None
+    ):
+        """
+        Args:
+            max_entries: 最大件数
+            ttl: 有効期限（秒）のデフォルト値
+            max_bytes: 値の大きさの合計の上限（0または sizeof が無い場合は無制限）
+            sizeof: 値の大きさ（バイト数の目安）を求める関数
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.size = 0
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        有効期限内の値を取得する
+
+        Args:
+            key: キャッシュキー
+
+        Returns:
+            キャッシュされた値、存在しないか期限切れの場合はNone
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry.is_fresh():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def lookup(self, key: Hashable, max_stale: float = 0.0) -> Tuple[Optional[Any], str]:
+        """
+        期限切れを許容して値を取得する
+
+        Args:
+            key: キャッシュキー
+            max_stale: 有効期限を過ぎても返してよい秒数
+
+        Returns:
+            (値, 状態) のタプル。状態は FRESH / STALE / MISS のいずれか
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.is_fresh():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.value, FRESH
+                if entry.staleness <= max_stale:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    return entry.value, STALE
+            self.misses += 1
+            return None, MISS
+
+    def expiring_within(self, seconds: float) -> List[Hashable]:
+        """
+        指定秒数以内に有効期限を迎える（または既に迎えた）キーの一覧
+
+        Args:
+            seconds: 判定する秒数
+
+        Returns:
+            該当するキーのリスト
+        """
+        deadline = time.monotonic() + seconds
+        with self._lock:
+            return [key for key, entry in self._entries.items() if entry.expires_at <= deadline]
+
+    def get_entry(self, key: Hashable) -> Optional[CacheEntry]:
+        """期限切れを含めてエントリを取得する（統計には影響しない）"""
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        値を保存する
+
+        Args:
+            key: キャッシュキー
+            value: 保存する値
+            ttl: 有効期限（秒）、省略時はキャッシュのデフォルト値
+        """
+        size = self.sizeof(value) if self.sizeof is not None else 0
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous.size
+            self._entries[key] = CacheEntry(value, self.ttl if ttl is None else ttl, size)
+            self.size += size
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes and self.size > self.max_bytes and len(self._entries) > 1
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+
+    def delete(self, key: Hashable) -> None:
+        """値を削除する"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry.size
+
+    def clear(self) -> None:
+        """全ての値を削除する"""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def keys(self) -> List[Hashable]:
+        """期限切れを含む全てのキー（古い順、呼び出した時点の一覧）"""
+        with self._lock:
+            return list(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """ヒット率などの統計情報"""
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.stale_hits) / total if total else 0.0,
+        }
@@ -0,0 +1,374 @@
+"""
+複数ノードでキャッシュを分担するクラスターモード（groupcache 方式）
+
+ロードバランサーの後ろに複数のサーバーを並べると、各ノードが同じページを個別に
+取得・キャッシュしてしまいます。クラスターモードでは全ノードが同じピア一覧から
+コンシステントハッシュのリングを作り、URLごとに1つの所有ノードを決めます。
+
+- 所有ノードは通常どおり上流から取得し、キャッシュとスナップショットに保存する
+- 他のノードは上流ではなく所有ノードに HTTP で問い合わせ、結果を自分のキャッシュには載せない
+  （クラスター全体でページのコピーは1つになり、キャッシュの容量がノード数に比例して増える）
+- 他ノードから繰り返し取得されるホットキーだけは、短い有効期限で自ノードにも複製する
+- 所有ノードが応答しない場合は、一定時間そのノードへの問い合わせを止めて自分で上流から取得する
+
+ピア一覧は MDN_CLUSTER_PEERS（全ノードで同じ一覧）、自ノードは MDN_CLUSTER_SELF で指定します。
+ノード間のリクエストは /_cluster/document エンドポイントで受け付けます。
+このエンドポイントはクライアントごとの流量制限を通らないため、共有シークレット（MDN_CLUSTER_SECRET）を
+設定しない限りクラスターモードは有効になりません。
+"""
+
+import bisect
+import hashlib
+import hmac
+import json
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+from . import config
+from .errors import CircuitOpenError, DeadlineExceededError, ExtractError, FetchError, MDNError
+from .extract import Document
+
+# ノード間のリクエストのパス
+PEER_PATH = "/_cluster/document"
+# ノード間のリクエストに付ける共有シークレットのヘッダー
+SECRET_HEADER = "X-MDN-Cluster-Secret"
+
+# ホットキーの集計を保持する最大キー数
+_MAX_HOT_KEYS = 4096
+# プールに保持するピアごとのアイドル接続数
+_MAX_IDLE_CONNECTIONS = 8
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """仮想ノードを使ったコンシステントハッシュのリング"""
+    def __init__(self, nodes: List[str], vnodes: int = config.CLUSTER_VNODES):
+        """
+        Args:
+            nodes: ノードの一覧（全ノードで同じ一覧を使うこと）
+            vnodes: 1ノードあたりの仮想ノード数（多いほど分担が均等になる）
+        """
+        self.nodes = sorted(set(nodes))
+        points = sorted(
+            (_hash(f"{node}#{i}"), node)
+            for node in self.nodes
+            for i in range(vnodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key: str) -> str:
+        """キーの所有ノード"""
+        if not self._hashes:
+            raise ValueError("Hash ring has no nodes")
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class HotKeys:
+    """他ノードから取得した回数をキーごとに数え、ホットキーを判定する"""
+    def __init__(self, threshold: float = config.CLUSTER_HOT_THRESHOLD, half_life: float = 60.0):
+        """
+        Args:
+            threshold: ホットキーとみなす回数
+            half_life: 回数が半減する秒数
+        """
+        self.threshold = threshold
+        self.half_life = half_life
+        self._counts: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str) -> bool:
+        """取得を1回記録し、ホットキーかどうかを返す"""
+        now = time.monotonic()
+        with self._lock:
+            count, updated = self._counts.get(key, (0.0, now))
+            count = count * 0.5 ** ((now - updated) / self.half_life) + 1
+            self._counts[key] = (count, now)
+            if len(self._counts) > _MAX_HOT_KEYS:
+                # 回数の少ない半分を破棄する
+                ranked = sorted(self._counts.items(), key=lambda item: item[1][0])
+                for stale_key, _ in ranked[:len(ranked) // 2]:
+                    del self._counts[stale_key]
+            return count >= self.threshold
+
+
+class _PeerConnections:
+    """1つのピアへの持続的接続のプール"""
+    def __init__(self, base_url: str):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.https = parts.scheme == "https"
+        self._idle: List[Any] = []
+        self._lock = threading.Lock()
+
+    def get(self, path: str, headers: Dict[str, str], timeout: float) -> Tuple[int, bytes]:
+        """
+        GETリクエストを送信し、(ステータス, ボディ) を返す
+
+        プールの接続がピア側で既に切断されていた場合は、新しい接続で1回だけ送り直します。
+        """
+        # http.client（ssl を含む）は起動時間を延ばすため、最初の問い合わせまで読み込まない
+        import http.client
+
+        connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            reused = conn is not None
+            if conn is None:
+                conn = connection_class(self.host, self.port, timeout=timeout)
+            elif conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                with self._lock:
+                    if len(self._idle) < _MAX_IDLE_CONNECTIONS:
+                        self._idle.append(conn)
+                        conn = None
+                if conn is not None:
+                    conn.close()
+            return response.status, body
+
+
+class Cluster:
+    """コンシステントハッシュでURLの所有ノードを決め、所有ノードからドキュメントを取得する"""
+    def __init__(
+        self,
+        self_url: str,
+        peers: List[str],
+        vnodes: int = config.CLUSTER_VNODES,
+        timeout: float = config.CLUSTER_TIMEOUT,
+        peer_backoff: float = config.CLUSTER_PEER_BACKOFF,
+        hot_threshold: float = config.CLUSTER_HOT_THRESHOLD,
+        hot_ttl: float = config.CLUSTER_HOT_TTL,
+        secret: str = config.CLUSTER_SECRET
+    ):
+        """
+        Args:
+            self_url: 自ノードのURL（peers に含まれていること）
+            peers: 全ノードのURL
+            vnodes: 1ノードあたりの仮想ノード数
+            timeout: 所有ノードへの問い合わせのタイムアウト（秒）
+            peer_backoff: 応答しなかったノードへの問い合わせを止める秒数
+            hot_threshold: 自ノードにも複製するホットキーの取得回数（1分ごとに半減）
+            hot_ttl: ホットキーの複製の有効期限（秒）
+            secret: ノード間のリクエストに付ける共有シークレット（必須）
+
+        Raises:
+            ValueError: 共有シークレットが空の場合
+        """
+        if not secret:
+            raise ValueError("Cluster mode requires a shared secret (MDN_CLUSTER_SECRET)")
+        self.self_url = self_url.rstrip("/")
+        self.ring = HashRing([peer.rstrip("/") for peer in peers] + [self.self_url], vnodes)
+        self.timeout = timeout
+        self.peer_backoff = peer_backoff
+        self.hot_ttl = hot_ttl
+        self.secret = secret
+        self.hot_keys = HotKeys(hot_threshold)
+        self._peers = {node: _PeerConnections(node) for node in self.ring.nodes if node != self.self_url}
+        self._down_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.owned = 0
+        self.peer_loads = 0
+        self.peer_failures = 0
+        self.hot_replicas = 0
+        self.served_to_peers = 0
+
+    def owner(self, key: str) -> str:
+        """キーの所有ノードのURL"""
+        return self.ring.owner(key)
+
+    def is_owner(self, key: str) -> bool:
+        """自ノードがキーの所有ノードかどうか"""
+        owned = self.owner(key) == self.self_url
+        if owned:
+            with self._lock:
+                self.owned += 1
+        return owned
+
+    def load(self, key: str, priority: str, deadline: Optional[float]) -> Optional[Tuple[Document, bool]]:
+        """
+        所有ノードからドキュメントを取得する
+
+        Returns:
+            (ドキュメント, 自ノードにも複製すべきホットキーか) のタプル。
+            所有ノードが応答しない場合はNone（呼び出し元が自分で上流から取得する）
+
+        Raises:
+            FetchError: 所有ノードでの上流からの取得が失敗した場合（404 など）
+            CircuitOpenError: 所有ノードが上流の障害中と判断した場合
+            DeadlineExceededError: 期限までに取得できなかった場合
+            ExtractError: 所有ノードでの抽出に失敗した場合
+        """
+        owner = self.owner(key)
+        with self._lock:
+            if self._down_until.get(owner, 0.0) > time.monotonic():
+                return None
+        timeout = self.timeout
+        headers = {"X-Priority": priority, SECRET_HEADER: self.secret}
+        if deadline is not None:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise DeadlineExceededError(f"Deadline exceeded before asking {owner} for {key}")
+            timeout = min(timeout, left)
+            headers["X-Deadline-Ms"] = str(int(left * 1000))
+
+        from http.client import HTTPException
+
+        try:
+            status, body = self._peers[owner].get(f"{PEER_PATH}?url={quote(key, safe='')}", headers, timeout)
+            data = json.loads(body)
+        except (OSError, HTTPException, ValueError) as e:
+            print(f"Cluster peer {owner} failed for {key}: {e}", file=sys.stderr)
+            with self._lock:
+                self.peer_failures += 1
+                self._down_until[owner] = time.monotonic() + self.peer_backoff
+            return None
+
+        if status != 200:
+            _raise_peer_error(status, data, owner, key)
+        doc = Document.from_dict(data["document"])
+        doc.source_bytes = data.get("source_bytes", 0)
+        if data.get("stale_seconds") is not None:
+            doc = doc.as_stale(data["stale_seconds"])
+        # 古いコピーは複製しない
+        hot = not doc.is_stale and self.hot_keys.record(key)
+        with self._lock:
+            self.peer_loads += 1
+            self.hot_replicas += hot
+        return doc, hot
+
+    def authorized(self, headers: Mapping[str, str]) -> bool:
+        """ノード間のリクエストの共有シークレットを確認する"""
+        return hmac.compare_digest(headers.get(SECRET_HEADER) or "", self.secret)
+
+    def record_served(self) -> None:
+        """他ノードからの問い合わせに応答した回数を数える"""
+        with self._lock:
+            self.served_to_peers += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """クラスターの統計情報"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "self": self.self_url,
+                "nodes": self.ring.nodes,
+                "down": sorted(node for node, until in self._down_until.items() if until > now),
+                "owned": self.owned,
+                "peer_loads": self.peer_loads,
+                "peer_failures": self.peer_failures,
+                "hot_replicas": self.hot_replicas,
+                "served_to_peers": self.served_to_peers,
+            }
+
+
+def _raise_peer_error(status: int, data: Dict[str, Any], owner: str, key: str) -> None:
+    """所有ノードのエラー応答を、ローカルで取得した場合と同じ例外に変換する"""
+    message = data.get("error") or f"Cluster peer {owner} returned {status} for {key}"
+    if status == 503:
+        raise CircuitOpenError(message, retry_after=data.get("retry_after", 0.0))
+    if status == 504:
+        raise DeadlineExceededError(message)
+    if data.get("type") == "ExtractError":
+        raise ExtractError(message)
+    if data.get("type") == "FetchError" or data.get("upstream_status") is not None:
+        raise FetchError(message, upstream_status=data.get("upstream_status"))
+    raise MDNError(message)
+
+
+def serve_peer_request(
+    pipeline,
+    headers: Mapping[str, str],
+    url: Optional[str],
+    priority: str,
+    deadline: float
+) -> Tuple[int, Dict[str, Any]]:
+    """
+    他ノードからのドキュメントの問い合わせに応答する（/_cluster/document）
+
+    自ノードが所有ノードでなくても転送はせず、自分で取得します（ノードごとのピア一覧が
+    一時的に食い違っていても、ノード間でリクエストが往復しないようにするため）。
+
+    Args:
+        pipeline: 使用するパイプライン
+        headers: リクエストヘッダー（共有シークレットの確認に使う）
+        url: 問い合わせられたURL
+        priority: 優先度クラス
+        deadline: 期限
+
+    Returns:
+        (HTTPステータス, レスポンスボディ) のタプル
+    """
+    cluster = pipeline.cluster
+    if cluster is None:
+        return 404, {"error": "Cluster mode is not enabled"}
+    if not cluster.authorized(headers):
+        return 403, {"error": "Invalid cluster secret"}
+    if not url:
+        return 400, {"error": "URL parameter is required"}
+    cluster.record_served()
+    try:
+        doc = pipeline.get_document(url, priority, deadline, forward=False)
+    except MDNError as e:
+        body = {"error": str(e), "type": type(e).__name__}
+        if isinstance(e, FetchError):
+            body["upstream_status"] = e.upstream_status
+        if isinstance(e, CircuitOpenError):
+            body["retry_after"] = e.retry_after
+        return e.status_code, body
+    return 200, {
+        "document": doc.to_dict(),
+        "source_bytes": doc.source_bytes,
+        "stale_seconds": doc.stale_seconds,
+    }
+
+
+_default_cluster: Optional[Cluster] = None
+_default_lock = threading.Lock()
+_warned_no_secret = False
+
+
+def get_cluster() -> Optional[Cluster]:
+    """
+    プロセス共通のクラスター
+
+    MDN_CLUSTER_PEERS と MDN_CLUSTER_SELF が未設定の場合はNone。
+    MDN_CLUSTER_SECRET が未設定の場合も、警告を出して単独で動作します（None）。
+    """
+    global _default_cluster, _warned_no_secret
+    if not (config.CLUSTER_PEERS and config.CLUSTER_SELF):
+        return None
+    if not config.CLUSTER_SECRET:
+        if not _warned_no_secret:
+            _warned_no_secret = True
+            print("MDN_CLUSTER_SECRET is not set; cluster mode is disabled", file=sys.stderr)
+        return None
+    if _default_cluster is None:
+        with _default_lock:
+            if _default_cluster is None:
+                peers = [peer.strip() for peer in config.CLUSTER_PEERS.split(",") if peer.strip()]
+                _default_cluster = Cluster(config.CLUSTER_SELF, peers)
+    return _default_cluster
@@ -0,0 +1,196 @@
+"""
+コア設定値
+
+全フロントエンド（FastAPI版・標準ライブラリ版）で共有する設定値です。
+環境変数から読み込み、未設定の場合はデフォルト値を使用します。
+"""
+
+import os
+
+# 取得を許可するMDNのベースURL
+MDN_BASE_URL = "https://developer.mozilla.org/"
+
+# 上流へのリクエストで使用するUser-Agent
+USER_AGENT = os.environ.get(
+    "MDN_USER_AGENT",
+    "Mozilla/5.0 (compatible; mdn-web-scraper/1.0; +https://github.com/snd-primary/web-scraper)"
+)
+
+# 上流オリジンの差し替え（ローカルのスタブサーバーでの検証用）
+# 例: MDN_UPSTREAM=http://127.0.0.1:9000
+UPSTREAM_ORIGIN = os.environ.get("MDN_UPSTREAM", "")
+
+# 上流リクエストのタイムアウト（秒）
+FETCH_TIMEOUT = float(os.environ.get("MDN_FETCH_TIMEOUT", 10))
+# 段階ごとの期限は観測したp99のこの倍数にする（FETCH_TIMEOUT を上限とする）
+FETCH_TIMEOUT_MULTIPLIER = float(os.environ.get("MDN_FETCH_TIMEOUT_MULTIPLIER", 4))
+# 段階ごとの期限の下限（秒）
+FETCH_MIN_STAGE_TIMEOUT = float(os.environ.get("MDN_FETCH_MIN_STAGE_TIMEOUT", 0.5))
+# パーセンタイルを使い始めるまでに必要なサンプル数
+FETCH_MIN_SAMPLES = int(os.environ.get("MDN_FETCH_MIN_SAMPLES", 20))
+# p95 を超えたリクエストに2回目のリクエスト（ヘッジ）を送るかどうか
+FETCH_HEDGE = os.environ.get("MDN_FETCH_HEDGE", "true").lower() != "false"
+# ヘッジを送るリクエストの割合の上限
+FETCH_HEDGE_RATIO = float(os.environ.get("MDN_FETCH_HEDGE_RATIO", 0.1))
+# 1回の取得で読み込むレスポンスの最大バイト数（超えた時点で読み込みを打ち切る）
+FETCH_MAX_BYTES = int(os.environ.get("MDN_FETCH_MAX_BYTES", 8 * 1024 * 1024))
+# 抽出するHTMLの最大要素数（超えた時点で解析を打ち切る）
+EXTRACT_MAX_ELEMENTS = int(os.environ.get("MDN_EXTRACT_MAX_ELEMENTS", 200000))
+
+# 上流の障害時に即座に失敗させるサーキットブレーカーの設定
+# 直近 MDN_BREAKER_WINDOW 件の取得のうち、失敗（遅延を含む）がこの割合を超えたら回路を開く
+BREAKER_FAILURE_RATIO = float(os.environ.get("MDN_BREAKER_FAILURE_RATIO", 0.5))
+BREAKER_WINDOW = int(os.environ.get("MDN_BREAKER_WINDOW", 20))
+# 割合を判定するのに必要な最小の取得数
+BREAKER_MIN_CALLS = int(os.environ.get("MDN_BREAKER_MIN_CALLS", 5))
+# この秒数を超えた取得は成功しても失敗として数える
+BREAKER_SLOW_CALL = float(os.environ.get("MDN_BREAKER_SLOW_CALL", 5))
+# 回路を開いてから試行リクエストを通すまでの秒数
+BREAKER_OPEN_SECONDS = float(os.environ.get("MDN_BREAKER_OPEN_SECONDS", 30))
+# 半開状態で同時に通す試行リクエストの数
+BREAKER_HALF_OPEN_PROBES = int(os.environ.get("MDN_BREAKER_HALF_OPEN_PROBES", 1))
+
+# リクエストの期限と優先度の設定
+# 対話的なリクエスト（ツール呼び出し・APIリクエスト）の既定の期限（秒）
+REQUEST_DEADLINE = float(os.environ.get("MDN_REQUEST_DEADLINE", 30))
+# 裏での再取得・先読みなどの既定の期限（秒）
+BACKGROUND_DEADLINE = float(os.environ.get("MDN_BACKGROUND_DEADLINE", 120))
+# 同時に実行する上流への取得と解析の上限
+WORK_SLOTS = int(os.environ.get("MDN_WORK_SLOTS", 8))
+# 作業枠が空いたときに割り当てる優先度クラスごとの重み
+PRIORITY_WEIGHT_INTERACTIVE = int(os.environ.get("MDN_PRIORITY_WEIGHT_INTERACTIVE", 16))
+PRIORITY_WEIGHT_BACKGROUND = int(os.environ.get("MDN_PRIORITY_WEIGHT_BACKGROUND", 2))
+PRIORITY_WEIGHT_BULK = int(os.environ.get("MDN_PRIORITY_WEIGHT_BULK", 1))
+
+# クライアントごとの公平なキューイングとクォータ（HTTPサーバー）
+# 同時に処理するリクエストの上限（0の場合は公平なキューイングを行わない）
+FAIR_SLOTS = int(os.environ.get("MDN_FAIR_SLOTS", 8))
+# deficit round robin で1巡ごとに各クライアントに与えるバイト数
+FAIR_QUANTUM = int(os.environ.get("MDN_FAIR_QUANTUM", 64 * 1024))
+# クライアントごとに待機できるリクエスト数
+FAIR_MAX_QUEUE = int(os.environ.get("MDN_FAIR_MAX_QUEUE", 64))
+# クライアントごとの1分あたりのリクエスト数・レスポンスのバイト数の上限（0の場合は無制限）
+CLIENT_REQUESTS_PER_MINUTE = float(os.environ.get("MDN_CLIENT_REQUESTS_PER_MINUTE", 600))
+CLIENT_BYTES_PER_MINUTE = float(os.environ.get("MDN_CLIENT_BYTES_PER_MINUTE", 64 * 1024 * 1024))
+# クライアントの識別に使うAPIキー（カンマ区切り。一覧に無いキーは無視して接続元アドレスで識別する）
+CLIENT_API_KEYS = os.environ.get("MDN_CLIENT_API_KEYS", "")
+
+# 一括取得（/fetch-mdn/batch）の設定
+# 1回のリクエストで指定できるURLの上限と、同時に取得するURLの上限
+BATCH_MAX_URLS = int(os.environ.get("MDN_BATCH_MAX_URLS", 100))
+BATCH_CONCURRENCY = int(os.environ.get("MDN_BATCH_CONCURRENCY", 8))
+
+# 抽出済みドキュメントのキャッシュ設定
+CACHE_TTL = float(os.environ.get("MDN_CACHE_TTL", 3600))
+CACHE_MAX_ENTRIES = int(os.environ.get("MDN_CACHE_MAX_ENTRIES", 512))
+# キャッシュするドキュメントの大きさの合計の上限（バイト、0の場合は件数だけで制限する）
+CACHE_MAX_BYTES = int(os.environ.get("MDN_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# 有効期限切れ後も stale-while-revalidate で返してよい秒数
+CACHE_STALE_TTL = float(os.environ.get("MDN_CACHE_STALE_TTL", 86400))
+
+# 圧縮スナップショットストアの設定（python -m mdn_core snapshot stats で確認）
+# 保存先のディレクトリ（空の場合は保存しない）
+SNAPSHOT_DIR = os.environ.get("MDN_SNAPSHOT_DIR", "")
+# 圧縮方式（auto: zstandard があれば zstd、無ければ zlib）
+SNAPSHOT_CODEC = os.environ.get("MDN_SNAPSHOT_CODEC", "auto")
+SNAPSHOT_LEVEL = int(os.environ.get("MDN_SNAPSHOT_LEVEL", 9))
+# 学習する圧縮辞書の大きさ（バイト）と、自動で学習するまでに保存するドキュメント数
+SNAPSHOT_DICT_SIZE = int(os.environ.get("MDN_SNAPSHOT_DICT_SIZE", 64 * 1024))
+SNAPSHOT_TRAIN_SAMPLES = int(os.environ.get("MDN_SNAPSHOT_TRAIN_SAMPLES", 64))
+# 版の差分を連ねる最大の段数（読み込み時に展開する回数の上限）
+SNAPSHOT_MAX_DELTA_CHAIN = int(os.environ.get("MDN_SNAPSHOT_MAX_DELTA_CHAIN", 8))
+
+# サイトマップにもとづくミラーの差分更新（スナップショットストアが必要）
+# サイトマップのファイルパスまたはURL（空の場合は定期実行しない）
+MIRROR_SITEMAP = os.environ.get("MDN_MIRROR_SITEMAP", "")
+# 差分更新を実行する間隔（秒）
+MIRROR_INTERVAL = float(os.environ.get("MDN_MIRROR_INTERVAL", 86400))
+# 同時に実行する取得の上限と、1回の更新で取得するURLの上限（0の場合は無制限）
+MIRROR_CONCURRENCY = int(os.environ.get("MDN_MIRROR_CONCURRENCY", 4))
+MIRROR_MAX_FETCHES = int(os.environ.get("MDN_MIRROR_MAX_FETCHES", 0))
+
+# キャッシュ・ミラー済みドキュメントの一括エクスポート（/export と python -m mdn_core export）
+# Arrow / Parquet の1バッチ（行グループ）あたりのドキュメント数
+EXPORT_BATCH_ROWS = int(os.environ.get("MDN_EXPORT_BATCH_ROWS", 512))
+# 同時に実行できるエクスポートの数
+EXPORT_MAX_CONCURRENT = int(os.environ.get("MDN_EXPORT_MAX_CONCURRENT", 2))
+
+# クラスターモード（groupcache 方式でURLごとに所有ノードを決めてキャッシュを分担する）
+# 全ノードのURL（カンマ区切り、全ノードで同じ一覧を指定する。空の場合は単独で動作する）
+# 例: MDN_CLUSTER_PEERS=http://10.0.0.1:8000,http://10.0.0.2:8000
+CLUSTER_PEERS = os.environ.get("MDN_CLUSTER_PEERS", "")
+# 一覧のうち自ノードのURL
+CLUSTER_SELF = os.environ.get("MDN_CLUSTER_SELF", "")
+# ハッシュリング上の1ノードあたりの仮想ノード数
+CLUSTER_VNODES = int(os.environ.get("MDN_CLUSTER_VNODES", 160))
+# 所有ノードへの問い合わせのタイムアウト（秒）
+CLUSTER_TIMEOUT = float(os.environ.get("MDN_CLUSTER_TIMEOUT", 5))
+# 応答しなかったノードへの問い合わせを止める秒数（その間は自分で上流から取得する）
+CLUSTER_PEER_BACKOFF = float(os.environ.get("MDN_CLUSTER_PEER_BACKOFF", 10))
+# 他ノードから取得した回数（1分ごとに半減）がこの値以上のキーは、自ノードにも複製する
+CLUSTER_HOT_THRESHOLD = float(os.environ.get("MDN_CLUSTER_HOT_THRESHOLD", 4))
+# ホットキーの複製の有効期限（秒）
+CLUSTER_HOT_TTL = float(os.environ.get("MDN_CLUSTER_HOT_TTL", 300))
+# ノード間のリクエストに付ける共有シークレット（クラスターモードでは必須。空の場合はクラスターモードを無効にする）
+CLUSTER_SECRET = os.environ.get("MDN_CLUSTER_SECRET", "")
+
+# バックグラウンド更新の設定
+# 同時に実行する再取得の上限（プロセス全体）
+REFRESH_CONCURRENCY = int(os.environ.get("MDN_REFRESH_CONCURRENCY", 4))
+# 先回り更新を確認する間隔（秒）
+REFRESH_INTERVAL = float(os.environ.get("MDN_REFRESH_INTERVAL", 30))
+# 有効期限の何秒前から先回り更新の対象にするか
+REFRESH_AHEAD = float(os.environ.get("MDN_REFRESH_AHEAD", 300))
+# 先回り更新の対象にする最小アクセス頻度（間隔ごとに半減する）
+REFRESH_MIN_HITS = float(os.environ.get("MDN_REFRESH_MIN_HITS", 2))
+
+# 標準ライブラリ版HTTPサーバーの設定
+# アイドル状態の持続的接続を切断するまでの秒数
+HTTP_IDLE_TIMEOUT = float(os.environ.get("MDN_HTTP_IDLE_TIMEOUT", 15))
+# この大きさを超えるレスポンスは chunked 転送で逐次送信する（バイト）
+HTTP_CHUNK_SIZE = int(os.environ.get("MDN_HTTP_CHUNK_SIZE", 64 * 1024))
+# リクエストボディの上限（バイト、超えた場合は 413 を返して接続を切断する）
+HTTP_MAX_BODY = int(os.environ.get("MDN_HTTP_MAX_BODY", 1024 * 1024))
+
+# リンクグラフに基づく先読みの設定
+PREFETCH_ENABLED = os.environ.get("MDN_PREFETCH", "true").lower() != "false"
+# 1回のアクセスで先読みする最大ページ数
+PREFETCH_MAX_PAGES = int(os.environ.get("MDN_PREFETCH_MAX_PAGES", 2))
+# 先読みする最低スコア（観測した遷移1回 = 1.0、先頭のリンク = 0.5）
+PREFETCH_MIN_SCORE = float(os.environ.get("MDN_PREFETCH_MIN_SCORE", 0.25))
+# 1分あたりの先読みリクエスト数・バイト数の上限
+PREFETCH_REQUESTS_PER_MINUTE = int(os.environ.get("MDN_PREFETCH_REQUESTS_PER_MINUTE", 30))
+PREFETCH_BYTES_PER_MINUTE = int(os.environ.get("MDN_PREFETCH_BYTES_PER_MINUTE", 8 * 1024 * 1024))
+# キューに積める先読みの上限
+PREFETCH_MAX_PENDING = int(os.environ.get("MDN_PREFETCH_MAX_PENDING", 8))
+
+# 診断の設定
+# この時間（ミリ秒）を超えたリクエストの段階ごとの時間を stderr と /debug/slow に記録する（0の場合は記録しない）
+SLOW_REQUEST_MS = float(os.environ.get("MDN_SLOW_REQUEST_MS", 1000))
+# /debug/slow で参照できる直近の遅いリクエストの件数
+SLOW_REQUEST_LOG_SIZE = int(os.environ.get("MDN_SLOW_REQUEST_LOG_SIZE", 100))
+# /debug/profile のスタックの採取間隔（秒）と、1回の採取の最大秒数
+PROFILE_INTERVAL = float(os.environ.get("MDN_PROFILE_INTERVAL", 0.01))
+PROFILE_MAX_SECONDS = float(os.environ.get("MDN_PROFILE_MAX_SECONDS", 60))
+# tracemalloc でリクエストごとのメモリ使用量のピークを計測する（割り当てが遅くなるため既定は無効）
+MEMORY_TRACKING = os.environ.get("MDN_MEMORY_TRACKING", "false").lower() == "true"
+# /debug/ 以下のエンドポイントに必要な X-Debug-Token（空の場合はループバックからのみ受け付ける）
+DEBUG_TOKEN = os.environ.get("MDN_DEBUG_TOKEN", "")
+
+# ロケール（言語版）の設定
+# ロケールの無いURL（/docs/...）に補うロケールで、全てのロケールの最後のフォールバック先
+DEFAULT_LOCALE = os.environ.get("MDN_DEFAULT_LOCALE", "en-US")
+# 翻訳が無いページを、フォールバック先のロケールの版で返す
+LOCALE_FALLBACK = os.environ.get("MDN_LOCALE_FALLBACK", "true").lower() != "false"
+# ロケールごとのフォールバック先（MDN_DEFAULT_LOCALE より先に試す、指定の無いロケールは MDN_DEFAULT_LOCALE のみ）
+# 例: MDN_LOCALE_FALLBACKS="zh-TW=zh-CN;pt-PT=pt-BR;ca=es"
+LOCALE_FALLBACKS = os.environ.get("MDN_LOCALE_FALLBACKS", "")
+# ページごとに存在するロケールを覚えておく最大ページ数と秒数
+LOCALE_MAP_SIZE = int(os.environ.get("MDN_LOCALE_MAP_SIZE", 50000))
+LOCALE_MAP_TTL = float(os.environ.get("MDN_LOCALE_MAP_TTL", 86400))
+
+# シンボル索引（python -m mdn_core index build で作成）のパス
+INDEX_PATH = os.environ.get(
+    "MDN_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mdn_index.bin")
+)
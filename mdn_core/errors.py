@@ -0,0 +1,56 @@
+"""
+コアライブラリの例外定義
+
+各フロントエンドはこれらの例外を自身のエラー形式
+（HTTPステータス、JSONエラー、ツールのエラーメッセージ）に変換します。
+"""
+
+from typing import Optional
+
+
+class MDNError(Exception):
+    """コアライブラリの基底例外"""
+    status_code = 500
+
+
+class InvalidURLError(MDNError):
+    """MDN以外のURLが指定された場合の例外"""
+    status_code = 400
+
+
+class FetchError(MDNError):
+    """上流からの取得に失敗した場合の例外"""
+    status_code = 500
+
+    def __init__(self, message: str, upstream_status: Optional[int] = None):
+        super().__init__(message)
+        # 上流が返したHTTPステータス（通信エラーの場合はNone）
+        self.upstream_status = upstream_status
+
+
+class CircuitOpenError(FetchError):
+    """上流の障害中のため、取得せずに即座に失敗した場合の例外"""
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DocumentTooLargeError(FetchError):
+    """レスポンスのバイト数またはHTMLの要素数が上限を超えたため、読み込みを打ち切った場合の例外"""
+    status_code = 502
+
+    def __init__(self, message: str, upstream_status: Optional[int] = 200):
+        # 上流は正常に応答しているため、上流の障害（サーキットブレーカーの失敗）としては扱わない
+        super().__init__(message, upstream_status=upstream_status)
+
+
+class DeadlineExceededError(MDNError):
+    """リクエストの期限を過ぎたため、処理を打ち切った場合の例外"""
+    status_code = 504
+
+
+class ExtractError(MDNError):
+    """HTMLからメインコンテンツを抽出できなかった場合の例外"""
+    status_code = 500
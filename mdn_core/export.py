@@ -0,0 +1,515 @@
+"""
+キャッシュ・ミラー済みドキュメントの一括エクスポート
+
+RAG などの下流の処理に、抽出済みのコーパスをまとめて渡すためのものです。
+/fetch-mdn でページごとに取得する代わりに、スナップショットストア（ミラーと取得済みのページ）と
+プロセス内のキャッシュにあるドキュメントを、1行1件のJSON（NDJSON）または
+列指向の Arrow IPC ストリーム / Parquet（pyarrow が必要）で順に書き出します。
+
+- 各レコードは create_mdn_context の項目（type・url・content・source・instruction）に、
+  タイトル・説明・ロケール・パスと、構造化した付加情報（metadata）を加えたものです
+  （Arrow / Parquet では metadata の各項目を列として展開します）
+- ドキュメントは1件ずつ（Arrow / Parquet は MDN_EXPORT_BATCH_ROWS 件ずつ）読み出しては書き出すため、
+  メモリ使用量はコーパスの大きさによらず一定です
+- スナップショットストアはデータファイル内の位置の順に読むため、ディスクを先頭から順に読むだけです
+- パスの前方一致・ロケール・更新時刻で絞り込めます（絞り込みは内容を展開する前に行う）
+
+更新時刻は、サイトマップの lastmod が分かればその時刻、無ければスナップショットに保存した
+（または上流で変わっていないことを確認した）時刻、キャッシュにしか無い場合はキャッシュに載せた時刻です。
+"""
+
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional
+from urllib.parse import urlsplit
+
+from . import config
+from .cache import TTLCache
+from .errors import MDNError
+from .extract import Document
+from .locales import url_locale
+from .mirror import lastmod_time
+from .protocol import create_mdn_context
+from .snapshot import Revision, SnapshotStore, encode_document
+
+# 出力形式ごとの Content-Type とファイルの拡張子
+FORMATS = {
+    "ndjson": ("application/x-ndjson", ".ndjson"),
+    "arrow": ("application/vnd.apache.arrow.stream", ".arrows"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+}
+
+# レコードの出どころ（metadata.origin）
+SNAPSHOT = "snapshot"
+CACHE = "cache"
+
+# エクスポートの対象（"all" はスナップショットとキャッシュの両方、重複するURLはスナップショットを使う）
+SOURCES = ("all", SNAPSHOT, CACHE)
+
+# Arrow / Parquet の列（metadata の項目は展開する）
+_COLUMNS = (
+    "url", "locale", "path", "title", "description", "content", "type", "source", "instruction",
+    "origin", "hash", "modified", "lastmod", "etag", "links",
+)
+
+class ExportBusyError(MDNError):
+    """同時に実行できるエクスポートの数を超えた場合の例外"""
+    status_code = 429
+
+
+class ExportUnavailableError(MDNError):
+    """出力形式に必要なパッケージ（pyarrow）が無い場合の例外"""
+    status_code = 501
+
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """
+    絞り込みの時刻（UNIX時刻の数値または ISO 8601）を解釈する
+
+    Raises:
+        ValueError: 解釈できない場合
+    """
+    if value is None or not value.strip():
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = lastmod_time(value)
+    if parsed is None:
+        raise ValueError(f"Invalid time: {value}")
+    return parsed
+
+
+class ExportFilter:
+    """エクスポートするドキュメントの絞り込み"""
+    def __init__(
+        self,
+        prefix: str = "",
+        locales: Optional[Iterable[str]] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ):
+        """
+        Args:
+            prefix: パスの前方一致（"/en-US/docs/Web/CSS" など、URLでも指定できる）
+            locales: 含めるロケール（大文字小文字を区別しない、省略時は全ロケール）
+            since: この時刻以降に更新されたものだけを含める（UNIX時刻）
+            until: この時刻より前に更新されたものだけを含める（UNIX時刻）
+        """
+        if prefix.startswith(("http://", "https://")):
+            prefix = urlsplit(prefix).path
+        elif prefix and not prefix.startswith("/"):
+            prefix = "/" + prefix
+        self.prefix = prefix
+        self.locales = {locale.lower() for locale in locales} if locales else None
+        self.since = since
+        self.until = until
+
+    @classmethod
+    def from_query(cls, query: Mapping[str, List[str]]) -> "ExportFilter":
+        """
+        クエリパラメーター（parse_qs の形式）から作成する
+
+        locale はカンマ区切りでも、繰り返し指定しても構いません。
+
+        Raises:
+            ValueError: 時刻を解釈できない場合
+        """
+        locales = [
+            locale.strip()
+            for value in query.get("locale", [])
+            for locale in value.split(",")
+            if locale.strip()
+        ]
+        return cls(
+            prefix=query.get("prefix", [""])[0],
+            locales=locales,
+            since=parse_time(query.get("since", [None])[0]),
+            until=parse_time(query.get("until", [None])[0]),
+        )
+
+    def matches_url(self, url: str) -> bool:
+        """パスとロケールの条件に一致するか"""
+        if self.prefix and not urlsplit(url).path.startswith(self.prefix):
+            return False
+        if self.locales is not None and (url_locale(url) or "").lower() not in self.locales:
+            return False
+        return True
+
+    def matches_time(self, modified: float) -> bool:
+        """更新時刻の条件に一致するか"""
+        if self.since is not None and modified < self.since:
+            return False
+        return self.until is None or modified < self.until
+
+
+def revision_modified(revision: Revision) -> float:
+    """版の更新時刻（サイトマップの lastmod、不明な場合は保存した時刻）"""
+    return lastmod_time(revision.meta.get("lastmod")) or revision.stored_at
+
+
+def export_record(
+    url: str,
+    doc: Document,
+    origin: str,
+    modified: float,
+    digest: str,
+    meta: Optional[Mapping[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    エクスポートする1件のレコードを作成
+
+    Args:
+        url: ドキュメントのURL（キャッシュキー）
+        doc: 抽出済みドキュメント
+        origin: 出どころ（SNAPSHOT / CACHE）
+        modified: 更新時刻（UNIX時刻）
+        digest: 内容のハッシュ（スナップショットストアと同じ SHA-256）
+        meta: 版の付加情報（ETag・lastmod など）
+
+    Returns:
+        create_mdn_context の項目に、タイトル・説明・ロケール・パスと metadata を加えた辞書
+    """
+    meta = meta or {}
+    path = urlsplit(url).path
+    record = create_mdn_context(doc.to_markdown(), url)
+    record.update(
+        title=doc.title,
+        description=doc.description,
+        locale=url_locale(url),
+        path=path,
+        metadata={
+            "origin": origin,
+            "hash": digest,
+            "modified": modified,
+            "lastmod": meta.get("lastmod"),
+            "etag": meta.get("etag"),
+            "links": doc.links,
+        },
+    )
+    return record
+
+
+def iter_records(
+    snapshots: Optional[SnapshotStore],
+    cache: Optional[TTLCache],
+    filters: Optional[ExportFilter] = None,
+    source: str = "all"
+) -> Iterator[Dict[str, Any]]:
+    """
+    スナップショットストアとキャッシュのドキュメントを、レコードとして1件ずつ返す
+
+    スナップショットストアの各URLの最新の版を先に（データファイル内の位置の順に）返し、
+    続いてスナップショットストアに無いキャッシュ中のドキュメントを返します。
+
+    Args:
+        snapshots: スナップショットストア（Noneの場合はキャッシュだけ）
+        cache: キャッシュ（Noneの場合はスナップショットストアだけ）
+        filters: 絞り込み（省略時は全て）
+        source: "all"・"snapshot"・"cache"
+    """
+    filters = filters or ExportFilter()
+    if snapshots is not None and source in ("all", SNAPSHOT):
+        def select(revision: Revision) -> bool:
+            return filters.matches_url(revision.url) and filters.matches_time(revision_modified(revision))
+
+        for revision, doc in snapshots.iter_latest(select):
+            yield export_record(revision.url, doc, SNAPSHOT, revision_modified(revision), revision.digest, revision.meta)
+
+    if cache is not None and source in ("all", CACHE):
+        now = time.time()
+        for key in cache.keys():
+            if not isinstance(key, str) or not filters.matches_url(key):
+                continue
+            if source == "all" and snapshots is not None and key in snapshots:
+                continue
+            entry = cache.get_entry(key)
+            if entry is None:
+                # 一覧を取得した後に追い出された
+                continue
+            modified = now - entry.age
+            if not filters.matches_time(modified):
+                continue
+            digest = hashlib.sha256(encode_document(entry.value)).hexdigest()
+            yield export_record(key, entry.value, CACHE, modified, digest)
+
+
+def iter_ndjson(records: Iterable[Dict[str, Any]], chunk_size: int = config.HTTP_CHUNK_SIZE) -> Iterator[bytes]:
+    """レコードを1行1件のJSONにし、chunk_size バイト程度ずつまとめて返す"""
+    buffer = []
+    buffered = 0
+    for record in records:
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode()
+        buffer.append(line)
+        buffered += len(line)
+        if buffered >= chunk_size:
+            yield b"".join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+class _ChunkSink:
+    """pyarrow の書き込み先（書き込まれたバイト列を溜めておき、drain() で取り出す）"""
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _import_pyarrow(fmt: str):
+    try:
+        import pyarrow
+    except ImportError:
+        raise ExportUnavailableError(f"The {fmt} export format requires pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+
+def _arrow_schema(pa):
+    columns = []
+    for name in _COLUMNS:
+        if name == "links":
+            columns.append((name, pa.list_(pa.string())))
+        elif name == "modified":
+            columns.append((name, pa.float64()))
+        else:
+            columns.append((name, pa.string()))
+    return pa.schema(columns)
+
+
+def _flatten(record: Dict[str, Any]) -> Dict[str, Any]:
+    row = dict(record)
+    row.update(row.pop("metadata"))
+    return row
+
+
+def iter_columnar(records: Iterable[Dict[str, Any]], fmt: str, batch_rows: int = config.EXPORT_BATCH_ROWS) -> Iterator[bytes]:
+    """
+    レコードを batch_rows 件ずつ Arrow IPC ストリーム（"arrow"）または Parquet（"parquet"）にして返す
+
+    Parquet は batch_rows 件ごとに1つの行グループになります。
+
+    Raises:
+        ExportUnavailableError: pyarrow が無い場合
+    """
+    pa = _import_pyarrow(fmt)
+    schema = _arrow_schema(pa)
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        writer = pq.ParquetWriter(sink, schema)
+
+        def write(batch):
+            writer.write_table(pa.Table.from_batches([batch], schema=schema))
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+        write = writer.write_batch
+
+    closed = False
+    try:
+        rows = []
+        for record in records:
+            rows.append(_flatten(record))
+            if len(rows) < batch_rows:
+                continue
+            write(pa.RecordBatch.from_pylist(rows, schema=schema))
+            rows = []
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+        if rows:
+            write(pa.RecordBatch.from_pylist(rows, schema=schema))
+        # Parquet のフッター（行グループの索引）は最後に書き込まれる
+        writer.close()
+        closed = True
+        tail = sink.drain()
+        if tail:
+            yield tail
+    finally:
+        if not closed:
+            writer.close()
+
+
+class ExportStream:
+    """
+    1回のエクスポートの出力（バイト列のチャンクを返すイテレーター）
+
+    最後まで読まずに終える場合（クライアントの切断など）も、必ず close() を呼んでください。
+    """
+    def __init__(self, exporter: "CorpusExporter", fmt: str, records: Iterator[Dict[str, Any]]):
+        self.exporter = exporter
+        self.format = fmt
+        self.content_type, extension = FORMATS[fmt]
+        self.filename = time.strftime("mdn-export-%Y%m%d-%H%M%S") + extension
+        self.documents = 0
+        self.bytes = 0
+        self.complete = False
+        self._start = time.monotonic()
+        self._closed = False
+        counted = self._count(records)
+        if fmt == "ndjson":
+            self._chunks = iter_ndjson(counted)
+        else:
+            self._chunks = iter_columnar(counted, fmt, exporter.batch_rows)
+
+    def _count(self, records: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for record in records:
+            self.documents += 1
+            yield record
+
+    @property
+    def elapsed(self) -> float:
+        """開始からの秒数"""
+        return time.monotonic() - self._start
+
+    def __iter__(self) -> "ExportStream":
+        return self
+
+    def __next__(self) -> bytes:
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.complete = True
+            self.close()
+            raise
+        self.bytes += len(chunk)
+        return chunk
+
+    def close(self) -> None:
+        """読み出しを終了し、同時実行の枠を返す"""
+        if self._closed:
+            return
+        self._closed = True
+        self._chunks.close()
+        self.exporter._finish(self)
+
+
+class CorpusExporter:
+    """エクスポートの同時実行数の制限と統計情報"""
+    def __init__(
+        self,
+        max_concurrent: int = config.EXPORT_MAX_CONCURRENT,
+        batch_rows: int = config.EXPORT_BATCH_ROWS
+    ):
+        """
+        Args:
+            max_concurrent: 同時に実行できるエクスポートの数
+            batch_rows: Arrow / Parquet の1バッチあたりのドキュメント数
+        """
+        self.batch_rows = batch_rows
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrent))
+        self._lock = threading.Lock()
+        self.exports = 0
+        self.active = 0
+        self.documents = 0
+        self.bytes = 0
+        self.last: Optional[Dict[str, Any]] = None
+
+    def open(
+        self,
+        snapshots: Optional[SnapshotStore],
+        cache: Optional[TTLCache],
+        fmt: str = "ndjson",
+        filters: Optional[ExportFilter] = None,
+        source: str = "all"
+    ) -> ExportStream:
+        """
+        エクスポートを開始する
+
+        形式の確認と同時実行の枠の確保はここで行うため、レスポンスを送り始める前にエラーを返せます。
+
+        Args:
+            snapshots: スナップショットストア
+            cache: キャッシュ
+            fmt: "ndjson"・"arrow"・"parquet"
+            filters: 絞り込み
+            source: "all"・"snapshot"・"cache"
+
+        Raises:
+            ValueError: 形式または対象が不明な場合
+            ExportUnavailableError: Arrow / Parquet で pyarrow が無い場合
+            ExportBusyError: 同時に実行できるエクスポートの数を超えた場合
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format: {fmt} (expected one of {', '.join(FORMATS)})")
+        if source not in SOURCES:
+            raise ValueError(f"Unknown export source: {source} (expected one of {', '.join(SOURCES)})")
+        if fmt != "ndjson":
+            _import_pyarrow(fmt)
+        if not self._slots.acquire(blocking=False):
+            raise ExportBusyError("Too many exports are running")
+        with self._lock:
+            self.active += 1
+        return ExportStream(self, fmt, iter_records(snapshots, cache, filters, source))
+
+    def _finish(self, stream: ExportStream) -> None:
+        seconds = stream.elapsed
+        with self._lock:
+            self.active -= 1
+            self.exports += 1
+            self.documents += stream.documents
+            self.bytes += stream.bytes
+            self.last = {
+                "format": stream.format,
+                "documents": stream.documents,
+                "bytes": stream.bytes,
+                "seconds": round(seconds, 3),
+                "complete": stream.complete,
+            }
+        self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """エクスポートの統計情報"""
+        with self._lock:
+            return {
+                "exports": self.exports,
+                "active": self.active,
+                "documents": self.documents,
+                "bytes": self.bytes,
+                "last": self.last,
+            }
+
+
+_default_exporter: Optional[CorpusExporter] = None
+_default_lock = threading.Lock()
+
+
+def get_exporter() -> CorpusExporter:
+    """プロセス共通のエクスポートの管理を取得する"""
+    global _default_exporter
+    if _default_exporter is None:
+        with _default_lock:
+            if _default_exporter is None:
+                _default_exporter = CorpusExporter()
+    return _default_exporter
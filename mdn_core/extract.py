@@ -0,0 +1,359 @@
+"""
+MDNページのHTMLからメインコンテンツを抽出する
+
+BeautifulSoupに依存せず、標準ライブラリの html.parser で1パス処理します。
+抽出ルールは従来の web_scraper.fetch_mdn_doc と同じです。
+
+- メインコンテンツは article.main-page-content、無ければ main#content
+- .sidebar / .newsletter-container / .prevnext-container を除外
+- タイトルは最初の h1、説明は meta[name="description"]
+- メインコンテンツ内のMDNドキュメントへのリンクを収集（先読みに使用）
+- link[rel="alternate"][hreflang] から他のロケールの版のURLを収集（ロケールのフォールバックに使用）
+
+DOM ツリーは作らず、要素のスタックと抽出中のテキストだけを保持します。HTMLはバイト列のまま
+一定の大きさずつデコードしてパーサーに渡すため、本文全体の文字列のコピーも作りません。
+要素数が max_elements を超えた時点で解析を打ち切ります。
+"""
+
+import codecs
+import copy
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Union
+from urllib.parse import urldefrag, urljoin
+
+from . import config
+from .errors import DocumentTooLargeError, ExtractError
+from .locales import url_locale
+
+# 除外する要素のクラス名
+SKIP_CLASSES = frozenset({"sidebar", "newsletter-container", "prevnext-container"})
+
+# テキストとして扱わない要素
+_NON_TEXT_TAGS = frozenset({"script", "style", "template", "noscript"})
+
+# 終了タグを持たない要素
+_VOID_TAGS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+})
+
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+# パーサーに1回で渡すHTMLのバイト数
+_FEED_SIZE = 64 * 1024
+
+# 他のロケールの版を返した理由
+FALLBACK_MISSING = "missing"          # 要求したロケールの翻訳が無い
+FALLBACK_UNAVAILABLE = "unavailable"  # 上流の障害中で、要求したロケールの版を取得できない
+
+
+class Document:
+    """抽出済みのMDNドキュメント"""
+    def __init__(
+        self,
+        url: str,
+        title: str,
+        description: str,
+        text: str,
+        links: Optional[List[str]] = None,
+        source_bytes: int = 0,
+        alternates: Optional[List[str]] = None
+    ):
+        self.url = url
+        self.title = title
+        self.description = description
+        self.text = text
+        # 本文中のMDNドキュメントへのリンク（出現順、重複なし）
+        self.links = links or []
+        # 抽出元HTMLのバイト数
+        self.source_bytes = source_bytes
+        # 他のロケールの版のURL（抽出した直後だけ設定され、パイプラインがロケールの記録に使った後は空にする）
+        self.alternates = alternates or []
+        # 要求したロケールの版を返せず、他のロケールの版を返した場合の要求したURL
+        self.requested_url: Optional[str] = None
+        # 他のロケールの版を返した理由（FALLBACK_MISSING または FALLBACK_UNAVAILABLE）
+        self.fallback_reason: Optional[str] = None
+        # 上流の障害時に古いコピーを返した場合の、有効期限を過ぎてからの秒数
+        self.stale_seconds: Optional[float] = None
+
+    @property
+    def is_stale(self) -> bool:
+        """上流の障害のため古いコピーを返しているかどうか"""
+        return self.stale_seconds is not None
+
+    def as_stale(self, stale_seconds: float) -> "Document":
+        """古いコピーであることを示す印を付けた複製を返す（キャッシュ内の値は変更しない）"""
+        stale = copy.copy(self)
+        stale.stale_seconds = stale_seconds
+        return stale
+
+    @property
+    def is_fallback(self) -> bool:
+        """要求したロケールの版の代わりに、他のロケールの版を返しているかどうか"""
+        return self.requested_url is not None
+
+    def as_fallback(self, requested_url: str, reason: str = FALLBACK_MISSING) -> "Document":
+        """
+        他のロケールの版であることを示す印を付けた複製を返す（キャッシュ内の値は変更しない）
+
+        Args:
+            requested_url: 要求したURL
+            reason: FALLBACK_MISSING（翻訳が無い）または FALLBACK_UNAVAILABLE（上流の障害中で、翻訳のコピーも無い）
+        """
+        fallback = copy.copy(self)
+        fallback.requested_url = requested_url
+        fallback.fallback_reason = reason
+        return fallback
+
+    @property
+    def size(self) -> int:
+        """保持しているテキストのおおよその大きさ（キャッシュの容量の計算に使う）"""
+        return len(self.title) + len(self.description) + len(self.text) + sum(len(link) for link in self.links)
+
+    def to_markdown(self) -> str:
+        """LLMに渡すための整形済みテキストを生成"""
+        content = f"# {self.title}\n\n{self.description}\n\n{self.text}"
+        if self.is_fallback and self.fallback_reason == FALLBACK_UNAVAILABLE:
+            content = (
+                f"> Note: MDN is currently unavailable and the {url_locale(self.requested_url)} version "
+                f"could not be fetched. This is a cached copy of the {url_locale(self.url)} version.\n\n" + content
+            )
+        elif self.is_fallback:
+            content = (
+                f"> Note: This page is not available in {url_locale(self.requested_url)}. "
+                f"This is the {url_locale(self.url)} version.\n\n" + content
+            )
+        if self.is_stale:
+            content = (
+                f"> Note: MDN is currently unavailable. This is a cached copy that expired "
+                f"{int(self.stale_seconds)} seconds ago.\n\n" + content
+            )
+        return _BLANK_LINES.sub("\n\n", content)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """ドキュメントを辞書形式に変換"""
+        return {
+            "url": self.url,
+            "title": self.title,
+            "description": self.description,
+            "text": self.text,
+            "links": self.links,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Document":
+        """辞書からドキュメントを復元"""
+        return cls(
+            url=data["url"],
+            title=data["title"],
+            description=data.get("description", ""),
+            text=data["text"],
+            links=data.get("links"),
+        )
+
+
+class _MDNContentParser(HTMLParser):
+    """メインコンテンツ・タイトル・説明を1パスで収集するパーサー"""
+
+    def __init__(self, max_elements: int = 0):
+        super().__init__(convert_charrefs=True)
+        # 解析する最大要素数（0の場合は無制限）
+        self.max_elements = max_elements
+        self.elements = 0
+        # (タグ名, 役割) のスタック
+        self._stack: List[tuple] = []
+        self._skip_depth = 0
+        self._non_text_depth = 0
+        self._capturing: Dict[str, List[str]] = {}
+        self._captured: Dict[str, List[str]] = {}
+        self._h1_parts: Optional[List[str]] = None
+        self._links: Dict[str, List[str]] = {}
+        self.alternates: List[str] = []
+        self.title: Optional[str] = None
+        self.description = ""
+        # HTMLを分割して渡すと1つのテキストが複数回に分けて届くため、次のタグまでまとめる
+        self._data: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_data()
+        self.elements += 1
+        if self.max_elements and self.elements > self.max_elements:
+            raise DocumentTooLargeError(f"HTML has more than {self.max_elements} elements")
+        attr_map = dict(attrs)
+        if tag == "meta":
+            if attr_map.get("name") == "description" and not self.description:
+                self.description = attr_map.get("content") or ""
+            return
+        if tag == "link":
+            if attr_map.get("rel") == "alternate" and attr_map.get("hreflang") and attr_map.get("href"):
+                self.alternates.append(attr_map["href"])
+            return
+        if tag in _VOID_TAGS:
+            return
+
+        roles = []
+        classes = set((attr_map.get("class") or "").split())
+        if tag == "article" and "main-page-content" in classes and "article" not in self._captured \
+                and "article" not in self._capturing:
+            self._capturing["article"] = []
+            self._links["article"] = []
+            roles.append("article")
+        if tag == "main" and attr_map.get("id") == "content" and "main" not in self._captured \
+                and "main" not in self._capturing:
+            self._capturing["main"] = []
+            self._links["main"] = []
+            roles.append("main")
+        if tag == "h1" and self.title is None and self._h1_parts is None:
+            self._h1_parts = []
+            roles.append("h1")
+        if classes & SKIP_CLASSES:
+            self._skip_depth += 1
+            roles.append("skip")
+        if tag == "a" and not self._skip_depth and attr_map.get("href"):
+            for role in self._capturing:
+                self._links[role].append(attr_map["href"])
+        if tag in _NON_TEXT_TAGS:
+            self._non_text_depth += 1
+            roles.append("non_text")
+        self._stack.append((tag, roles))
+
+    def handle_endtag(self, tag):
+        self._flush_data()
+        for index in range(len(self._stack) - 1, -1, -1):
+            if self._stack[index][0] == tag:
+                break
+        else:
+            return
+        while len(self._stack) > index:
+            _, roles = self._stack.pop()
+            self._close(roles)
+
+    def _close(self, roles):
+        for role in roles:
+            if role in ("article", "main"):
+                self._captured[role] = self._capturing.pop(role)
+            elif role == "h1":
+                self.title = "".join(self._h1_parts).strip()
+                self._h1_parts = None
+            elif role == "skip":
+                self._skip_depth -= 1
+            elif role == "non_text":
+                self._non_text_depth -= 1
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_comment(self, data):
+        self._flush_data()
+
+    def handle_decl(self, decl):
+        self._flush_data()
+
+    def handle_pi(self, data):
+        self._flush_data()
+
+    def _flush_data(self):
+        if not self._data:
+            return
+        data = "".join(self._data)
+        self._data = []
+        if self._non_text_depth:
+            return
+        if self._h1_parts is not None:
+            self._h1_parts.append(data)
+        if self._skip_depth or not self._capturing:
+            return
+        stripped = data.strip()
+        if stripped:
+            for parts in self._capturing.values():
+                parts.append(stripped)
+
+    def close(self):
+        super().close()
+        self._flush_data()
+        # 閉じられていない要素を閉じる
+        while self._stack:
+            _, roles = self._stack.pop()
+            self._close(roles)
+
+    def main_links(self) -> List[str]:
+        """メインコンテンツ内のリンク（href の値そのまま）"""
+        for role in ("article", "main"):
+            if role in self._captured:
+                return self._links[role]
+        return []
+
+    def main_text(self) -> Optional[str]:
+        """メインコンテンツのテキストを返す（見つからない場合はNone）"""
+        for role in ("article", "main"):
+            if role in self._captured:
+                return "\n".join(self._captured[role])
+        return None
+
+
+def normalize_links(hrefs: List[str], base_url: str, include_self: bool = False) -> List[str]:
+    """
+    href をMDNドキュメントの絶対URLに正規化する
+
+    フラグメントを除去し、MDNの /docs/ 以下以外のリンクと自身へのリンクは除外します。
+
+    Args:
+        hrefs: href の値のリスト
+        base_url: リンク元ページのURL
+        include_self: 自身へのリンクも残すか
+
+    Returns:
+        重複を除いたURLのリスト（出現順）
+    """
+    links = []
+    seen = set() if include_self else {urldefrag(base_url)[0]}
+    for href in hrefs:
+        url = urldefrag(urljoin(base_url, href.strip()))[0]
+        if not url.startswith(config.MDN_BASE_URL) or "/docs/" not in url or url in seen:
+            continue
+        seen.add(url)
+        links.append(url)
+    return links
+
+
+def extract_document(html: Union[str, bytes], url: str, max_elements: int = config.EXTRACT_MAX_ELEMENTS) -> Document:
+    """
+    MDNページのHTMLからドキュメントを抽出する
+
+    Args:
+        html: ページのHTML（バイト列の場合は UTF-8 として少しずつデコードする）
+        url: 元のMDN URL
+        max_elements: 解析する最大要素数（0の場合は無制限）
+
+    Returns:
+        抽出されたドキュメント
+
+    Raises:
+        DocumentTooLargeError: 要素数が max_elements を超えた場合
+        ExtractError: メインコンテンツが見つからない場合
+    """
+    parser = _MDNContentParser(max_elements)
+    if isinstance(html, str):
+        parser.feed(html)
+    else:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        view = memoryview(html)
+        for offset in range(0, len(view), _FEED_SIZE):
+            parser.feed(decoder.decode(view[offset:offset + _FEED_SIZE]))
+        parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+
+    text = parser.main_text()
+    if text is None:
+        raise ExtractError(f"Main content not found in {url}")
+
+    return Document(
+        url=url,
+        title=parser.title if parser.title is not None else "MDN Document",
+        description=parser.description,
+        text=text,
+        links=normalize_links(parser.main_links(), url),
+        # 翻訳が無いロケールを判定するため、自身のロケールの代替リンクも残す
+        alternates=normalize_links(parser.alternates, url, include_self=True),
+    )
@@ -0,0 +1,385 @@
+"""
+上流（MDN）からのHTML取得
+
+標準ライブラリのみで実装しているため、軽量版サーバーからも利用できます。
+http.client（ssl を含む）の読み込みは起動時間の大部分を占めるため、
+最初の取得まで遅延させます。
+
+遅延の裾（テールレイテンシ）を抑えるため、次の2つを行います。
+
+- 段階ごとの期限: 接続・最初の応答・本文の読み込みそれぞれに、観測した上流の
+  レイテンシのパーセンタイルから求めた期限を設定します（上限は FETCH_TIMEOUT）。
+  期限切れになった段階もそこまでの経過時間を記録するため、上流が遅くなると期限も追従して延びます。
+- ヘッジリクエスト: 1回目のリクエストが p95 を超えても完了しない場合、
+  別の接続で2回目のリクエストを送り、先に成功した方を採用して他方は接続を閉じて取り消します。
+
+巨大なレスポンスでメモリを使い果たさないよう、本文は max_bytes までしか読み込みません
+（Content-Length が上限を超える場合は読み込む前に、そうでなければ読み込み中に打ち切ります）。
+"""
+
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Deque, Dict, List, Optional
+from urllib.parse import urljoin, urlsplit
+
+from . import config
+from .errors import DocumentTooLargeError, FetchError
+
+# リダイレクトを追跡する最大回数
+_MAX_REDIRECTS = 5
+_REDIRECT_STATUSES = frozenset({301, 302, 303, 307, 308})
+
+
+class FetchResult:
+    """上流からの取得結果"""
+    def __init__(
+        self,
+        url: str,
+        status: int,
+        body: bytes,
+        headers: Optional[Dict[str, str]] = None
+    ):
+        self.url = url
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+    @property
+    def text(self) -> str:
+        """本文を文字列としてデコード"""
+        return self.body.decode("utf-8", errors="replace")
+
+    @property
+    def not_modified(self) -> bool:
+        """条件付きリクエストに対して上流が 304 Not Modified を返したかどうか"""
+        return self.status == 304
+
+    def header(self, name: str) -> Optional[str]:
+        """レスポンスヘッダーを大文字小文字を区別せずに取得する"""
+        name = name.lower()
+        for key, value in self.headers.items():
+            if key.lower() == name:
+                return value
+        return None
+
+
+def upstream_url(url: str, origin: str = "") -> str:
+    """
+    MDN URLを実際にリクエストするURLへ変換する
+
+    Args:
+        url: MDNドキュメントのURL
+        origin: 差し替え先のオリジン（空の場合は変換しない）
+
+    Returns:
+        リクエスト先のURL
+    """
+    if not origin:
+        return url
+    return origin.rstrip("/") + "/" + url[len(config.MDN_BASE_URL):]
+
+
+class LatencyTracker:
+    """直近のレイテンシを保持し、パーセンタイルを計算する"""
+    def __init__(self, size: int = 256, min_samples: int = config.FETCH_MIN_SAMPLES):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """
+        パーセンタイル値を返す
+
+        Returns:
+            秒数、サンプルが min_samples 件未満の場合はNone
+        """
+        with self._lock:
+            if not self._samples or len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+        return ordered[index]
+
+
+class _Attempt:
+    """1回分のリクエスト（別スレッドから接続を閉じて取り消せる）"""
+    def __init__(self):
+        self.conn = None
+        self.sock = None
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def attach(self, conn) -> None:
+        with self._lock:
+            self.conn = conn
+            if self.cancelled:
+                conn.close()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            if self.sock is not None:
+                # ブロック中の recv を中断させる
+                try:
+                    self.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            if self.conn is not None:
+                self.conn.close()
+
+
+class Fetcher:
+    """MDNページを取得するクライアント"""
+    def __init__(
+        self,
+        timeout: float = config.FETCH_TIMEOUT,
+        origin: str = config.UPSTREAM_ORIGIN,
+        user_agent: str = config.USER_AGENT,
+        hedge: bool = config.FETCH_HEDGE,
+        hedge_ratio: float = config.FETCH_HEDGE_RATIO,
+        max_bytes: int = config.FETCH_MAX_BYTES
+    ):
+        """
+        Args:
+            timeout: 1回の取得全体の上限（秒）
+            origin: 上流オリジンの差し替え先
+            user_agent: User-Agent ヘッダー
+            hedge: ヘッジリクエストを行うかどうか
+            hedge_ratio: ヘッジリクエストを送る割合の上限（上流への負荷の増加を抑える）
+            max_bytes: 読み込むレスポンスの最大バイト数（0の場合は無制限）
+        """
+        self.timeout = timeout
+        self.origin = origin
+        self.user_agent = user_agent
+        self.hedge = hedge
+        self.hedge_ratio = hedge_ratio
+        self.max_bytes = max_bytes
+        self.latency = {
+            "connect": LatencyTracker(),
+            "first_byte": LatencyTracker(),
+            "total": LatencyTracker(),
+        }
+        self._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="mdn-fetch")
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+        self.too_large = 0
+
+    # --- 期限 ---
+
+    def stage_timeout(self, stage: str) -> float:
+        """
+        段階ごとの期限を、観測したp99の数倍（上限は timeout）として求める
+
+        サンプルが少ないうちは timeout をそのまま使います。
+        """
+        p99 = self.latency[stage].percentile(99)
+        if p99 is None:
+            return self.timeout
+        return min(self.timeout, max(config.FETCH_MIN_STAGE_TIMEOUT, p99 * config.FETCH_TIMEOUT_MULTIPLIER))
+
+    def hedge_delay(self) -> Optional[float]:
+        """ヘッジリクエストを送るまでの待ち時間（p95）。サンプル不足ならNone"""
+        return self.latency["total"].percentile(95)
+
+    # --- 取得 ---
+
+    def fetch(
+        self,
+        url: str,
+        deadline: Optional[float] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> FetchResult:
+        """
+        URLのHTMLを取得する
+
+        Args:
+            url: MDNドキュメントのURL
+            deadline: 呼び出し元の期限（time.monotonic() 基準）。timeout より早ければこちらで打ち切る
+            headers: 追加のリクエストヘッダー（If-None-Match などの条件付きリクエスト用）
+
+        Returns:
+            取得結果
+
+        Raises:
+            DocumentTooLargeError: レスポンスが max_bytes を超えた場合
+            FetchError: 通信エラー、HTTPエラー、または期限切れの場合
+        """
+        with self._lock:
+            self.requests += 1
+
+        delay = self.hedge_delay() if self.hedge else None
+        if delay is None:
+            return self._fetch_once(url, _Attempt(), deadline, headers)
+
+        attempts: List[_Attempt] = [_Attempt()]
+        futures = {self._executor.submit(self._fetch_once, url, attempts[0], deadline, headers): attempts[0]}
+        done, _ = wait(futures, timeout=delay)
+        if not done and self._may_hedge():
+            attempts.append(_Attempt())
+            futures[self._executor.submit(self._fetch_once, url, attempts[1], deadline, headers)] = attempts[1]
+
+        error: Optional[BaseException] = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except FetchError as e:
+                    error = e
+                    continue
+                # 先に成功した方を採用し、残りは接続を閉じて取り消す
+                for other in pending:
+                    futures[other].cancel()
+                if futures[future] is not attempts[0]:
+                    with self._lock:
+                        self.hedge_wins += 1
+                return result
+        raise error
+
+    def _may_hedge(self) -> bool:
+        with self._lock:
+            if self.hedged >= self.requests * self.hedge_ratio:
+                return False
+            self.hedged += 1
+            return True
+
+    def _fetch_once(
+        self,
+        url: str,
+        attempt: _Attempt,
+        caller_deadline: Optional[float] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> FetchResult:
+        import http.client
+
+        start = time.monotonic()
+        deadline = start + self.timeout
+        if caller_deadline is not None:
+            deadline = min(deadline, caller_deadline)
+        target = upstream_url(url, self.origin)
+        for _ in range(_MAX_REDIRECTS + 1):
+            parts = urlsplit(target)
+            connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+            conn = connection_class(parts.netloc)
+            attempt.attach(conn)
+            stage, stage_start = "connect", time.monotonic()
+            try:
+                conn.timeout = self._remaining(deadline, "connect")
+                conn.connect()
+                self.latency["connect"].record(time.monotonic() - stage_start)
+                # レスポンスが接続を閉じる場合 conn.sock は None になるため、ソケットを保持しておく
+                sock = attempt.sock = conn.sock
+                if attempt.cancelled:
+                    raise FetchError(f"Cancelled fetching {url}")
+
+                path = parts.path or "/"
+                if parts.query:
+                    path += "?" + parts.query
+                stage = "first_byte"
+                sock.settimeout(self._remaining(deadline, "first_byte"))
+                stage_start = time.monotonic()
+                conn.request("GET", path, headers=dict(headers or {}, **{"User-Agent": self.user_agent}))
+                response = conn.getresponse()
+                self.latency["first_byte"].record(time.monotonic() - stage_start)
+
+                if response.status in _REDIRECT_STATUSES and response.getheader("Location"):
+                    response.read()
+                    target = urljoin(target, response.getheader("Location"))
+                    continue
+                if response.status >= 400:
+                    raise FetchError(f"HTTP {response.status} while fetching {url}", upstream_status=response.status)
+
+                stage = "body"
+                body = self._read_body(sock, response, deadline, url)
+                self.latency["total"].record(time.monotonic() - start)
+                return FetchResult(
+                    url=url,
+                    status=response.status,
+                    body=body,
+                    headers=dict(response.getheaders())
+                )
+            except TimeoutError as e:
+                with self._lock:
+                    self.timeouts += 1
+                self._record_timeout(stage, stage_start, start)
+                raise FetchError(f"Timed out fetching {url}") from e
+            except (http.client.HTTPException, OSError) as e:
+                if attempt.cancelled:
+                    raise FetchError(f"Cancelled fetching {url}") from e
+                raise FetchError(f"Failed to fetch {url}: {e}") from e
+            finally:
+                conn.close()
+        raise FetchError(f"Too many redirects while fetching {url}")
+
+    def _record_timeout(self, stage: str, stage_start: float, start: float) -> None:
+        """
+        期限切れになった取得の経過時間を記録する
+
+        成功した取得だけを記録すると、上流が期限（p99の数倍）より遅くなった時点で
+        期限が延びなくなり、以降の取得が全て期限切れになるため。
+        """
+        now = time.monotonic()
+        if stage in self.latency:
+            self.latency[stage].record(now - stage_start)
+        self.latency["total"].record(now - start)
+
+    def _remaining(self, deadline: float, stage: str) -> float:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(stage)
+        return min(remaining, self.stage_timeout(stage))
+
+    def _read_body(self, sock, response, deadline: float, url: str) -> bytes:
+        """全体の期限と最大バイト数を守りながら本文を読み込む"""
+        if self.max_bytes and response.length is not None and response.length > self.max_bytes:
+            self._too_large(url, response)
+        chunks = []
+        received = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("body")
+            sock.settimeout(remaining)
+            chunk = response.read(64 * 1024)
+            received += len(chunk)
+            if self.max_bytes and received > self.max_bytes:
+                self._too_large(url, response)
+            chunks.append(chunk)
+            # 読み終えるとソケットが閉じられるため、以降は settimeout できない
+            if not chunk or response.isclosed():
+                return b"".join(chunks)
+
+    def _too_large(self, url: str, response) -> None:
+        with self._lock:
+            self.too_large += 1
+        raise DocumentTooLargeError(
+            f"Response for {url} exceeds {self.max_bytes} bytes", upstream_status=response.status
+        )
+
+    def stats(self) -> Dict[str, float]:
+        """取得処理の統計情報"""
+        p95 = self.latency["total"].percentile(95)
+        p99 = self.latency["total"].percentile(99)
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "timeouts": self.timeouts,
+            "too_large": self.too_large,
+            "p95_ms": p95 * 1000 if p95 is not None else None,
+            "p99_ms": p99 * 1000 if p99 is not None else None,
+        }
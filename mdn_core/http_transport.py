@@ -0,0 +1,470 @@
+"""
+標準ライブラリの http.server を使ったHTTPトランスポート
+
+simple_mcp_server.py と claude_desktop_mcp.py はこのハンドラーを共有します。
+
+HTTP/1.1 の持続的接続（keep-alive）に対応しており、クライアントは1本のTCP接続で
+複数のリクエストを順に送信できます。アイドル状態の接続は一定時間で切断します。
+リクエスト・レスポンスとも chunked 転送エンコーディングに対応しています。
+リクエストボディが上限（MDN_HTTP_MAX_BODY）を超える場合は 413 を返して接続を切断します。
+
+/fetch-mdn と /mcp のレスポンスには ETag を付け、If-None-Match が一致すれば 304 を返します。
+/fetch-mdn/batch は複数のURLを並行に取得し、終わった順に1行1件のJSON（NDJSON）で返します。
+クラスターモードでは、他のノードからの問い合わせを /_cluster/document で受け付けます。
+/export はキャッシュ・ミラー済みのドキュメントを NDJSON / Arrow / Parquet で一括して返します。
+
+POST のリクエストは段階ごとの時間を計測し、遅いものを記録します（/debug/slow で参照）。
+/debug/profile?seconds=N は全スレッドのスタックを採取し、collapsed 形式で返します。
+"""
+
+import json
+import sys
+from functools import partial
+from urllib.parse import parse_qs, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+from . import config
+from .admission import AdmissionController, QuotaExceededError, client_identity, get_admission, retry_after_header
+from .batch import batch_cost, iter_batch, validate_batch
+from .cluster import PEER_PATH, serve_peer_request
+from .errors import CircuitOpenError, MDNError
+from .export import ExportFilter, get_exporter
+from .pipeline import MDNPipeline, get_pipeline
+from .prefetch import navigation
+from .profiler import ProfilerBusyError, debug_allowed, format_collapsed, get_sampler, profile_filename
+from .protocol import build_fetch_response, build_mcp_response, default_manifest, document_etag, etag_matches
+from .resolver import get_resolver
+from .scheduler import check_deadline, remaining, request_options
+from .tracing import annotate, get_slow_log, stage, traced
+
+
+class RequestBodyTooLargeError(MDNError):
+    """リクエストボディが上限を超えた場合の例外"""
+    status_code = 413
+
+
+class MCPRequestHandler(BaseHTTPRequestHandler):
+    """MCPリクエストおよび直接APIアクセスを処理するHTTPハンドラー"""
+
+    # 使用するパイプライン（Noneの場合はプロセス共通のもの）
+    pipeline: Optional[MDNPipeline] = None
+
+    # クライアントごとの公平なキューイングとクォータ（Noneの場合はプロセス共通のもの）
+    admission: Optional[AdmissionController] = None
+
+    # HTTP/1.1 の持続的接続を有効にする
+    protocol_version = "HTTP/1.1"
+
+    # アイドル接続を切断するまでの秒数（ソケットのタイムアウトとして適用される）
+    timeout = config.HTTP_IDLE_TIMEOUT
+
+    # リクエストボディの上限（バイト）
+    max_body = config.HTTP_MAX_BODY
+
+    # ヘッダーとボディを別々に書き込むため、Nagle と遅延ACKの組み合わせで
+    # 持続的接続の各レスポンスが約40ms待たされるのを防ぐ
+    disable_nagle_algorithm = True
+
+    def get_pipeline(self) -> MDNPipeline:
+        return self.pipeline or get_pipeline()
+
+    def get_admission(self) -> AdmissionController:
+        return self.admission or get_admission()
+
+    def log_message(self, format, *args):
+        # stdoutを汚さないよう、アクセスログは常にstderrへ出力する
+        sys.stderr.write("%s - - [%s] %s\n" % (
+            self.address_string(), self.log_date_time_string(), format % args
+        ))
+
+    def _set_response(self, status_code=200, content_type='application/json', content_length=0, headers=None):
+        self.send_response(status_code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header(
+            'Access-Control-Allow-Headers',
+            'Content-Type, Authorization, X-API-Key, X-Client-Id, X-Priority, X-Deadline-Ms, If-None-Match'
+        )
+        self.send_header('Access-Control-Expose-Headers', 'ETag, Retry-After')
+        if content_length is None:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Content-Length', str(content_length))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+
+    def _send_json_response(self, data: Dict[str, Any], status: int = 200, headers: Optional[Dict[str, str]] = None) -> int:
+        """JSONレスポンスを送信し、ボディのバイト数を返す"""
+        with stage("send"):
+            sent = self._write_json(data, status, headers)
+        annotate(status=status, response_bytes=sent)
+        return sent
+
+    def _write_json(self, data: Dict[str, Any], status: int, headers: Optional[Dict[str, str]]) -> int:
+        chunks = json.JSONEncoder().iterencode(data)
+        if self.request_version != 'HTTP/1.1':
+            body = "".join(chunks).encode()
+            self._set_response(status, content_length=len(body), headers=headers)
+            self.wfile.write(body)
+            return len(body)
+
+        # 大きなレスポンスは全体を1つのバイト列にせず、chunked で逐次送信する
+        buffer = []
+        buffered = 0
+        sent = 0
+        streaming = False
+        for chunk in chunks:
+            buffer.append(chunk)
+            buffered += len(chunk)
+            if buffered >= config.HTTP_CHUNK_SIZE:
+                if not streaming:
+                    self._set_response(status, content_length=None, headers=headers)
+                    streaming = True
+                data = "".join(buffer).encode()
+                self._write_chunk(data)
+                sent += len(data)
+                buffer = []
+                buffered = 0
+
+        body = "".join(buffer).encode()
+        if streaming:
+            self._write_chunk(body)
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self._set_response(status, content_length=len(body), headers=headers)
+            self.wfile.write(body)
+        return sent + len(body)
+
+    def _send_text(self, text: str, content_type: str = 'text/plain; charset=utf-8', headers: Optional[Dict[str, str]] = None) -> None:
+        """テキストのレスポンスを送信する"""
+        body = text.encode()
+        self._set_response(200, content_type, content_length=len(body), headers=headers)
+        self.wfile.write(body)
+
+    def _send_not_modified(self, etag: str) -> None:
+        """304 Not Modified を送信する（本文は送らない）"""
+        annotate(status=304, response_bytes=0)
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+
+    def _write_chunk(self, data: bytes):
+        if data:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def _read_body(self) -> bytes:
+        """
+        リクエストボディを読み込む
+
+        Content-Length と chunked 転送エンコーディングの両方に対応します。
+        持続的接続では次のリクエストの読み込み位置を保つため、
+        エンドポイントに関わらずボディは必ず読み切ります。
+
+        Raises:
+            RequestBodyTooLargeError: ボディが max_body を超える場合（超えた分は読まない）
+            ValueError: Content-Length やチャンクの大きさが不正な場合
+        """
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            parts = []
+            total = 0
+            while True:
+                size_line = self.rfile.readline(65537)
+                size = int(size_line.split(b";", 1)[0].strip(), 16)
+                if size < 0:
+                    raise ValueError(f"Invalid chunk size: {size_line[:32]!r}")
+                if size == 0:
+                    # トレーラーを読み飛ばす
+                    while self.rfile.readline(65537) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return b"".join(parts)
+                total += size
+                if total > self.max_body:
+                    raise RequestBodyTooLargeError(f"Request body exceeds {self.max_body} bytes")
+                chunk = self.rfile.read(size)
+                if len(chunk) < size:
+                    raise ValueError("Truncated chunk")
+                parts.append(chunk)
+                self.rfile.readline(65537)
+        content_length = int(self.headers.get('Content-Length', 0))
+        if content_length < 0:
+            raise ValueError(f"Invalid Content-Length: {content_length}")
+        if content_length > self.max_body:
+            raise RequestBodyTooLargeError(f"Request body exceeds {self.max_body} bytes")
+        return self.rfile.read(content_length) if content_length > 0 else b""
+
+    def do_OPTIONS(self):
+        """Handle preflight requests"""
+        self._set_response()
+
+    def do_GET(self):
+        """Handle GET requests"""
+        if self.path == '/health':
+            self._send_json_response({"status": "healthy"})
+        elif self.path in ('/mcp-manifest.json', '/mcp/manifest'):
+            self._send_json_response(default_manifest())
+        elif self.path == '/metrics':
+            self._send_json_response(dict(
+                self.get_pipeline().stats(),
+                admission=self.get_admission().stats(),
+                export=get_exporter().stats(),
+                slow_requests=get_slow_log().stats(),
+            ))
+        elif urlsplit(self.path).path == '/resolve':
+            query = parse_qs(urlsplit(self.path).query)
+            try:
+                limit = int(query.get('limit', ['10'])[0])
+            except ValueError:
+                limit = 10
+            matches = get_resolver().complete(query.get('q', [''])[0], limit)
+            self._send_json_response({"matches": matches})
+        elif urlsplit(self.path).path == PEER_PATH:
+            # ノード間のリクエストは、クライアントを受け付けたノードで公平性の制御を済ませている
+            priority, deadline = request_options(self.headers)
+            url = parse_qs(urlsplit(self.path).query).get('url', [None])[0]
+            with traced(f"GET {PEER_PATH}"):
+                annotate(url=url, priority=priority)
+                status, body = serve_peer_request(self.get_pipeline(), self.headers, url, priority, deadline)
+                self._send_json_response(body, status)
+        elif urlsplit(self.path).path == '/export':
+            with traced("GET /export"):
+                self._serve_export()
+        elif urlsplit(self.path).path.startswith('/debug/'):
+            self._serve_debug()
+        else:
+            self._send_json_response({"error": "Not found"}, 404)
+
+    def _serve_export(self):
+        """キャッシュ・ミラー済みのドキュメントを、読み出しながら逐次送信する"""
+        query = parse_qs(urlsplit(self.path).query)
+        pipeline = self.get_pipeline()
+        try:
+            export = get_exporter().open(
+                pipeline.snapshots,
+                pipeline.cache,
+                query.get('format', ['ndjson'])[0],
+                ExportFilter.from_query(query),
+                query.get('source', ['all'])[0]
+            )
+        except ValueError as e:
+            self._send_json_response({"error": str(e)}, 400)
+            return
+        except MDNError as e:
+            self._send_json_response({"error": str(e)}, e.status_code)
+            return
+
+        annotate(format=export.format)
+        headers = {'Content-Disposition': f'attachment; filename="{export.filename}"'}
+        try:
+            if self.request_version != 'HTTP/1.1':
+                # chunked 転送が使えないため、長さを示さずに接続を閉じて終端を伝える
+                self.close_connection = True
+                self.send_response(200)
+                self.send_header('Content-Type', export.content_type)
+                self.send_header('Access-Control-Allow-Origin', '*')
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                for chunk in export:
+                    self.wfile.write(chunk)
+            else:
+                self._set_response(200, export.content_type, content_length=None, headers=headers)
+                for chunk in export:
+                    self._write_chunk(chunk)
+                self.wfile.write(b"0\r\n\r\n")
+        except Exception as e:
+            # ヘッダーは送信済みのため、終端を送らずに接続を閉じて途中で終わったことを伝える
+            print(f"Export failed: {e}", file=sys.stderr)
+            self.close_connection = True
+        finally:
+            export.close()
+            annotate(status=200, response_bytes=export.bytes, documents=export.documents)
+
+    def _serve_debug(self):
+        """/debug/profile（スタックの採取）と /debug/slow（遅いリクエストのログ）"""
+        if not debug_allowed(self.headers, self.client_address[0]):
+            self._send_json_response({"error": "Forbidden"}, 403)
+            return
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        if parts.path == '/debug/slow':
+            log = get_slow_log()
+            self._send_json_response({"threshold_ms": log.threshold_ms, "requests": log.entries()})
+        elif parts.path == '/debug/profile':
+            idle = query.get('idle', ['0'])[0].lower() in ('1', 'true', 'yes')
+            try:
+                # nan・inf は profile() が ValueError にする
+                counts, samples = get_sampler().profile(float(query.get('seconds', ['10'])[0]), idle)
+            except ValueError:
+                self._send_json_response({"error": "'seconds' must be a finite number"}, 400)
+                return
+            except ProfilerBusyError as e:
+                self._send_json_response({"error": str(e)}, e.status_code)
+                return
+            self._send_text(format_collapsed(counts), headers={
+                'Content-Disposition': f'attachment; filename="{profile_filename()}"',
+                'X-Profile-Samples': str(samples),
+            })
+        else:
+            self._send_json_response({"error": "Not found"}, 404)
+
+    def do_POST(self):
+        """Handle POST requests for MCP or direct API access"""
+        with traced(f"POST {urlsplit(self.path).path}"):
+            self._handle_post()
+
+    def _handle_post(self):
+        # 期限はボディの読み込みを含めたリクエスト全体に対して設定する
+        priority, deadline = request_options(self.headers)
+        try:
+            with stage("read_body"):
+                raw_body = self._read_body()
+        except RequestBodyTooLargeError as e:
+            # 残りのボディを読まないため、この接続は再利用できない
+            self.close_connection = True
+            self._send_json_response({"error": str(e)}, e.status_code)
+            return
+        except ValueError:
+            # ボディの境界が分からないため、この接続は再利用できない
+            self.close_connection = True
+            self._send_json_response({"error": "Malformed request body"}, 400)
+            return
+
+        annotate(request_bytes=len(raw_body), priority=priority)
+        if self.path not in ('/mcp', '/fetch-mdn', '/fetch-mdn/batch'):
+            self._send_json_response({"error": "Endpoint not found"}, 404)
+            return
+
+        try:
+            request_body = json.loads(raw_body.decode('utf-8'))
+        except (ValueError, UnicodeDecodeError):
+            request_body = None
+        if not isinstance(request_body, dict):
+            self._send_json_response({"error": "Invalid JSON"}, 400)
+            return
+
+        cost = 1
+        if self.path == '/fetch-mdn/batch':
+            try:
+                urls = validate_batch(request_body)
+            except ValueError as e:
+                self._send_json_response({"error": str(e)}, 400)
+                return
+            cost = batch_cost(urls)
+            etags = request_body.get('etags')
+            serve = partial(self._serve_batch, urls, etags if isinstance(etags, dict) else {}, priority, deadline)
+        else:
+            if self.path == '/mcp':
+                url = (request_body.get('parameters') or {}).get('url')
+            else:
+                url = request_body.get('url')
+            if not url:
+                self._send_json_response({"error": "URL parameter is required"}, 400)
+                return
+            serve = partial(self._serve_document, url, priority, deadline)
+
+        # クライアントごとのクォータを確認し、公平なキューイングで処理の順番を待つ
+        admission = self.get_admission()
+        client = client_identity(self.headers, self.client_address[0])
+        try:
+            with stage("admission"):
+                waiter = admission.acquire(client, timeout=remaining(deadline), cost=cost)
+        except QuotaExceededError as e:
+            self._send_json_response(
+                {"error": str(e), "retry_after": round(e.retry_after, 3)},
+                e.status_code,
+                headers=_error_headers(e)
+            )
+            return
+        sent = 0
+        try:
+            # 先読みのページ遷移はクライアントごとに記録する
+            with navigation(client):
+                sent = serve()
+        finally:
+            admission.release(waiter, sent)
+
+    def _serve_document(self, url: str, priority: str, deadline: float) -> int:
+        """ドキュメントを取得して送信し、送信したバイト数を返す"""
+        annotate(url=url)
+        try:
+            doc = self.get_pipeline().get_document(url, priority, deadline)
+            check_deadline(deadline, "serializing")
+        except MDNError as e:
+            print(f"Error processing request: {e}", file=sys.stderr)
+            return self._send_json_response({"error": str(e)}, e.status_code, headers=_error_headers(e))
+        except Exception as e:
+            print(f"Error processing request: {e}", file=sys.stderr)
+            return self._send_json_response({"error": f"Internal server error: {e}"}, 500)
+
+        etag = document_etag(doc)
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            self._send_not_modified(etag)
+            return 0
+        headers = {'ETag': etag}
+        # Markdown への整形（空行をまとめる正規表現を含む）
+        with stage("format"):
+            if self.path == '/mcp':
+                response = build_mcp_response(doc).to_dict()
+            else:
+                response = build_fetch_response(doc)
+        return self._send_json_response(response, headers=headers)
+
+    def _serve_batch(self, urls, etags, priority: str, deadline: float) -> int:
+        """複数のドキュメントを取得し、終わった順にNDJSONで送信して、送信したバイト数を返す"""
+        annotate(urls=len(urls))
+        results = iter_batch(urls, etags, priority, deadline, pipeline=self.get_pipeline())
+        if self.request_version != 'HTTP/1.1':
+            body = "".join(json.dumps(item) + "\n" for item in results).encode()
+            self._set_response(200, 'application/x-ndjson', content_length=len(body))
+            self.wfile.write(body)
+            annotate(status=200, response_bytes=len(body))
+            return len(body)
+
+        # 1件ごとにチャンクとして送信し、クライアントが届いた順に処理できるようにする
+        self._set_response(200, 'application/x-ndjson', content_length=None)
+        sent = 0
+        try:
+            for item in results:
+                line = (json.dumps(item) + "\n").encode()
+                self._write_chunk(line)
+                self.wfile.flush()
+                sent += len(line)
+        finally:
+            results.close()
+            annotate(status=200, response_bytes=sent)
+        self.wfile.write(b"0\r\n\r\n")
+        return sent
+
+
+def _error_headers(error: MDNError) -> Optional[Dict[str, str]]:
+    """エラー応答に付けるヘッダー（上流の障害中やクォータ超過時は再試行までの秒数を伝える）"""
+    if isinstance(error, (CircuitOpenError, QuotaExceededError)):
+        return {"Retry-After": retry_after_header(error.retry_after)}
+    return None
+
+
+class _MCPHTTPServer(ThreadingHTTPServer):
+    # 同時接続の急増で SYN が再送待ちにならないよう、listen のバックログを広げる
+    request_queue_size = 128
+
+
+def create_server(host: str, port: int, handler_class=MCPRequestHandler) -> ThreadingHTTPServer:
+    """
+    HTTPサーバーを作成する
+
+    リクエストごとにスレッドを割り当てるため、遅い上流リクエストが
+    他のクライアントをブロックしません。
+    """
+    server = _MCPHTTPServer((host, port), handler_class)
+    server.daemon_threads = True
+    return server
+
@@ -0,0 +1,287 @@
+"""
+ロケールを考慮したURLの正規化と、翻訳が無いページのフォールバック
+
+MDN の翻訳版（/ja/docs/... など）は存在しないことが多く、そのたびに上流から 404 を
+受け取ってから /en-US/ を取得し直す往復が発生します。
+
+- URLのロケールを MDN の正規の表記（"ja"・"en-US"・"zh-CN" など）にそろえ、
+  ロケールの無いURL（/docs/...）には MDN_DEFAULT_LOCALE を補います
+- 翻訳が無い場合は、MDN_LOCALE_FALLBACKS で設定した順にロケールを試し、
+  最後に MDN_DEFAULT_LOCALE を試します
+- ページ（ロケールを除いたパス）ごとに、どのロケールが存在するかを LocaleMap に記録します。
+  取得したページの hreflang の代替リンク（その時点の全ての翻訳の一覧）・404・取得の成功から学習し、
+  キャッシュとスナップショットにあるものは存在するとみなすため、一度どれかの言語版を取得したページは、
+  存在しない翻訳に問い合わせずに1回の取得で解決できます
+- フォールバック先のドキュメントはフォールバック先のURLをキーとしてキャッシュするため、
+  en-US 版は要求したロケールの数によらず1回だけ取得・保存されます
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from . import config
+
+# "/ja/docs/..."・"/en-us/docs/..." のようなパスのロケール
+_LOCALE_DOCS = re.compile(r"^/([A-Za-z]{2,3}(?:-[A-Za-z0-9]{2,8})*)/(docs(?:/.*)?)$")
+
+
+def canonical_locale(locale: str) -> str:
+    """ロケールを MDN の表記にそろえる（"en-us" → "en-US"、"JA" → "ja"、"zh-hant" → "zh-Hant"）"""
+    language, *subtags = locale.strip().split("-")
+    normalized = [language.lower()]
+    for subtag in subtags:
+        if len(subtag) == 2:
+            normalized.append(subtag.upper())
+        elif len(subtag) == 4:
+            normalized.append(subtag.title())
+        else:
+            normalized.append(subtag.lower())
+    return "-".join(normalized)
+
+
+def split_url(url: str) -> Optional[Tuple[str, str]]:
+    """
+    MDNドキュメントのURLをロケールとそれ以降のパスに分ける
+
+    Returns:
+        ("ja", "docs/Web/API/Fetch_API") のようなタプル（ドキュメント以外のURLはNone）
+    """
+    match = _LOCALE_DOCS.match(urlsplit(url).path)
+    if not match:
+        return None
+    return match.group(1), match.group(2)
+
+
+def url_locale(url: str) -> Optional[str]:
+    """URLのロケール（"/ja/docs/..." なら "ja"、ドキュメント以外のURLはNone）"""
+    parsed = split_url(url)
+    return parsed[0] if parsed else None
+
+
+def parse_fallbacks(spec: str) -> Dict[str, List[str]]:
+    """
+    フォールバックの設定を解釈する
+
+    Args:
+        spec: "zh-TW=zh-CN,en-US;pt-PT=pt-BR" のような文字列
+
+    Returns:
+        ロケールごとのフォールバック先のリスト（ロケールは正規の表記）
+    """
+    fallbacks: Dict[str, List[str]] = {}
+    for entry in spec.split(";"):
+        locale, _, targets = entry.partition("=")
+        if not locale.strip() or not targets.strip():
+            continue
+        fallbacks[canonical_locale(locale)] = [
+            canonical_locale(target) for target in targets.split(",") if target.strip()
+        ]
+    return fallbacks
+
+
+class _PageLocales:
+    """1つのページについて分かっているロケール"""
+    __slots__ = ("available", "available_until", "observed")
+
+    def __init__(self):
+        # hreflang の代替リンクから分かった全ての翻訳（分かっていない場合はNone）
+        self.available: Optional[frozenset] = None
+        self.available_until = 0.0
+        # 取得して確かめたロケールごとの (存在するか, 有効期限)
+        self.observed: Dict[str, Tuple[bool, float]] = {}
+
+
+class LocaleMap:
+    """ページごとに存在するロケールの記録（件数の上限付きで、最も長く参照されていないものから忘れる）"""
+    def __init__(self, max_pages: int = config.LOCALE_MAP_SIZE, ttl: float = config.LOCALE_MAP_TTL):
+        """
+        Args:
+            max_pages: 記録する最大ページ数
+            ttl: 記録を信用する秒数（翻訳が追加・削除されることがあるため）
+        """
+        self.max_pages = max_pages
+        self.ttl = ttl
+        self._pages: "OrderedDict[str, _PageLocales]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _page(self, page: str) -> _PageLocales:
+        entry = self._pages.get(page)
+        if entry is None:
+            entry = self._pages[page] = _PageLocales()
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(page)
+        return entry
+
+    def record(self, page: str, locale: str, exists: bool) -> None:
+        """取得して確かめたロケールを記録する"""
+        with self._lock:
+            self._page(page.lower()).observed[locale] = (exists, time.monotonic() + self.ttl)
+
+    def record_available(self, page: str, locales: Iterable[str]) -> None:
+        """hreflang の代替リンクから分かった、ページの全ての翻訳を記録する"""
+        with self._lock:
+            entry = self._page(page.lower())
+            entry.available = frozenset(locales)
+            entry.available_until = time.monotonic() + self.ttl
+
+    def known(self, page: str, locale: str) -> Optional[bool]:
+        """
+        ページのロケールが存在するか
+
+        Returns:
+            存在すればTrue、存在しなければFalse、分からなければNone
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._pages.get(page.lower())
+            if entry is None:
+                return None
+            observed = entry.observed.get(locale)
+            if observed is not None and observed[1] > now:
+                return observed[0]
+            if entry.available is not None and entry.available_until > now:
+                return locale in entry.available
+            return None
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+
+class LocaleFallback:
+    """ロケールの正規化と、フォールバック先の候補の決定"""
+    def __init__(
+        self,
+        fallbacks: Optional[Dict[str, List[str]]] = None,
+        default_locale: str = config.DEFAULT_LOCALE,
+        enabled: bool = config.LOCALE_FALLBACK,
+        locale_map: Optional[LocaleMap] = None
+    ):
+        """
+        Args:
+            fallbacks: ロケールごとのフォールバック先（省略時は MDN_LOCALE_FALLBACKS）
+            default_locale: ロケールの無いURLに補うロケールで、全てのロケールの最後のフォールバック先
+            enabled: 翻訳が無い場合に他のロケールで返すか（Falseの場合は正規化だけ行う）
+            locale_map: ページごとに存在するロケールの記録
+        """
+        self.fallbacks = fallbacks if fallbacks is not None else parse_fallbacks(config.LOCALE_FALLBACKS)
+        self.default_locale = canonical_locale(default_locale)
+        self.enabled = enabled
+        self.map = locale_map or LocaleMap()
+        self._lock = threading.Lock()
+        # フォールバック先の版を返した回数
+        self.fallbacks_served = 0
+        # 存在しないと分かっていたため、上流に問い合わせずに飛ばした翻訳の数
+        self.skipped = 0
+        # 上流から 404 を受け取って分かった、存在しない翻訳の数
+        self.missing = 0
+
+    def normalize(self, url: str) -> str:
+        """
+        URLのロケールを正規の表記にそろえる
+
+        ロケールの無いドキュメントのURL（/docs/...）には既定のロケールを補い、末尾の "/" を取り除きます。
+        ドキュメント以外のURLはそのまま返します。
+        """
+        parts = urlsplit(url)
+        path = parts.path.rstrip("/") if len(parts.path) > 1 else parts.path
+        match = _LOCALE_DOCS.match(path)
+        if match:
+            path = f"/{canonical_locale(match.group(1))}/{match.group(2)}"
+        elif path == "/docs" or path.startswith("/docs/"):
+            path = f"/{self.default_locale}{path}"
+        else:
+            return url
+        return urlunsplit((parts.scheme, parts.netloc, path, parts.query, parts.fragment))
+
+    def chain(self, locale: str) -> List[str]:
+        """ロケールと、そのフォールバック先（試す順、重複なし）"""
+        chain = [locale] + self.fallbacks.get(locale, []) + [self.default_locale]
+        return list(dict.fromkeys(chain))
+
+    def candidates(self, url: str, has_copy: Optional[Callable[[str], bool]] = None) -> List[str]:
+        """
+        取得を試すURLの候補（試す順）
+
+        存在しないと分かっているロケールは飛ばし、存在すると分かっているロケールで打ち切ります。
+        キャッシュやスナップショットに残っているURLは存在するとみなします。
+
+        Args:
+            url: 正規化済みのURL
+            has_copy: URLの手元のコピーがあるかを返す関数
+
+        Returns:
+            URLのリスト（全てのロケールが存在しないと分かっている場合は空）
+        """
+        parsed = split_url(url)
+        if parsed is None or not self.enabled:
+            return [url]
+        locale, rest = parsed
+        candidates = []
+        skipped = 0
+        for candidate_locale in self.chain(locale):
+            candidate = self._localized(url, candidate_locale, rest)
+            exists = self.map.known(rest, candidate_locale)
+            if exists is None and has_copy is not None and has_copy(candidate):
+                exists = True
+            if exists is False:
+                skipped += 1
+                continue
+            candidates.append(candidate)
+            if exists:
+                break
+        if skipped:
+            with self._lock:
+                self.skipped += skipped
+        return candidates
+
+    def _localized(self, url: str, locale: str, rest: str) -> str:
+        parts = urlsplit(url)
+        return urlunsplit((parts.scheme, parts.netloc, f"/{locale}/{rest}", parts.query, ""))
+
+    def record_found(self, url: str, alternates: Iterable[str] = ()) -> None:
+        """
+        取得できたURLと、そのページの hreflang の代替リンクを記録する
+
+        代替リンクがあれば、それに含まれないロケールの翻訳は存在しないとみなします。
+        """
+        parsed = split_url(url)
+        if parsed is None:
+            return
+        locale, rest = parsed
+        locales = {canonical_locale(alternate) for alternate in filter(None, map(url_locale, alternates))}
+        if locales:
+            self.map.record_available(rest, locales | {locale})
+        self.map.record(rest, locale, True)
+
+    def record_missing(self, url: str) -> None:
+        """上流が 404 を返したURLを記録する"""
+        parsed = split_url(url)
+        if parsed is None:
+            return
+        locale, rest = parsed
+        self.map.record(rest, locale, False)
+        with self._lock:
+            self.missing += 1
+
+    def record_fallback(self) -> None:
+        """フォールバック先の版を返したことを記録する"""
+        with self._lock:
+            self.fallbacks_served += 1
+
+    def stats(self) -> Dict[str, object]:
+        """フォールバックの統計情報"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "default_locale": self.default_locale,
+                "pages": len(self.map),
+                "fallbacks_served": self.fallbacks_served,
+                "skipped": self.skipped,
+                "missing": self.missing,
+            }
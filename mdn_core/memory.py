@@ -0,0 +1,132 @@
+"""
+リクエストごとのメモリ使用量の計測
+
+MDN_MEMORY_TRACKING=true の場合、tracemalloc で各リクエストの処理中に増えたメモリの
+ピーク（開始時点からの増加分）を計測し、/metrics と遅いリクエストのログに出力します。
+
+tracemalloc のピークはプロセス全体で1つのため、計測は同時に1リクエストだけ行い、
+計測中に始まった他のリクエストは計測を省略します。計測中のリクエストのピークには
+並行して処理されている他のリクエストの割り当ても含まれるため、上限の目安として扱ってください。
+
+プロセスの常駐メモリ（RSS）は計測の有効・無効に関わらず報告します。
+"""
+
+import os
+import sys
+import threading
+import tracemalloc
+from typing import Any, Dict, Optional
+
+from . import config
+from .fetch import LatencyTracker
+
+
+class _Measurement:
+    """1つのリクエストのメモリ使用量のピークを計測するコンテキストマネージャー"""
+    __slots__ = ("tracker", "active", "baseline", "peak")
+
+    def __init__(self, tracker: "MemoryTracker", active: bool):
+        self.tracker = tracker
+        self.active = active
+        self.baseline = 0
+        # 計測した場合は開始時点からのピークの増加分（バイト）、計測しなかった場合はNone
+        self.peak: Optional[int] = None
+
+    def __enter__(self) -> "_Measurement":
+        if self.active:
+            self.baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.active:
+            self.peak = max(0, tracemalloc.get_traced_memory()[1] - self.baseline)
+            self.tracker._finish(self.peak)
+
+
+class MemoryTracker:
+    """tracemalloc によるリクエストごとのメモリ使用量のピークの集計"""
+    def __init__(self, enabled: bool = config.MEMORY_TRACKING, frames: int = 1):
+        """
+        Args:
+            enabled: 計測を行うか（有効にすると tracemalloc を開始する）
+            frames: tracemalloc が割り当てごとに保持するスタックの深さ
+        """
+        self.enabled = enabled
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._measuring = threading.Lock()
+        self._lock = threading.Lock()
+        # 直近のピーク（値はバイト数）
+        self.peaks = LatencyTracker(min_samples=1)
+        self.measured = 0
+        self.skipped = 0
+        self.max_peak = 0
+
+    def measure(self) -> _Measurement:
+        """
+        リクエストのメモリ使用量のピークを計測する
+
+        無効な場合と、別のリクエストを計測中の場合は何もしません（peak はNoneのまま）。
+        """
+        if not self.enabled:
+            return _Measurement(self, False)
+        if not self._measuring.acquire(blocking=False):
+            with self._lock:
+                self.skipped += 1
+            return _Measurement(self, False)
+        return _Measurement(self, True)
+
+    def _finish(self, peak: int) -> None:
+        self.peaks.record(peak)
+        with self._lock:
+            self.measured += 1
+            self.max_peak = max(self.max_peak, peak)
+        self._measuring.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """メモリ使用量の統計情報"""
+        stats: Dict[str, Any] = {"tracking": self.enabled, "rss_bytes": rss_bytes(), "max_rss_bytes": max_rss_bytes()}
+        if self.enabled:
+            with self._lock:
+                stats.update(measured=self.measured, skipped=self.skipped, max_peak_bytes=self.max_peak)
+            stats.update(
+                peak_p50_bytes=self.peaks.percentile(50),
+                peak_p95_bytes=self.peaks.percentile(95),
+                traced_bytes=tracemalloc.get_traced_memory()[0],
+            )
+        return stats
+
+
+def rss_bytes() -> Optional[int]:
+    """プロセスの現在の常駐メモリ（Linux 以外ではNone）"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def max_rss_bytes() -> Optional[int]:
+    """プロセスの常駐メモリの最大値（resource が無い環境ではNone）"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS はバイト、Linux はキロバイト単位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+_default_tracker: Optional[MemoryTracker] = None
+_default_lock = threading.Lock()
+
+
+def get_memory_tracker() -> MemoryTracker:
+    """プロセス共通のメモリ使用量の計測を取得する"""
+    global _default_tracker
+    if _default_tracker is None:
+        with _default_lock:
+            if _default_tracker is None:
+                _default_tracker = MemoryTracker()
+    return _default_tracker
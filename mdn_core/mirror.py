@@ -0,0 +1,336 @@
+"""
+サイトマップの lastmod と内容のハッシュにもとづくミラーの差分更新
+
+MDN 全体を定期的に取得し直す代わりに、サイトマップの lastmod をスナップショットストアに
+保存済みの版と比較し、新規または更新されたURLだけを取得します。
+
+- 取得は保存済みの ETag / Last-Modified を使った条件付きリクエストで行い、
+  304 Not Modified であれば本文を受け取りません
+- 本文を受け取っても生のHTMLのハッシュが前回と同じであれば、抽出をやり直しません
+- 新しいページのシンボルは索引を作り直さずにリゾルバーへ追加し、
+  キャッシュ中のドキュメントは新しい版で置き換えます（pipeline の on_update で行う）
+- サイトマップから消えたページはスナップショットストアから削除し、キャッシュと
+  リゾルバーからも外します（pipeline の on_remove で行う）
+
+サイトマップはローカルのファイル（.xml / .xml.gz）またはURLで指定します。
+サイトマップインデックス（<sitemapindex>）の場合は、列挙された各サイトマップを順に読みます。
+"""
+
+import gzip
+import hashlib
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import config
+from .errors import CircuitOpenError, MDNError
+from .extract import Document, extract_document
+from .fetch import FetchResult
+from .snapshot import SnapshotStore
+
+# 1回の更新での各URLの結果
+NEW = "new"                    # 新規に取得して保存した
+UPDATED = "updated"            # 内容が変わったため新しい版を保存した
+NOT_MODIFIED = "not_modified"  # 条件付きリクエストに 304 が返った
+SAME_HTML = "same_html"        # HTMLのハッシュが前回と同じため抽出を省略した
+SAME_TEXT = "same_text"        # HTMLは変わったが抽出結果は同じだった
+FAILED = "failed"              # 取得または抽出に失敗した
+
+OUTCOMES = (NEW, UPDATED, NOT_MODIFIED, SAME_HTML, SAME_TEXT, FAILED)
+
+
+def lastmod_time(value: Optional[str]) -> Optional[float]:
+    """サイトマップの lastmod（W3C Datetime）をUNIX時刻に変換する（解釈できない場合はNone）"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_sitemap(data: bytes) -> Tuple[List[Tuple[str, Optional[str]]], List[str]]:
+    """
+    サイトマップを解析する（gzip 圧縮にも対応）
+
+    Args:
+        data: サイトマップの内容
+
+    Returns:
+        (URLと lastmod のリスト, サイトマップインデックスに列挙されたサイトマップのURLのリスト)
+    """
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    urls: List[Tuple[str, Optional[str]]] = []
+    sitemaps: List[str] = []
+    loc: Optional[str] = None
+    lastmod: Optional[str] = None
+    for _, element in ET.iterparse(BytesIO(data)):
+        tag = element.tag.rsplit("}", 1)[-1]
+        if tag == "loc":
+            loc = (element.text or "").strip()
+        elif tag == "lastmod":
+            lastmod = (element.text or "").strip() or None
+        elif tag in ("url", "sitemap"):
+            if loc:
+                if tag == "url":
+                    urls.append((loc, lastmod))
+                else:
+                    sitemaps.append(loc)
+            loc = lastmod = None
+            element.clear()
+    return urls, sitemaps
+
+
+class MirrorRefresher:
+    """サイトマップとの差分だけを取得してスナップショットストアを最新に保つ"""
+    def __init__(
+        self,
+        store: SnapshotStore,
+        fetch: Callable[[str, Dict[str, str]], FetchResult],
+        on_update: Optional[Callable[[str, Document, bool], None]] = None,
+        on_remove: Optional[Callable[[str], None]] = None,
+        concurrency: int = config.MIRROR_CONCURRENCY,
+        interval: float = config.MIRROR_INTERVAL,
+        max_fetches: int = config.MIRROR_MAX_FETCHES
+    ):
+        """
+        Args:
+            store: ミラーを保存するスナップショットストア
+            fetch: URLと追加のリクエストヘッダーを受け取り、上流から取得する関数
+            on_update: 内容が変わったURLのドキュメントと、新規かどうかを受け取る関数
+            on_remove: サイトマップから消えたため削除したURLを受け取る関数
+            concurrency: 同時に実行する取得の上限
+            interval: 定期実行の間隔（秒）
+            max_fetches: 1回の更新で取得するURLの上限（0の場合は無制限、残りは次回に回す）
+        """
+        self.store = store
+        self.fetch = fetch
+        self.on_update = on_update
+        self.on_remove = on_remove
+        self.concurrency = concurrency
+        self.interval = interval
+        self.max_fetches = max_fetches
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.runs = 0
+        self.totals: Dict[str, int] = {outcome: 0 for outcome in OUTCOMES}
+        self.last_run: Optional[Dict[str, float]] = None
+
+    def entries(self, source: str) -> Iterator[Tuple[str, Optional[str]]]:
+        """サイトマップ（インデックスの場合は列挙された全サイトマップ）のURLと lastmod を列挙する"""
+        pending = [source]
+        seen = set()
+        while pending:
+            location = pending.pop(0)
+            if location in seen:
+                continue
+            seen.add(location)
+            urls, sitemaps = parse_sitemap(self._read(location))
+            for loc, lastmod in urls:
+                if loc.startswith(config.MDN_BASE_URL):
+                    yield loc.split("#", 1)[0], lastmod
+            pending.extend(sitemaps)
+
+    def _read(self, location: str) -> bytes:
+        if location.startswith(("http://", "https://")):
+            return self.fetch(location, {}).body
+        with open(location, "rb") as f:
+            return f.read()
+
+    def plan(self, entries: Iterator[Tuple[str, Optional[str]]]) -> Dict[str, List[Tuple[str, Optional[str]]]]:
+        """
+        サイトマップの各URLを保存済みの版と比較して分類する
+
+        保存済みの版に lastmod が無い場合（ミラーではなく通常の取得で保存した版）は、
+        保存した時刻と比較します。サイトマップに lastmod が無いURLは変更を判定できないため
+        "changed" とし、条件付きリクエストとHTMLのハッシュで実際に変わったかを確かめます。
+
+        Returns:
+            "new"（未保存）・"changed"（lastmod が保存時より新しい、または不明）・
+            "unchanged"・"removed"（以前サイトマップに載っていたが今回は無い）ごとの (URL, lastmod) のリスト
+        """
+        plan: Dict[str, List[Tuple[str, Optional[str]]]] = {"new": [], "changed": [], "unchanged": [], "removed": []}
+        listed = set()
+        for url, lastmod in entries:
+            listed.add(url)
+            revision = self.store.latest(url)
+            if revision is None:
+                plan["new"].append((url, lastmod))
+                continue
+            listed_time = lastmod_time(lastmod)
+            stored_time = lastmod_time(revision.meta.get("lastmod"))
+            if stored_time is None:
+                stored_time = revision.stored_at
+            if listed_time is None or listed_time > stored_time:
+                plan["changed"].append((url, lastmod))
+            else:
+                plan["unchanged"].append((url, lastmod))
+        if listed:
+            # 通常の取得だけで保存したページ（別のロケールのサイトマップにあるものなど）は削除しない。
+            # 空のサイトマップ（読み込みの失敗など）ではミラー全体を消さない
+            plan["removed"] = [
+                (url, None) for url in self.store.urls()
+                if url not in listed and "lastmod" in self.store.latest(url).meta
+            ]
+        return plan
+
+    def refresh(self, source: str) -> Dict[str, float]:
+        """
+        サイトマップとの差分を1回取得する
+
+        Args:
+            source: サイトマップのファイルパスまたはURL
+
+        Returns:
+            URLの件数と結果ごとの件数、かかった秒数
+        """
+        with self._run_lock:
+            start = time.monotonic()
+            plan = self.plan(self.entries(source))
+            work = plan["new"] + plan["changed"]
+            deferred = 0
+            if self.max_fetches and len(work) > self.max_fetches:
+                deferred = len(work) - self.max_fetches
+                work = work[:self.max_fetches]
+
+            counts = {outcome: 0 for outcome in OUTCOMES}
+            abort = threading.Event()
+
+            def run(item: Tuple[str, Optional[str]]) -> None:
+                if abort.is_set():
+                    return
+                try:
+                    outcome = self.refresh_url(*item)
+                except CircuitOpenError:
+                    # 上流の障害中は残りを次回に回す
+                    abort.set()
+                    return
+                with self._lock:
+                    counts[outcome] += 1
+                    self.totals[outcome] += 1
+
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="mdn-mirror") as pool:
+                list(pool.map(run, work))
+
+            removed = sum(self.remove_url(url) for url, _ in plan["removed"])
+
+            result = dict(
+                counts,
+                listed=sum(len(plan[name]) for name in ("new", "changed", "unchanged")),
+                unchanged=len(plan["unchanged"]),
+                removed=removed,
+                deferred=deferred + len(work) - sum(counts.values()),
+                seconds=round(time.monotonic() - start, 3),
+            )
+            with self._lock:
+                self.runs += 1
+                self.last_run = result
+            return result
+
+    def refresh_url(self, url: str, lastmod: Optional[str] = None) -> str:
+        """
+        1つのURLを条件付きで取得し、変わっていれば新しい版を保存する
+
+        Returns:
+            結果（NEW / UPDATED / NOT_MODIFIED / SAME_HTML / SAME_TEXT / FAILED）
+
+        Raises:
+            CircuitOpenError: 上流の障害中の場合
+        """
+        previous = self.store.latest(url)
+        headers = {}
+        if previous is not None:
+            if previous.meta.get("etag"):
+                headers["If-None-Match"] = previous.meta["etag"]
+            if previous.meta.get("last_modified"):
+                headers["If-Modified-Since"] = previous.meta["last_modified"]
+        meta = {"lastmod": lastmod}
+
+        try:
+            result = self.fetch(url, headers)
+            if previous is not None and result.not_modified:
+                self.store.update_meta(url, meta)
+                return NOT_MODIFIED
+            meta.update(response_meta(result))
+            if previous is not None and previous.meta.get("html_hash") == meta["html_hash"]:
+                self.store.update_meta(url, meta)
+                return SAME_HTML
+            doc = extract_document(result.body, url)
+            digest = self.store.put(url, doc, meta)
+        except CircuitOpenError:
+            raise
+        except (MDNError, OSError, ValueError) as e:
+            print(f"Mirror refresh failed for {url}: {e}", file=sys.stderr)
+            return FAILED
+
+        if previous is not None and previous.digest == digest:
+            return SAME_TEXT
+        if self.on_update is not None:
+            self.on_update(url, doc, previous is None)
+        return NEW if previous is None else UPDATED
+
+    def remove_url(self, url: str) -> bool:
+        """
+        サイトマップから消えたURLをスナップショットストアから削除する
+
+        Returns:
+            削除した場合はTrue
+        """
+        try:
+            if not self.store.remove(url):
+                return False
+        except OSError as e:
+            print(f"Mirror removal failed for {url}: {e}", file=sys.stderr)
+            return False
+        if self.on_remove is not None:
+            self.on_remove(url)
+        return True
+
+    def _run(self, source: str) -> None:
+        while True:
+            try:
+                self.refresh(source)
+            except Exception as e:
+                print(f"Mirror refresh error: {e}", file=sys.stderr)
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self, source: str) -> None:
+        """定期的な差分更新を開始する（開始直後に1回実行する）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(source,), name="mdn-mirror", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = False) -> None:
+        """定期的な差分更新を停止する"""
+        self._stop.set()
+        if self._thread is not None and wait:
+            self._thread.join()
+        self._thread = None
+
+    def stats(self) -> Dict[str, object]:
+        """差分更新の統計情報"""
+        with self._lock:
+            return {"runs": self.runs, "totals": dict(self.totals), "last_run": self.last_run}
+
+
+def response_meta(result: FetchResult) -> Dict[str, Optional[str]]:
+    """取得結果から、次回の条件付きリクエストと変更検出に使う付加情報を取り出す"""
+    return {
+        "etag": result.header("ETag"),
+        "last_modified": result.header("Last-Modified"),
+        "html_hash": hashlib.sha256(result.body).hexdigest(),
+    }
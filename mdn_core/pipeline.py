@@ -0,0 +1,459 @@
+"""
+取得・キャッシュ・抽出のパイプライン
+
+全フロントエンドはこのモジュールを経由してドキュメントを取得します。
+パフォーマンス改善はここに実装すれば全フロントエンドに反映されます。
+"""
+
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from operator import attrgetter
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from . import config
+from .breaker import CLOSED, CircuitBreaker
+from .cache import FRESH, MISS, STALE, TTLCache
+from .cluster import Cluster, get_cluster
+from .errors import CircuitOpenError, DeadlineExceededError, FetchError, InvalidURLError, MDNError
+from .extract import FALLBACK_MISSING, FALLBACK_UNAVAILABLE, Document, extract_document
+from .fetch import Fetcher, FetchResult
+from .locales import LocaleFallback
+from .memory import get_memory_tracker
+from .mirror import MirrorRefresher, response_meta
+from .prefetch import Prefetcher
+from .refresh import RefreshScheduler
+from .resolver import get_resolver
+from .scheduler import (
+    BACKGROUND,
+    BULK,
+    INTERACTIVE,
+    PriorityScheduler,
+    Ticket,
+    check_deadline,
+    default_deadline,
+    remaining,
+)
+from .snapshot import SnapshotStore, get_snapshot_store
+from .tracing import annotate, stage
+
+
+def is_mdn_url(url: str) -> bool:
+    """MDNのURLかどうかを判定する"""
+    return isinstance(url, str) and url.startswith(config.MDN_BASE_URL)
+
+
+def cache_key(url: str) -> str:
+    """URLからキャッシュキーを生成する（フラグメントは無視）"""
+    return url.split("#", 1)[0]
+
+
+class MDNPipeline:
+    """MDNドキュメントの取得パイプライン"""
+    def __init__(
+        self,
+        fetcher: Optional[Fetcher] = None,
+        cache: Optional[TTLCache] = None,
+        max_stale: float = config.CACHE_STALE_TTL,
+        breaker: Optional[CircuitBreaker] = None,
+        scheduler: Optional[PriorityScheduler] = None,
+        snapshots: Optional[SnapshotStore] = None,
+        cluster: Optional[Cluster] = None,
+        locales: Optional[LocaleFallback] = None
+    ):
+        self.fetcher = fetcher or Fetcher()
+        self.breaker = breaker or CircuitBreaker()
+        self.scheduler = scheduler or PriorityScheduler()
+        self.cache = cache if cache is not None else TTLCache(
+            max_entries=config.CACHE_MAX_ENTRIES,
+            ttl=config.CACHE_TTL,
+            max_bytes=config.CACHE_MAX_BYTES,
+            sizeof=attrgetter("size")
+        )
+        self.max_stale = max_stale
+        # ディスク上のスナップショット（MDN_SNAPSHOT_DIR が未設定の場合はNone）
+        self.snapshots = snapshots if snapshots is not None else get_snapshot_store()
+        # サイトマップにもとづくミラーの差分更新（スナップショットストアがある場合のみ）
+        self.mirror = MirrorRefresher(
+            self.snapshots, self._fetch_mirror, self._on_mirrored, self._on_mirror_removed
+        ) if self.snapshots is not None else None
+        # 複数ノードでのキャッシュの分担（MDN_CLUSTER_PEERS が未設定の場合はNone）
+        self.cluster = cluster if cluster is not None else get_cluster()
+        self.refresher = RefreshScheduler(self.cache, self._load_background)
+        self.prefetcher = Prefetcher(self.cache, self._load_bulk)
+        # ロケールの正規化と、翻訳が無いページのフォールバック
+        self.locales = locales or LocaleFallback()
+        # 同じキーへの同時取得を1回にまとめるための実行中の取得と、その作業枠のチケット
+        self._inflight: Dict[str, Tuple[Future, Ticket]] = {}
+        self._inflight_lock = threading.Lock()
+        # 上流の障害中に古いコピーを返した回数
+        self.stale_served = 0
+
+    def get_document(
+        self,
+        url: str,
+        priority: str = INTERACTIVE,
+        deadline: Optional[float] = None,
+        forward: bool = True
+    ) -> Document:
+        """
+        MDNドキュメントを取得する
+
+        キャッシュが有効期限内ならそのまま返します。期限切れでも max_stale 秒以内なら
+        期限切れの値をすぐに返し、バックグラウンドで再取得します（stale-while-revalidate）。
+
+        キャッシュに無くても、スナップショットストアに有効期限内の版があればそれを返します
+        （プロセスの再起動直後など）。
+
+        上流の障害中（サーキットブレーカーが開いている場合を含む）は、キャッシュまたは
+        スナップショットストアに残っている最後の正常なコピーを is_stale の印を付けて返します。
+        期限までに取得できなかった場合も同様です。
+
+        クラスターモードでは、自ノードが所有していないURLは上流ではなく所有ノードから取得します。
+
+        URLのロケールは正規の表記にそろえます。要求したロケールの翻訳が無い場合は、フォールバック先の
+        ロケールの版を is_fallback の印を付けて返します。フォールバック先の版はフォールバック先のURLで
+        キャッシュするため、複数のロケールから同じ版を要求しても上流からの取得は1回です。
+        上流の障害中に要求したロケールのコピーが無い場合も、コピーのあるフォールバック先の版を返します
+        （注記は翻訳が無い場合と区別します）。期限は全ての候補で共有するため、期限切れの後の候補は
+        キャッシュまたはスナップショットのコピーからしか返せません。
+
+        Args:
+            url: MDNドキュメントのURL
+            priority: 優先度クラス（INTERACTIVE / BACKGROUND / BULK）
+            deadline: 期限（time.monotonic() 基準）、省略時は優先度クラスの既定値
+            forward: クラスターモードで所有ノードに問い合わせるか（ノード間のリクエストではFalse）
+
+        Returns:
+            抽出されたドキュメント
+
+        Raises:
+            InvalidURLError: MDN以外のURLの場合
+            CircuitOpenError: 上流の障害中で、古いコピーも無い場合
+            DeadlineExceededError: 期限までに取得できず、古いコピーも無い場合
+            FetchError: 取得に失敗した場合（どのロケールにも無い場合を含む）
+            ExtractError: 抽出に失敗した場合
+        """
+        if not is_mdn_url(url):
+            raise InvalidURLError(
+                f"Invalid URL. Only MDN URLs ({config.MDN_BASE_URL}) are supported."
+            )
+
+        if deadline is None:
+            deadline = default_deadline(priority)
+        key = self.locales.normalize(cache_key(url))
+        if not forward:
+            # ノード間のリクエストでは、要求を受けたノードがロケールを解決済み
+            return self._get_exact(key, priority, deadline, forward)
+
+        candidates = self.locales.candidates(key, self._has_copy)
+        if not candidates:
+            raise FetchError(f"HTTP 404 while fetching {key} (no translation available)", upstream_status=404)
+        error: Optional[MDNError] = None
+        unavailable: Optional[MDNError] = None
+        # 期限は候補ごとではなく要求全体の期限（期限切れの後の候補は手元のコピーからしか返せない）
+        for candidate in candidates:
+            try:
+                doc = self._get_exact(candidate, priority, deadline, forward)
+            except (FetchError, DeadlineExceededError) as e:
+                if isinstance(e, FetchError) and e.upstream_status == 404:
+                    self.locales.record_missing(candidate)
+                elif isinstance(e, FetchError) and not _upstream_unavailable(e):
+                    raise
+                else:
+                    # 上流の障害中でも、フォールバック先のコピーがあればそれを返す
+                    unavailable = unavailable or e
+                error = e
+                continue
+            self.locales.record_found(candidate)
+            if candidate == key:
+                return doc
+            self.locales.record_fallback()
+            annotate(locale_fallback=candidate)
+            # 障害で取得できなかったロケールがあれば、翻訳が無いとは伝えない
+            return doc.as_fallback(key, FALLBACK_UNAVAILABLE if unavailable is not None else FALLBACK_MISSING)
+        # どの候補も返せない場合、障害で確かめられなかったロケールがあれば 404 ではなく障害として返す
+        raise unavailable or error
+
+    def _has_copy(self, key: str) -> bool:
+        """キャッシュまたはスナップショットにコピーがあるか（ロケールの存在の判定に使う）"""
+        return self.cache.get_entry(key) is not None or (self.snapshots is not None and key in self.snapshots)
+
+    def _get_exact(self, key: str, priority: str, deadline: Optional[float], forward: bool) -> Document:
+        """ロケールを解決済みのキーのドキュメントを取得する（get_document の本体）"""
+        self.refresher.record_access(key)
+        doc, state = self.cache.lookup(key, self.max_stale)
+        annotate(cache=state)
+        if state == STALE:
+            self.refresher.schedule(key)
+            if self.breaker.state != CLOSED:
+                doc = self._last_known_good(key) or doc
+        if state == MISS:
+            doc = self._fresh_snapshot(key)
+            if doc is not None:
+                state = FRESH
+                annotate(cache="snapshot")
+        if state == MISS:
+            try:
+                doc = self._load(key, priority, deadline, forward)
+            except (FetchError, DeadlineExceededError) as e:
+                if isinstance(e, FetchError) and not _upstream_unavailable(e):
+                    raise
+                doc = self._last_known_good(key)
+                if doc is None:
+                    raise
+
+        # 障害中は先読みで上流への試行を増やさない
+        # （ノード間のリクエストでは、クライアントから直接受けたノードが先読みを行う）
+        if forward:
+            self.prefetcher.on_access(key, doc, prefetch=self.breaker.state == CLOSED)
+        return doc
+
+    def _last_known_good(self, key: str) -> Optional[Document]:
+        """キャッシュまたはスナップショットに残っている最後の正常なコピーを、古いことを示す印を付けて返す"""
+        entry = self.cache.get_entry(key)
+        if entry is not None:
+            self.stale_served += 1
+            return entry.value.as_stale(entry.staleness)
+        revision = self.snapshots.latest(key) if self.snapshots is not None else None
+        if revision is None:
+            return None
+        doc = self._read_snapshot(key)
+        if doc is None:
+            return None
+        self.stale_served += 1
+        return doc.as_stale(max(0.0, revision.age - self.cache.ttl))
+
+    def _fresh_snapshot(self, key: str) -> Optional[Document]:
+        """スナップショットの最新の版が有効期限内であれば、残りの期限でキャッシュに載せて返す"""
+        revision = self.snapshots.latest(key) if self.snapshots is not None else None
+        if revision is None or revision.age >= self.cache.ttl:
+            return None
+        with stage("snapshot"):
+            doc = self._read_snapshot(key)
+        if doc is not None:
+            self.cache.set(key, doc, self.cache.ttl - revision.age)
+        return doc
+
+    def _read_snapshot(self, key: str) -> Optional[Document]:
+        try:
+            return self.snapshots.get(key)
+        except (OSError, ValueError, KeyError, zlib.error) as e:
+            print(f"Failed to read snapshot of {key}: {e}", file=sys.stderr)
+            return None
+
+    def _save_snapshot(self, key: str, doc: Document, result: FetchResult) -> None:
+        """取得したドキュメントをスナップショットストアに保存する（失敗しても取得自体は成功させる）"""
+        if self.snapshots is None:
+            return
+        try:
+            # ETag などはミラーの差分更新で条件付きリクエストに使う
+            with stage("snapshot"):
+                self.snapshots.put(key, doc, response_meta(result))
+        except (OSError, ValueError) as e:
+            print(f"Failed to save snapshot of {key}: {e}", file=sys.stderr)
+
+    def _fetch(
+        self,
+        key: str,
+        deadline: Optional[float],
+        headers: Optional[Dict[str, str]] = None
+    ) -> FetchResult:
+        """サーキットブレーカーを通して上流から取得する"""
+        if not self.breaker.allow():
+            raise CircuitOpenError(
+                f"MDN is unavailable; not fetching {key}",
+                retry_after=self.breaker.retry_after()
+            )
+        start = time.monotonic()
+        try:
+            with stage("upstream"):
+                result = self.fetcher.fetch(key, deadline, headers)
+        except FetchError as e:
+            if deadline is not None and time.monotonic() >= deadline:
+                # 上流ではなく呼び出し元の期限によって打ち切った
+                self.breaker.record_cancelled()
+                raise DeadlineExceededError(f"Deadline exceeded while fetching {key}") from e
+            if _upstream_unavailable(e):
+                self.breaker.record_failure()
+            else:
+                # 404 などは上流が正常に応答している
+                self.breaker.record_success(time.monotonic() - start)
+            raise
+        except BaseException:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success(time.monotonic() - start)
+        return result
+
+    def _load(
+        self,
+        key: str,
+        priority: str = BACKGROUND,
+        deadline: Optional[float] = None,
+        forward: bool = True
+    ) -> Document:
+        """
+        上流から取得・抽出してキャッシュに保存する
+
+        クラスターモードで他のノードが所有するキーは、所有ノードから取得します
+        （所有ノードが応答しない場合は自分で上流から取得します）。
+
+        取得と解析は作業枠の中で行い、各段階の前に期限を確認します。
+        同じキーの取得が既に実行中であれば、その結果を待って共有します
+        （待つ側の優先度が高ければ、実行中の取得の優先度を引き上げます）。
+        """
+        while True:
+            with self._inflight_lock:
+                inflight = self._inflight.get(key)
+                leader = inflight is None
+                if leader:
+                    inflight = (Future(), Ticket(priority, deadline))
+                    self._inflight[key] = inflight
+            future, ticket = inflight
+            if leader:
+                break
+            self.scheduler.boost(ticket, priority)
+            try:
+                with stage("wait_inflight"):
+                    return future.result(timeout=remaining(deadline))
+            except FutureTimeoutError:
+                raise DeadlineExceededError(f"Deadline exceeded while waiting for {key}") from None
+            except DeadlineExceededError:
+                # 先行した取得の期限が短かった場合は、自分の期限で取得し直す
+                check_deadline(deadline, "fetching")
+
+        try:
+            doc = self._load_from_owner(key, priority, deadline) if forward else None
+            if doc is not None:
+                future.set_result(doc)
+                return doc
+            with self.scheduler.slot(ticket):
+                result = self._fetch(key, deadline)
+                check_deadline(deadline, "parsing")
+                with stage("extract"):
+                    doc = extract_document(result.body, key)
+            doc.source_bytes = len(result.body)
+            # 他のロケールの版の一覧は、ページごとの翻訳の有無として記録するだけで保持しない
+            self.locales.record_found(key, doc.alternates)
+            doc.alternates = []
+            self.cache.set(key, doc)
+            # タイトル（例: "Array.prototype.flatMap()"）をシンボルとして覚えておく
+            get_resolver().learn(doc.title, key)
+            future.set_result(doc)
+            # 待っているリクエストには先に結果を返し、その後でディスクに保存する
+            self._save_snapshot(key, doc, result)
+            return doc
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def _load_from_owner(self, key: str, priority: str, deadline: Optional[float]) -> Optional[Document]:
+        """
+        他のノードが所有するキーを所有ノードから取得する
+
+        取得したドキュメントはホットキーの場合だけ短い有効期限で自ノードのキャッシュに複製します。
+        自ノードが所有している場合と、所有ノードが応答しない場合はNoneを返します。
+        """
+        if self.cluster is None or self.cluster.is_owner(key):
+            return None
+        with stage("peer"):
+            loaded = self.cluster.load(key, priority, deadline)
+        if loaded is None:
+            return None
+        doc, hot = loaded
+        if hot:
+            self.cache.set(key, doc, self.cluster.hot_ttl)
+        return doc
+
+    def _fetch_mirror(self, url: str, headers: Dict[str, str]) -> FetchResult:
+        """ミラーの差分更新のための取得（一括処理の優先度で作業枠を使う）"""
+        deadline = default_deadline(BULK)
+        with self.scheduler.slot(Ticket(BULK, deadline)):
+            return self._fetch(url, deadline, headers)
+
+    def _on_mirrored(self, key: str, doc: Document, new: bool) -> None:
+        """ミラーで内容が変わったページを、キャッシュと派生する索引に反映する"""
+        if self.cache.get_entry(key) is not None:
+            self.cache.set(key, doc)
+        self.locales.record_found(key, doc.alternates)
+        doc.alternates = []
+        resolver = get_resolver()
+        resolver.learn(doc.title, key)
+        if new:
+            # 索引を作り直さずに、サイトマップに追加されたページのシンボルを登録する
+            resolver.add_path(unquote(urlsplit(key).path))
+
+    def _on_mirror_removed(self, key: str) -> None:
+        """サイトマップから消えたページを、キャッシュとリゾルバーから外す"""
+        self.cache.delete(key)
+        get_resolver().remove_path(unquote(urlsplit(key).path))
+
+    def _load_background(self, key: str) -> Document:
+        """裏での再取得（stale-while-revalidate と先回り更新）"""
+        return self._load(key, BACKGROUND, default_deadline(BACKGROUND))
+
+    def _load_bulk(self, key: str) -> Document:
+        """先読み"""
+        return self._load(key, BULK, default_deadline(BULK))
+
+    def start_background_refresh(self) -> None:
+        """期限切れ前の先回り更新と、ミラーの差分更新（MDN_MIRROR_SITEMAP を設定した場合）を開始する"""
+        self.refresher.start()
+        if self.mirror is not None and config.MIRROR_SITEMAP:
+            self.mirror.start(config.MIRROR_SITEMAP)
+
+    def stop_background_refresh(self) -> None:
+        """先回り更新とミラーの差分更新を停止し、キューに残っている先読みを取り消す"""
+        self.refresher.stop()
+        if self.mirror is not None:
+            self.mirror.stop()
+        self.prefetcher.cancel_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """取得・スケジューラー・キャッシュ・更新・先読み・スナップショット・クラスター・ロケール・メモリの統計情報"""
+        return {
+            "fetch": self.fetcher.stats(),
+            "breaker": dict(self.breaker.stats(), stale_served=self.stale_served),
+            "scheduler": self.scheduler.stats(),
+            "cache": self.cache.stats(),
+            "refresh": self.refresher.stats(),
+            "prefetch": self.prefetcher.stats(),
+            "snapshot": self.snapshots.stats() if self.snapshots is not None else None,
+            "mirror": self.mirror.stats() if self.mirror is not None else None,
+            "cluster": self.cluster.stats() if self.cluster is not None else None,
+            "locales": self.locales.stats(),
+            "memory": get_memory_tracker().stats(),
+        }
+
+
+def _upstream_unavailable(error: FetchError) -> bool:
+    """上流の障害による失敗か（通信エラー・期限切れ・5xx）"""
+    return error.upstream_status is None or error.upstream_status >= 500
+
+
+_default_pipeline: Optional[MDNPipeline] = None
+_default_lock = threading.Lock()
+
+
+def get_pipeline() -> MDNPipeline:
+    """プロセス共通のパイプラインを取得する"""
+    global _default_pipeline
+    if _default_pipeline is None:
+        with _default_lock:
+            if _default_pipeline is None:
+                _default_pipeline = MDNPipeline()
+    return _default_pipeline
+
+
+def set_pipeline(pipeline: MDNPipeline) -> None:
+    """プロセス共通のパイプラインを差し替える"""
+    global _default_pipeline
+    with _default_lock:
+        _default_pipeline = pipeline
@@ -0,0 +1,249 @@
+"""
+リンクグラフに基づく先読み（プリフェッチ）
+
+エージェントは `Array` を読んだ直後に `Array.prototype.map` のような
+リンク先のページを要求することが多いため、ページ内のリンクと実際に観測した
+ページ遷移から次に要求されそうなページを予測し、優先度の低いワーカーで
+キャッシュに読み込んでおきます。
+
+先読みは1分あたりのリクエスト数・バイト数の予算内でのみ行い、
+キューに残っている先読みはいつでも取り消せます。
+
+ページ遷移はクライアントごと（admission と同じ識別子）に直前のページを覚えて記録するため、
+同時に使っている他のクライアントのアクセスが遷移として混ざることはありません。
+トランスポートは navigation() でリクエストのクライアントを設定し、設定の無いアクセス
+（一括取得・裏での再取得など）は遷移として記録しません。
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Callable, Deque, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from . import config
+from .errors import MDNError
+
+if TYPE_CHECKING:
+    from .cache import TTLCache
+    from .extract import Document
+
+# 遷移を記録するリンク元ページの最大数
+_MAX_SOURCES = 2048
+# 直前のページを覚えておくクライアントの最大数
+_MAX_CLIENTS = 4096
+# 予算を計算する時間窓（秒）
+_BUDGET_WINDOW = 60.0
+
+
+# 現在のリクエストのクライアント（asyncio.to_thread で渡したワーカースレッドにも引き継がれる）
+_client: ContextVar[Optional[str]] = ContextVar("mdn_prefetch_client", default=None)
+
+
+@contextmanager
+def navigation(client: Optional[str]) -> Iterator[None]:
+    """
+    このコンテキストでのアクセスを、クライアントのページ遷移として記録する
+
+    Args:
+        client: client_identity() の識別子（Noneの場合は遷移を記録しない）
+    """
+    token = _client.set(client)
+    try:
+        yield
+    finally:
+        _client.reset(token)
+
+
+class Prefetcher:
+    """ページ遷移を予測してキャッシュに先読みする"""
+    def __init__(
+        self,
+        cache: "TTLCache",
+        load: Callable[[Hashable], "Document"],
+        enabled: bool = config.PREFETCH_ENABLED,
+        max_pages: int = config.PREFETCH_MAX_PAGES,
+        min_score: float = config.PREFETCH_MIN_SCORE,
+        max_requests: int = config.PREFETCH_REQUESTS_PER_MINUTE,
+        max_bytes: int = config.PREFETCH_BYTES_PER_MINUTE,
+        max_pending: int = config.PREFETCH_MAX_PENDING
+    ):
+        """
+        Args:
+            cache: 先読み先のキャッシュ
+            load: キーを受け取り、上流から取得してキャッシュに保存する関数
+            enabled: 先読みを行うかどうか
+            max_pages: 1回のアクセスで先読みする最大ページ数
+            min_score: 先読みする最低スコア
+            max_requests: 1分あたりの先読みリクエスト数の上限
+            max_bytes: 1分あたりの先読みバイト数の上限
+            max_pending: キューに積める先読みの上限（超えた分は古いものから取り消す）
+        """
+        self.cache = cache
+        self.load = load
+        self.enabled = enabled
+        self.max_pages = max_pages
+        self.min_score = min_score
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+        # 1ワーカーのみで実行し、通常のリクエストより優先度を低くする
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mdn-prefetch")
+        self._lock = threading.Lock()
+        self._transitions: "OrderedDict[Hashable, Dict[Hashable, int]]" = OrderedDict()
+        # クライアントごとの直前にアクセスしたキー
+        self._last_keys: "OrderedDict[str, Hashable]" = OrderedDict()
+        self._pending: "OrderedDict[Hashable, Future]" = OrderedDict()
+        # 先読みしたがまだアクセスされていないキー
+        self._unused: Dict[Hashable, float] = {}
+        # (時刻, バイト数) の履歴
+        self._spent: Deque[Tuple[float, int]] = deque()
+        self.prefetched = 0
+        self.hits = 0
+        self.cancelled = 0
+        self.over_budget = 0
+        self.failed = 0
+        self.bytes = 0
+
+    def on_access(self, key: Hashable, doc: "Document", prefetch: bool = True) -> None:
+        """
+        ドキュメントへのアクセスを記録し、次のページを先読みする
+
+        Args:
+            key: アクセスされたキー
+            doc: アクセスされたドキュメント
+            prefetch: 先読みを行うかどうか（Falseの場合はアクセスの記録のみ）
+        """
+        with self._lock:
+            if self._unused.pop(key, None) is not None:
+                self.hits += 1
+            self._record_transition(_client.get(), key)
+        if self.enabled and prefetch:
+            for candidate in self.predict(key, doc):
+                self._schedule(candidate)
+
+    def _record_transition(self, client: Optional[str], key: Hashable) -> None:
+        if client is None:
+            return
+        previous = self._last_keys.pop(client, None)
+        self._last_keys[client] = key
+        while len(self._last_keys) > _MAX_CLIENTS:
+            self._last_keys.popitem(last=False)
+        if previous is None or previous == key:
+            return
+        targets = self._transitions.get(previous)
+        if targets is None:
+            targets = self._transitions[previous] = {}
+            while len(self._transitions) > _MAX_SOURCES:
+                self._transitions.popitem(last=False)
+        self._transitions.move_to_end(previous)
+        targets[key] = targets.get(key, 0) + 1
+
+    def predict(self, key: Hashable, doc: "Document") -> List[Hashable]:
+        """
+        次に要求されそうなページを予測する
+
+        観測した遷移の回数と、リンクの出現順による事前スコア
+        （先頭のリンクほど高い）を合計して順位付けします。
+
+        Returns:
+            先読みするキーのリスト（スコアの高い順）
+        """
+        scores: Dict[Hashable, float] = {}
+        for rank, link in enumerate(doc.links[:32]):
+            scores[link] = 0.5 / (rank + 1)
+        with self._lock:
+            for target, count in self._transitions.get(key, {}).items():
+                scores[target] = scores.get(target, 0.0) + count
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+        candidates = []
+        for target, score in ranked:
+            if score < self.min_score or len(candidates) >= self.max_pages:
+                break
+            if target == key or self.cache.get_entry(target) is not None:
+                continue
+            candidates.append(target)
+        return candidates
+
+    def _within_budget(self) -> bool:
+        now = time.monotonic()
+        while self._spent and now - self._spent[0][0] > _BUDGET_WINDOW:
+            self._spent.popleft()
+        spent_bytes = sum(size for _, size in self._spent)
+        return len(self._spent) < self.max_requests and spent_bytes < self.max_bytes
+
+    def _schedule(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._pending:
+                return
+            if not self._within_budget():
+                self.over_budget += 1
+                return
+            # 結果のバイト数は取得後に加算する
+            entry = [time.monotonic(), 0]
+            self._spent.append(entry)
+            try:
+                future = self._executor.submit(self._prefetch, key, entry)
+            except RuntimeError:
+                return
+            self._pending[key] = future
+            while len(self._pending) > self.max_pending:
+                _, oldest = self._pending.popitem(last=False)
+                if oldest.cancel():
+                    self.cancelled += 1
+
+    def _prefetch(self, key: Hashable, entry: list) -> None:
+        try:
+            if self.cache.get_entry(key) is not None:
+                return
+            doc = self.load(key)
+            with self._lock:
+                entry[1] = doc.source_bytes
+                self.bytes += doc.source_bytes
+                self.prefetched += 1
+                self._unused[key] = time.monotonic()
+                # 使われないまま追い出されたキーが溜まり続けないようにする
+                if len(self._unused) > self.cache.max_entries:
+                    self._unused.pop(next(iter(self._unused)))
+        except MDNError as e:
+            self.failed += 1
+            print(f"Prefetch failed for {key}: {e}", file=sys.stderr)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def cancel_all(self) -> int:
+        """
+        キューに残っている先読みを全て取り消す
+
+        Returns:
+            取り消した件数
+        """
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        cancelled = sum(1 for future in pending if future.cancel())
+        self.cancelled += cancelled
+        return cancelled
+
+    def stop(self) -> None:
+        """先読みを停止する（実行中のものは完了まで待たない）"""
+        self.cancel_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, float]:
+        """先読みの効果を示す統計情報"""
+        return {
+            "prefetched": self.prefetched,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.prefetched if self.prefetched else 0.0,
+            "bytes": self.bytes,
+            "pending": len(self._pending),
+            "cancelled": self.cancelled,
+            "over_budget": self.over_budget,
+            "failed": self.failed,
+        }
@@ -0,0 +1,173 @@
+"""
+本番環境で使えるオンデマンドのスタックサンプラー
+
+/debug/profile?seconds=N で、指定した秒数だけ全スレッドのスタックを一定間隔で採取し、
+flamegraph.pl や speedscope でそのまま読み込める collapsed 形式
+（"スレッド;呼び出し元;...;関数 回数" の1行1スタック）で返します。
+
+- 採取中以外は何も実行しないため、常に有効にしておいてもオーバーヘッドはありません
+- 採取は sys._current_frames() を読むだけで、計測対象のコードには手を加えません
+- 同時に実行できる採取は1つだけで、秒数は MDN_PROFILE_MAX_SECONDS で制限します
+- ロック・イベント・select・持続的接続の次のリクエストの待ちで止まっているスタックは、
+  idle=1 を指定しない限り除外します（待ち時間は遅いリクエストのログの段階ごとの時間で確認できる）
+
+/debug/ 以下のエンドポイントは MDN_DEBUG_TOKEN を設定した場合は X-Debug-Token ヘッダーで、
+未設定の場合はループバックからのリクエストだけを受け付けます。
+"""
+
+import math
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Mapping, Optional, Tuple
+
+from . import config
+from .errors import MDNError
+
+# 待ちで止まっているとみなすスタックの末端（ファイル名, 関数名）
+_IDLE_FRAMES = frozenset({
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("socketserver.py", "serve_forever"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+})
+
+_THREAD_NUMBER = re.compile(r"[-_]?\d+")
+
+
+class ProfilerBusyError(MDNError):
+    """別の採取が実行中の場合の例外"""
+    status_code = 409
+
+
+class StackSampler:
+    """全スレッドのスタックを一定間隔で採取する"""
+    def __init__(self, interval: float = config.PROFILE_INTERVAL, max_seconds: float = config.PROFILE_MAX_SECONDS):
+        """
+        Args:
+            interval: 採取の間隔（秒）
+            max_seconds: 1回の採取の最大秒数
+        """
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self._busy = threading.Lock()
+        self._labels: Dict[object, str] = {}
+        self.runs = 0
+
+    def profile(self, seconds: float, idle: bool = False) -> Tuple[Counter, int]:
+        """
+        指定した秒数だけスタックを採取する（呼び出したスレッドは除外する）
+
+        Args:
+            seconds: 採取する秒数（max_seconds で制限する）
+            idle: 待ちで止まっているスタックも含めるか
+
+        Returns:
+            (collapsed 形式のスタックごとの回数, 採取した回数) のタプル
+
+        Raises:
+            ValueError: seconds が有限の数でない場合（nan は上限で制限できず、採取が終わらなくなる）
+            ProfilerBusyError: 別の採取が実行中の場合
+        """
+        if not math.isfinite(seconds):
+            raise ValueError("'seconds' must be a finite number")
+        if not self._busy.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running")
+        try:
+            seconds = min(max(seconds, self.interval), self.max_seconds)
+            me = threading.get_ident()
+            counts: Counter = Counter()
+            names = _thread_names()
+            names_at = time.monotonic()
+            samples = 0
+            end = time.monotonic() + seconds
+            while True:
+                start = time.monotonic()
+                if start >= end:
+                    break
+                if start - names_at >= 1.0:
+                    names = _thread_names()
+                    names_at = start
+                for ident, frame in sys._current_frames().items():
+                    if ident == me or (not idle and _is_idle(frame)):
+                        continue
+                    counts[self._collapse(names.get(ident, "thread"), frame)] += 1
+                samples += 1
+                time.sleep(max(0.0, self.interval - (time.monotonic() - start)))
+            self.runs += 1
+            return counts, samples
+        finally:
+            self._busy.release()
+
+    def _collapse(self, thread: str, frame) -> str:
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _label(code)
+            labels.append(label)
+            frame = frame.f_back
+        labels.append(thread)
+        return ";".join(reversed(labels))
+
+
+def _label(code) -> str:
+    """フレームの表示名（"親ディレクトリ/ファイル名:関数名"）"""
+    path = code.co_filename.replace("\\", "/").rsplit("/", 2)[-2:]
+    return f"{'/'.join(path)}:{code.co_name}".replace(";", ":").replace(" ", "_")
+
+
+def _thread_names() -> Dict[int, str]:
+    # 番号だけが違うワーカースレッドは1つにまとめる
+    return {
+        thread.ident: _THREAD_NUMBER.sub("", thread.name).replace(";", ":").replace(" ", "_")
+        for thread in threading.enumerate()
+        if thread.ident is not None
+    }
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    key = (os.path.basename(code.co_filename), code.co_name)
+    if key in _IDLE_FRAMES:
+        return True
+    # 持続的接続で次のリクエストを待っている
+    caller = frame.f_back
+    return key == ("socket.py", "readinto") and caller is not None and caller.f_code.co_name == "handle_one_request"
+
+
+def format_collapsed(counts: Counter) -> str:
+    """collapsed 形式のテキスト（回数の多い順）"""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def debug_allowed(headers: Mapping[str, str], client_host: Optional[str]) -> bool:
+    """/debug/ 以下のエンドポイントへのアクセスを許可するか"""
+    if config.DEBUG_TOKEN:
+        return headers.get("X-Debug-Token") == config.DEBUG_TOKEN
+    return client_host in ("127.0.0.1", "::1", "localhost")
+
+
+def profile_filename() -> str:
+    """ダウンロードするファイルの名前"""
+    return time.strftime("mdn-profile-%Y%m%d-%H%M%S.folded")
+
+
+_default_sampler: Optional[StackSampler] = None
+_default_lock = threading.Lock()
+
+
+def get_sampler() -> StackSampler:
+    """プロセス共通のスタックサンプラーを取得する"""
+    global _default_sampler
+    if _default_sampler is None:
+        with _default_lock:
+            if _default_sampler is None:
+                _default_sampler = StackSampler()
+    return _default_sampler
@@ -0,0 +1,250 @@
+"""
+MCPプロトコルの基本的な実装
+
+このモジュールはModelContextProtocolの基本構造と機能を実装します。
+外部パッケージに依存せず、全フロントエンドで共通のレスポンス形式を生成します。
+"""
+
+import hashlib
+import time
+from typing import Any, Dict, List, Optional
+
+from .errors import MDNError
+from .extract import Document
+from .locales import url_locale
+
+SOURCE_NAME = "Mozilla Developer Network (MDN)"
+SERVER_NAME = "mdn-web-scraper"
+
+
+class MCPContext:
+    """MCP互換のコンテキスト構造"""
+    def __init__(
+        self,
+        id: str,
+        content: Dict[str, Any],
+        metadata: Optional[Dict[str, Any]] = None,
+        attachments: Optional[Dict[str, Any]] = None
+    ):
+        self.id = id
+        self.content = content
+        self.metadata = metadata or {}
+        self.attachments = attachments or {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """コンテキストを辞書形式に変換"""
+        return {
+            "id": self.id,
+            "content": self.content,
+            "metadata": self.metadata,
+            "attachments": self.attachments
+        }
+
+
+class MCPResponse:
+    """MCP互換のレスポンス構造"""
+    def __init__(
+        self,
+        contexts: List[MCPContext],
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        self.contexts = contexts
+        self.metadata = metadata or {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """レスポンスを辞書形式に変換"""
+        return {
+            "contexts": [context.to_dict() for context in self.contexts],
+            "metadata": self.metadata
+        }
+
+
+def create_manifest(
+    name: str,
+    version: str,
+    description: str,
+    parameters: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    MCPマニフェストを作成する
+
+    Args:
+        name: サーバー名
+        version: バージョン
+        description: 説明
+        parameters: パラメータスキーマ
+
+    Returns:
+        MCP互換のマニフェスト辞書
+    """
+    return {
+        "name": name,
+        "version": version,
+        "description": description,
+        "protocols": {
+            "mcp": "1.0.0"
+        },
+        "parameters": parameters or {}
+    }
+
+
+def default_manifest() -> Dict[str, Any]:
+    """本サーバーのMCPマニフェスト（mcp_manifest.json と同じ内容）"""
+    manifest = create_manifest(
+        name=SERVER_NAME,
+        version="1.0.0",
+        description="MDNウェブドキュメントをスクレイピングして提供するMCPサーバー",
+        parameters={
+            "url": {
+                "type": "string",
+                "description": "取得するMDN URLを指定してください",
+                "required": True
+            }
+        }
+    )
+    # クライアントSDK（mdn_client.py）は、この情報から一括取得や再検証を使うかを判断する
+    manifest["endpoints"] = {
+        "fetch": "/fetch-mdn",
+        "batch": "/fetch-mdn/batch",
+        "export": "/export",
+    }
+    manifest["features"] = ["etag", "batch-ndjson", "export", "locale-fallback"]
+    return manifest
+
+
+def create_mdn_context(doc_content: str, url: str) -> Dict[str, Any]:
+    """
+    MCPに渡すためのコンテキスト辞書を作成
+
+    Args:
+        doc_content: 抽出されたドキュメントのテキスト内容
+        url: 元のMDN URL
+
+    Returns:
+        MCP用のコンテキスト辞書
+    """
+    # MCPの標準フォーマットに合わせたコンテキスト構造
+    return {
+        "type": "mdn_document",
+        "url": url,
+        "content": doc_content,
+        "source": SOURCE_NAME,
+        "instruction": "以下はMDNから取得したドキュメントです。開発者の質問に答える際にこの情報を参照してください。"
+    }
+
+
+def build_fetch_response(doc: Document) -> Dict[str, Any]:
+    """
+    /fetch-mdn エンドポイントのレスポンスを作成
+
+    Args:
+        doc: 抽出済みドキュメント
+
+    Returns:
+        全フロントエンド共通のレスポンス辞書
+    """
+    response = {
+        "status": "success",
+        "url": doc.url,
+        "title": doc.title,
+        "content": doc.to_markdown(),
+        "source": SOURCE_NAME
+    }
+    if doc.is_stale:
+        # 上流の障害中に古いコピーを返したことを示す
+        response["stale"] = True
+        response["stale_seconds"] = doc.stale_seconds
+    if doc.is_fallback:
+        # 要求したロケールの版を返せず、フォールバック先のロケールの版を返したことを示す
+        response["requested_url"] = doc.requested_url
+        response["fallback_locale"] = url_locale(doc.url)
+        response["fallback_reason"] = doc.fallback_reason
+    return response
+
+
+def document_etag(doc: Document) -> str:
+    """
+    ドキュメントの ETag を生成する
+
+    レスポンスの本文（古いコピーや他のロケールの版であることの注記を含む）から求めるため、
+    内容が変わらない限り全フロントエンド・全プロセスで同じ値になります。
+    """
+    digest = hashlib.sha256(f"{doc.url}\n{doc.title}\n{doc.to_markdown()}".encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match ヘッダーが ETag に一致するかどうか（弱い比較）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return etag in (candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates)
+
+
+def build_batch_item(
+    url: str,
+    doc: Optional[Document] = None,
+    error: Optional[MDNError] = None,
+    known_etag: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    一括取得（/fetch-mdn/batch）のNDJSONの1行を作成
+
+    Args:
+        url: リクエストされたURL
+        doc: 抽出済みドキュメント（失敗した場合はNone）
+        error: 失敗した場合のエラー
+        known_etag: クライアントが保持している版の ETag（一致すれば本文を省略する）
+
+    Returns:
+        "status" が "success"・"not_modified"・"error" のいずれかの辞書
+    """
+    if doc is None:
+        return {"url": url, "status": "error", "error": str(error), "code": getattr(error, "status_code", 500)}
+    etag = document_etag(doc)
+    if known_etag == etag:
+        return {"url": url, "status": "not_modified", "etag": etag}
+    return dict(build_fetch_response(doc), url=url, etag=etag)
+
+
+def build_mcp_response(doc: Document) -> MCPResponse:
+    """
+    /mcp エンドポイントのMCPレスポンスを作成
+
+    Args:
+        doc: 抽出済みドキュメント
+
+    Returns:
+        MCPレスポンス
+    """
+    now = time.time()
+    context = MCPContext(
+        id=f"mdn-{int(now)}",
+        content={
+            "type": "mdn_document",
+            "url": doc.url,
+            "title": doc.title,
+            "content": doc.to_markdown(),
+            "source": SOURCE_NAME
+        },
+        metadata={
+            "source": SERVER_NAME,
+            "timestamp": now
+        }
+    )
+    if doc.is_stale:
+        context.metadata["stale"] = True
+        context.metadata["stale_seconds"] = doc.stale_seconds
+    if doc.is_fallback:
+        context.metadata["requested_url"] = doc.requested_url
+        context.metadata["fallback_locale"] = url_locale(doc.url)
+        context.metadata["fallback_reason"] = doc.fallback_reason
+    return MCPResponse(
+        contexts=[context],
+        metadata={
+            "request_id": f"req-{int(now)}",
+            "server": f"{SERVER_NAME}-mcp"
+        }
+    )
@@ -0,0 +1,172 @@
+"""
+バックグラウンド更新スケジューラー
+
+stale-while-revalidate で期限切れの値を返した後の裏での再取得と、
+よくアクセスされるエントリを期限切れ前に先回りして再取得する処理を担当します。
+同時に実行する再取得の数はプロセス全体で refresh_concurrency 件までに制限します。
+"""
+
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, Hashable, List, Optional, Set
+
+from . import config
+from .errors import MDNError
+
+if TYPE_CHECKING:
+    from .cache import TTLCache
+
+
+class RefreshScheduler:
+    """アクセス頻度に基づいてキャッシュを先回りして更新するスケジューラー"""
+    def __init__(
+        self,
+        cache: "TTLCache",
+        load: Callable[[Hashable], object],
+        concurrency: int = config.REFRESH_CONCURRENCY,
+        interval: float = config.REFRESH_INTERVAL,
+        ahead: float = config.REFRESH_AHEAD,
+        min_hits: float = config.REFRESH_MIN_HITS
+    ):
+        """
+        Args:
+            cache: 更新対象のキャッシュ
+            load: キーを受け取り、上流から取得してキャッシュに保存する関数
+            concurrency: 同時に実行する再取得の上限
+            interval: 先回り更新を確認する間隔（秒）
+            ahead: 有効期限の何秒前から先回り更新の対象にするか
+            min_hits: 先回り更新の対象にする最小アクセス頻度
+        """
+        self.cache = cache
+        self.load = load
+        self.concurrency = concurrency
+        self.interval = interval
+        self.ahead = ahead
+        self.min_hits = min_hits
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="mdn-refresh")
+        self._budget = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._frequency: Dict[Hashable, float] = {}
+        self._inflight: Set[Hashable] = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.refreshed = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def record_access(self, key: Hashable) -> None:
+        """アクセスを記録する（先回り更新の優先度に使用）"""
+        with self._lock:
+            self._frequency[key] = self._frequency.get(key, 0.0) + 1.0
+
+    def schedule(self, key: Hashable) -> bool:
+        """
+        キーの再取得をバックグラウンドで開始する
+
+        同じキーの再取得が実行中、または同時実行数の上限に達している場合は
+        何もしません（期限切れの値を引き続き返し、次の機会に再試行します）。
+
+        Returns:
+            再取得を開始した場合はTrue
+        """
+        with self._lock:
+            if key in self._inflight:
+                return False
+            if not self._budget.acquire(blocking=False):
+                self.skipped += 1
+                return False
+            self._inflight.add(key)
+        try:
+            self._executor.submit(self._refresh, key)
+        except RuntimeError:
+            # シャットダウン済み
+            self._release(key)
+            return False
+        return True
+
+    def _refresh(self, key: Hashable) -> None:
+        try:
+            self.load(key)
+            self.refreshed += 1
+        except MDNError as e:
+            self.failed += 1
+            print(f"Background refresh failed for {key}: {e}", file=sys.stderr)
+        finally:
+            self._release(key)
+
+    def _release(self, key: Hashable) -> None:
+        with self._lock:
+            self._inflight.discard(key)
+        self._budget.release()
+
+    def hot_keys(self) -> List[Hashable]:
+        """期限切れが近い（または過ぎた）エントリを、アクセス頻度の高い順に返す"""
+        candidates = self.cache.expiring_within(self.ahead)
+        with self._lock:
+            ranked = [
+                (self._frequency.get(key, 0.0), key)
+                for key in candidates
+                if self._frequency.get(key, 0.0) >= self.min_hits
+            ]
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        return [key for _, key in ranked]
+
+    def run_once(self) -> int:
+        """
+        先回り更新を1回実行する
+
+        Returns:
+            再取得を開始した件数
+        """
+        started = 0
+        for key in self.hot_keys():
+            if not self.schedule(key):
+                if key not in self._inflight:
+                    # 同時実行数の上限に達したため、残りは次回に回す
+                    break
+                continue
+            started += 1
+        self._decay()
+        return started
+
+    def _decay(self) -> None:
+        """古いアクセスの影響を減らすため、頻度を半減させる"""
+        with self._lock:
+            for key in list(self._frequency):
+                value = self._frequency[key] / 2
+                if value < 0.1:
+                    del self._frequency[key]
+                else:
+                    self._frequency[key] = value
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Refresh scheduler error: {e}", file=sys.stderr)
+
+    def start(self) -> None:
+        """先回り更新のループを開始する"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mdn-refresh-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = False) -> None:
+        """先回り更新のループを停止する"""
+        self._stop.set()
+        if self._thread is not None and wait:
+            self._thread.join()
+        self._thread = None
+
+    def stats(self) -> Dict[str, int]:
+        """更新処理の統計情報"""
+        return {
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "inflight": len(self._inflight),
+        }
@@ -0,0 +1,392 @@
+"""
+APIシンボルからMDNのURLを解決する索引
+
+`Array.prototype.flatMap`、`fetch()`、`<dialog>` のようなシンボルを
+MDNの正規のパスに変換します。エージェントがURLを推測して取得に失敗する
+往復をなくすためのものです。
+
+索引はソート済みの固定長オフセット表と可変長レコードからなるバイナリファイルで、
+起動時に mmap で開くだけなので読み込みコストはほぼゼロです。検索は
+オフセット表の二分探索で行い、前方一致による補完にも対応します。
+
+ファイル形式（リトルエンディアン）:
+  ヘッダー   : b"MDNIDX2\\0" + レコード数 (u32)
+  オフセット表: レコード数 × u32（データ領域先頭からのオフセット、キー順）
+  データ領域 : レコードごとに キー長 (u16) + キー + 表示名長 (u16) + 表示名
+               + パス長 (u16) + パス + 重み (u16)
+
+索引の作成:
+  python -m mdn_core index build sitemap.xml.gz -o mdn_index.bin
+"""
+
+import gzip
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import unquote, urlparse
+
+from . import config
+
+MAGIC = b"MDNIDX2\0"
+_HEADER = struct.Struct("<8sI")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+
+# シンボルの所属を表すパスの区切り（この直下のページは "親.子" として登録する）
+_MEMBER_SECTIONS = ("/Global_Objects/", "/Web/API/")
+_LOCALE_DOCS = re.compile(r"^/[^/]+/docs/")
+# タイトルから学習するシンボルの最大数
+_MAX_LEARNED = 10000
+
+
+def normalize_symbol(symbol: str) -> str:
+    """
+    シンボルを索引のキー形式に正規化する
+
+    大文字小文字・前後の空白・末尾の "()"・HTML要素の "<>" を無視します。
+    """
+    key = symbol.strip().lower()
+    if key.startswith("<") and key.endswith(">"):
+        key = key[1:-1].strip("/ ")
+    if key.endswith("()"):
+        key = key[:-2]
+    return key.replace(" ", "")
+
+
+def symbols_for_path(path: str) -> List[Tuple[str, int]]:
+    """
+    MDNのパスから索引に登録するシンボルと重みを生成する
+
+    Args:
+        path: "/en-US/docs/Web/JavaScript/Reference/Global_Objects/Array/flatMap" のようなパス
+
+    Returns:
+        (シンボル, 重み) のリスト。重みは小さいほど優先される
+    """
+    match = _LOCALE_DOCS.match(path)
+    if not match:
+        return []
+    rest = path[match.end():]
+    segments = [segment for segment in rest.split("/") if segment]
+    if not segments:
+        return []
+
+    # 浅いパスほど、またリファレンスほど優先する
+    weight = len(segments) * 10
+    if "/Reference/" in path or "/Web/API/" in path or "/Element/" in path:
+        weight -= 5
+
+    name = segments[-1]
+    symbols = [(name, weight)]
+    for section in _MEMBER_SECTIONS:
+        if section in path and len(segments) >= 2:
+            parent_index = path.index(section) + len(section)
+            members = path[parent_index:].split("/")
+            if len(members) == 2:
+                parent, member = members
+                symbols.append((f"{parent}.{member}", weight - 3))
+                symbols.append((f"{parent}.prototype.{member}", weight - 3))
+            break
+    return symbols
+
+
+def paths_from_sitemap(source: str) -> Iterable[str]:
+    """
+    サイトマップ（.xml または .xml.gz）からドキュメントのパスを列挙する
+    """
+    import xml.etree.ElementTree as ET
+
+    opener = gzip.open if source.endswith(".gz") else open
+    with opener(source, "rb") as f:
+        for _, element in ET.iterparse(f):
+            if element.tag.endswith("loc") and element.text:
+                yield unquote(urlparse(element.text.strip()).path)
+            element.clear()
+
+
+def build_index(paths: Iterable[str], output: str) -> int:
+    """
+    パスの一覧から索引ファイルを作成する
+
+    Args:
+        paths: MDNドキュメントのパス
+        output: 出力先ファイル
+
+    Returns:
+        登録したレコード数
+    """
+    records = set()
+    for path in paths:
+        for symbol, weight in symbols_for_path(path):
+            key = normalize_symbol(symbol)
+            if key:
+                records.add((key, max(0, weight), path, symbol))
+    ordered = sorted(records)
+
+    data = bytearray()
+    offsets = []
+    for key, weight, path, symbol in ordered:
+        offsets.append(len(data))
+        for field in (key, symbol, path):
+            encoded = field.encode("utf-8")
+            data += _U16.pack(len(encoded)) + encoded
+        data += _U16.pack(weight)
+
+    tmp = output + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(ordered)))
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(data)
+    os.replace(tmp, output)
+    return len(ordered)
+
+
+class _MappedKeys:
+    """mmap した索引のキー列を bisect から参照するためのシーケンス"""
+    def __init__(self, index: "SymbolIndex"):
+        self._index = index
+
+    def __len__(self) -> int:
+        return self._index.count
+
+    def __getitem__(self, i: int) -> bytes:
+        return self._index._key_at(i)
+
+
+class SymbolIndex:
+    """mmap した索引ファイルの読み取り"""
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"Not an MDN symbol index: {path}")
+        self._offsets = _HEADER.size
+        self._data = self._offsets + self.count * _U32.size
+
+    def _record_offset(self, i: int) -> int:
+        return self._data + _U32.unpack_from(self._mm, self._offsets + i * _U32.size)[0]
+
+    def _key_at(self, i: int) -> bytes:
+        offset = self._record_offset(i)
+        length = _U16.unpack_from(self._mm, offset)[0]
+        return self._mm[offset + 2:offset + 2 + length]
+
+    def _record(self, i: int) -> Tuple[str, str, str, int]:
+        offset = self._record_offset(i)
+        fields = []
+        for _ in range(3):
+            length = _U16.unpack_from(self._mm, offset)[0]
+            fields.append(self._mm[offset + 2:offset + 2 + length].decode("utf-8"))
+            offset += 2 + length
+        weight = _U16.unpack_from(self._mm, offset)[0]
+        return fields[0], fields[1], fields[2], weight
+
+    def prefix(self, key: str, limit: int) -> List[Tuple[str, str, str, int]]:
+        """
+        キーが前方一致するレコードを返す
+
+        Args:
+            key: 正規化済みのキー
+            limit: 走査する最大件数
+
+        Returns:
+            (キー, 表示名, パス, 重み) のリスト（キー順）
+        """
+        needle = key.encode("utf-8")
+        start = bisect_left(_MappedKeys(self), needle)
+        results = []
+        for i in range(start, min(self.count, start + limit)):
+            if not self._key_at(i).startswith(needle):
+                break
+            results.append(self._record(i))
+        return results
+
+    def exact(self, key: str) -> Optional[Tuple[str, str, str, int]]:
+        """
+        キーが完全一致するレコードのうち、重みが最小のものを返す
+
+        レコードは (キー, 重み, パス) の順に並んでいるため、最初の一致が最良です。
+        """
+        needle = key.encode("utf-8")
+        start = bisect_left(_MappedKeys(self), needle)
+        if start < self.count and self._key_at(start) == needle:
+            return self._record(start)
+        return None
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+class Resolver:
+    """シンボルからMDNのURLを解決する"""
+    def __init__(self, index: Optional[SymbolIndex] = None):
+        self.index = index
+        # 取得したページのタイトルから学習したシンボル（索引に無いものを補う）
+        self._learned: Dict[str, Tuple[str, str, str, int]] = {}
+        # 索引の作成後にサイトマップに追加されたパスのシンボル（キーごとに重みが最小のもの）
+        self._added: Dict[str, Tuple[str, str, str, int]] = {}
+        # 索引の作成後にサイトマップから削除されたパス（索引のレコードを返さないようにする）
+        self._removed: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def add_path(self, path: str) -> int:
+        """
+        索引を作り直さずに、新しいパスのシンボルを登録する
+
+        Args:
+            path: "/en-US/docs/..." のようなパス
+
+        Returns:
+            登録したシンボルの数
+        """
+        added = 0
+        with self._lock:
+            self._removed.discard(path)
+            for symbol, weight in symbols_for_path(path):
+                key = normalize_symbol(symbol)
+                record = (key, symbol, path, max(0, weight))
+                current = self._added.get(key)
+                if key and (current is None or record[3] < current[3]):
+                    self._added[key] = record
+                    added += 1
+        return added
+
+    def remove_path(self, path: str) -> None:
+        """
+        サイトマップから削除されたパスを、索引を作り直さずに候補から外す
+
+        Args:
+            path: "/en-US/docs/..." のようなパス
+        """
+        with self._lock:
+            self._removed.add(path)
+            for records in (self._learned, self._added):
+                for key in [key for key, record in records.items() if record[2] == path]:
+                    del records[key]
+
+    def learn(self, title: str, url: str) -> None:
+        """取得したドキュメントのタイトルをシンボルとして登録する"""
+        key = normalize_symbol(title)
+        if key and url.startswith(config.MDN_BASE_URL):
+            path = "/" + url[len(config.MDN_BASE_URL):]
+            with self._lock:
+                self._removed.discard(path)
+                self._learned[key] = (key, title, path, 0)
+                if len(self._learned) > _MAX_LEARNED:
+                    self._learned.pop(next(iter(self._learned)))
+
+    def complete(self, query: str, limit: int = 10) -> List[Dict[str, str]]:
+        """
+        シンボルの前方一致で候補を返す（補完用）
+
+        完全一致を最優先し、次に重みの小さい順に並べます。
+
+        Args:
+            query: シンボルまたはその先頭部分
+            limit: 返す最大件数
+
+        Returns:
+            {"symbol": ..., "url": ...} のリスト
+        """
+        key = normalize_symbol(query)
+        if not key:
+            return []
+
+        candidates: List[Tuple[str, str, str, int]] = []
+        if self.index is not None:
+            # 同じキーに複数のパスがあるため、多めに走査してから並べ替える
+            candidates.extend(self.index.prefix(key, limit * 8))
+        with self._lock:
+            candidates.extend(
+                record for learned_key, record in self._learned.items() if learned_key.startswith(key)
+            )
+            candidates.extend(
+                record for added_key, record in self._added.items() if added_key.startswith(key)
+            )
+            removed = set(self._removed)
+
+        candidates.sort(key=lambda record: (record[0] != key, record[3], len(record[0]), record[2]))
+        results = []
+        seen = set()
+        for _, symbol, path, _ in candidates:
+            if path in seen or path in removed:
+                continue
+            seen.add(path)
+            results.append({"symbol": symbol, "url": config.MDN_BASE_URL + path.lstrip("/")})
+            if len(results) >= limit:
+                break
+        return results
+
+    def resolve(self, symbol: str) -> Optional[str]:
+        """
+        シンボルを最も確からしいMDNのURLに解決する
+
+        Returns:
+            URL、見つからない場合はNone
+        """
+        key = normalize_symbol(symbol)
+        if not key:
+            return None
+        with self._lock:
+            record = self._learned.get(key)
+            added = self._added.get(key)
+            removed = set(self._removed)
+        if record is None and self.index is not None:
+            record = self.index.exact(key)
+            if record is not None and record[2] in removed:
+                record = None
+        if added is not None and (record is None or added[3] < record[3]):
+            record = added
+        if record is None:
+            return None
+        return config.MDN_BASE_URL + record[2].lstrip("/")
+
+
+def resource_url(path: str, resolver: Optional[Resolver] = None) -> str:
+    """
+    mdn:// リソースのパスをURLに変換する
+
+    "en-US/docs/..." のようなパスはそのまま、"Array.prototype.flatMap" のような
+    シンボルは索引で解決します。
+
+    Args:
+        path: mdn:// 以降の文字列
+        resolver: 使用するリゾルバー（省略時はプロセス共通のもの）
+
+    Returns:
+        MDNのURL
+    """
+    if "/docs/" in path:
+        return config.MDN_BASE_URL + path.lstrip("/")
+    resolved = (resolver or get_resolver()).resolve(unquote(path))
+    return resolved or config.MDN_BASE_URL + path.lstrip("/")
+
+
+_default_resolver: Optional[Resolver] = None
+_default_lock = threading.Lock()
+
+
+def get_resolver() -> Resolver:
+    """
+    プロセス共通のリゾルバーを取得する（初回呼び出し時に索引を mmap する）
+    """
+    global _default_resolver
+    if _default_resolver is None:
+        with _default_lock:
+            if _default_resolver is None:
+                index = None
+                if os.path.exists(config.INDEX_PATH):
+                    try:
+                        index = SymbolIndex(config.INDEX_PATH)
+                    except (OSError, ValueError) as e:
+                        print(f"Failed to load symbol index {config.INDEX_PATH}: {e}", file=sys.stderr)
+                _default_resolver = Resolver(index)
+    return _default_resolver
@@ -0,0 +1,240 @@
+"""
+期限（デッドライン）と優先度クラスにもとづく作業のスケジューリング
+
+対話的なツール呼び出しと、裏での再取得・先読み・一括処理は同じ上流への接続と
+解析処理を奪い合います。上流への取得と解析は work_slots 件までに制限し、
+空きを待つリクエストは優先度クラスごとの重み付きで順番に割り当てます
+（対話的なリクエストは、待機中の裏の作業より先に実行されます）。
+
+全てのリクエストは期限（time.monotonic() 基準の絶対時刻）を持ち、
+待機中・取得・解析・シリアライズの各段階で期限切れを確認して、
+既に期限を過ぎた作業は実行せずに破棄します。
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Mapping, Optional, Tuple
+
+from . import config
+from .errors import DeadlineExceededError
+from .fetch import LatencyTracker
+from .tracing import stage
+
+# 優先度クラス
+INTERACTIVE = "interactive"  # ツール呼び出し・APIリクエスト
+BACKGROUND = "background"    # stale-while-revalidate と先回り更新
+BULK = "bulk"                # 先読み・一括取得などの大量処理
+
+PRIORITIES = (INTERACTIVE, BACKGROUND, BULK)
+
+DEFAULT_WEIGHTS = {
+    INTERACTIVE: config.PRIORITY_WEIGHT_INTERACTIVE,
+    BACKGROUND: config.PRIORITY_WEIGHT_BACKGROUND,
+    BULK: config.PRIORITY_WEIGHT_BULK,
+}
+
+
+def deadline_in(seconds: Optional[float]) -> Optional[float]:
+    """現在から seconds 秒後の期限を返す（Noneの場合は期限なし）"""
+    if seconds is None:
+        return None
+    return time.monotonic() + seconds
+
+
+def default_deadline(priority: str = INTERACTIVE) -> float:
+    """優先度クラスの既定の期限"""
+    if priority == INTERACTIVE:
+        return deadline_in(config.REQUEST_DEADLINE)
+    return deadline_in(config.BACKGROUND_DEADLINE)
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    """期限までの残り秒数（期限なしの場合はNone）"""
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline(deadline: Optional[float], stage: str) -> None:
+    """
+    期限を過ぎていれば例外を送出する
+
+    Args:
+        deadline: 期限（Noneの場合は確認しない）
+        stage: 確認した段階（エラーメッセージに使用）
+
+    Raises:
+        DeadlineExceededError: 期限を過ぎている場合
+    """
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceededError(f"Deadline exceeded before {stage}")
+
+
+def request_options(headers: Mapping[str, str]) -> Tuple[str, float]:
+    """
+    HTTPリクエストのヘッダーから優先度クラスと期限を求める
+
+    X-Priority（interactive / background / bulk）と X-Deadline-Ms（現在からのミリ秒）に
+    対応し、指定が無い場合は対話的なリクエストの既定値を使います。
+
+    Returns:
+        (優先度クラス, 期限) のタプル
+    """
+    priority = (headers.get("X-Priority") or INTERACTIVE).strip().lower()
+    if priority not in PRIORITIES:
+        priority = INTERACTIVE
+    deadline = default_deadline(priority)
+    try:
+        deadline_ms = float(headers.get("X-Deadline-Ms") or 0)
+    except ValueError:
+        deadline_ms = 0
+    if deadline_ms > 0:
+        deadline = min(deadline, deadline_in(deadline_ms / 1000))
+    return priority, deadline
+
+
+class Ticket:
+    """作業枠の割り当てを待つリクエスト"""
+    def __init__(self, priority: str, deadline: Optional[float]):
+        self.priority = priority
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.event = threading.Event()
+
+
+class PriorityScheduler:
+    """優先度クラスごとの重み付きで作業枠を割り当てるスケジューラー"""
+    def __init__(
+        self,
+        slots: int = config.WORK_SLOTS,
+        weights: Optional[Dict[str, int]] = None
+    ):
+        """
+        Args:
+            slots: 同時に実行する作業（上流への取得と解析）の上限
+            weights: 優先度クラスごとの重み（待機中のクラスの間で、重みの比で枠を割り当てる）
+        """
+        self.slots = slots
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self._lock = threading.Lock()
+        self._running = 0
+        self._queues: Dict[str, Deque[Ticket]] = {priority: deque() for priority in PRIORITIES}
+        # ストライドスケジューリングの仮想時刻（小さいクラスから割り当てる）
+        self._pass: Dict[str, float] = {priority: 0.0 for priority in PRIORITIES}
+        self._wait: Dict[str, LatencyTracker] = {
+            priority: LatencyTracker(min_samples=1) for priority in PRIORITIES
+        }
+        self._granted: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+        self._dropped: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+
+    @contextmanager
+    def slot(self, ticket: Ticket) -> Iterator[Ticket]:
+        """
+        作業枠を確保して実行する
+
+        Args:
+            ticket: 優先度と期限を持つチケット（待機中に boost で優先度を引き上げられる）
+
+        Raises:
+            DeadlineExceededError: 枠を確保する前に期限を過ぎた場合
+        """
+        with stage("queue"):
+            self.acquire(ticket)
+        try:
+            yield ticket
+        finally:
+            self.release()
+
+    def acquire(self, ticket: Ticket) -> None:
+        """作業枠が空くまで待つ"""
+        check_deadline(ticket.deadline, "queueing")
+        with self._lock:
+            if self._running < self.slots and not any(self._queues.values()):
+                self._grant(ticket)
+                return
+            queue = self._queues[ticket.priority]
+            if not queue:
+                # 待機していなかったクラスが、空いていた間の分をまとめて割り当てられないようにする
+                self._pass[ticket.priority] = max(self._pass[ticket.priority], self._min_active_pass())
+            queue.append(ticket)
+
+        ticket.event.wait(remaining(ticket.deadline))
+        with self._lock:
+            if ticket.granted:
+                return
+            queue = self._queues[ticket.priority]
+            if ticket in queue:
+                queue.remove(ticket)
+                self._dropped[ticket.priority] += 1
+        raise DeadlineExceededError(f"Deadline exceeded while queued ({ticket.priority})")
+
+    def release(self) -> None:
+        """作業枠を返却し、待機中のリクエストに割り当てる"""
+        with self._lock:
+            self._running -= 1
+            self._dispatch()
+
+    def boost(self, ticket: Ticket, priority: str) -> None:
+        """
+        待機中のチケットの優先度を引き上げる
+
+        対話的なリクエストが、裏の作業が実行中（または待機中）の同じキーの結果を
+        待つ場合の優先度の逆転を防ぎます。
+        """
+        with self._lock:
+            if ticket.granted or PRIORITIES.index(priority) >= PRIORITIES.index(ticket.priority):
+                return
+            queue = self._queues[ticket.priority]
+            if ticket in queue:
+                queue.remove(ticket)
+                ticket.priority = priority
+                self._queues[priority].appendleft(ticket)
+                self._dispatch()
+
+    def _min_active_pass(self) -> float:
+        active = [self._pass[priority] for priority, queue in self._queues.items() if queue]
+        return min(active) if active else max(self._pass.values())
+
+    def _dispatch(self) -> None:
+        while self._running < self.slots:
+            now = time.monotonic()
+            candidates = [priority for priority, queue in self._queues.items() if queue]
+            if not candidates:
+                return
+            priority = min(candidates, key=lambda p: (self._pass[p], PRIORITIES.index(p)))
+            ticket = self._queues[priority].popleft()
+            if ticket.deadline is not None and now >= ticket.deadline:
+                # 期限切れの作業は枠を消費せずに破棄する（待機側が例外を送出する）
+                self._dropped[priority] += 1
+                ticket.event.set()
+                continue
+            self._pass[priority] += 1.0 / max(1, self.weights.get(priority, 1))
+            self._grant(ticket)
+            ticket.event.set()
+
+    def _grant(self, ticket: Ticket) -> None:
+        ticket.granted = True
+        self._running += 1
+        self._granted[ticket.priority] += 1
+        self._wait[ticket.priority].record(time.monotonic() - ticket.enqueued_at)
+
+    def stats(self) -> Dict[str, Any]:
+        """優先度クラスごとの待ち時間と件数"""
+        classes = {}
+        with self._lock:
+            running = self._running
+            queued = {priority: len(queue) for priority, queue in self._queues.items()}
+        for priority in PRIORITIES:
+            p50 = self._wait[priority].percentile(50)
+            p95 = self._wait[priority].percentile(95)
+            classes[priority] = {
+                "granted": self._granted[priority],
+                "dropped": self._dropped[priority],
+                "queued": queued[priority],
+                "wait_p50_ms": p50 * 1000 if p50 is not None else None,
+                "wait_p95_ms": p95 * 1000 if p95 is not None else None,
+            }
+        return {"running": running, "slots": self.slots, "classes": classes}
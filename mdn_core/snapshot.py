@@ -0,0 +1,713 @@
+"""
+抽出済みドキュメントの圧縮スナップショットストア
+
+キャッシュやミラーしたドキュメントをディスクに保存し、プロセスの再起動後や
+上流の障害中にも返せるようにします。
+
+- 内容のハッシュ（SHA-256）で重複を排除し、同じ内容は1回だけ保存します
+- MDNのページは定型部分が多いため、保存済みのドキュメントから学習した辞書で圧縮します
+  （zstandard があれば zstd の学習済み辞書、無ければ標準ライブラリ zlib のプリセット辞書）
+- 同じURLの新しい版は、直前の版との行単位の差分として保存します
+  （差分の連鎖は max_delta_chain 段までで、それを超えたら全体を保存し直します）
+- 読み込みはオフセット索引からブロブの位置を引き、os.pread で1回読むだけです
+
+ディレクトリ構成:
+  blobs.dat     : ブロブ（圧縮済みの内容または差分）を追記するデータファイル
+  blobs.idx     : ブロブの索引（固定長レコード、データファイル内の各ブロブのヘッダーと同じ形式）
+  revisions.log : URLごとの版の履歴（1行1件のJSON、削除したURLは "removed" の行）
+  <codec>-<id>.dict : 圧縮辞書
+
+ブロブのヘッダー（リトルエンディアン）:
+  オフセット (u64) + ハッシュ (32バイト) + 差分の基準のハッシュ (32バイト)
+  + コーデック (u8) + 種類 (u8) + 辞書ID (u16) + 差分の段数 (u8)
+  + 圧縮後の長さ (u32) + 元の長さ (u32)
+"""
+
+import hashlib
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from difflib import SequenceMatcher
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import config
+from .extract import Document
+
+_BLOB = struct.Struct("<Q32s32sBBHBII")
+_NO_BASE = b"\0" * 32
+
+# ブロブの種類
+FULL = 0
+DELTA = 1
+
+# 差分の命令（基準の行範囲のコピーと、新しいバイト列の挿入）
+_COPY = struct.Struct("<cII")
+_INSERT = struct.Struct("<cI")
+
+# 読み込み時に展開済みの内容を保持する件数（差分の基準の再展開を避ける）
+_DECODED_CACHE_SIZE = 64
+
+
+class _ZlibCodec:
+    """標準ライブラリ zlib（プリセット辞書付きの raw deflate）"""
+    id = 1
+    name = "zlib"
+    # deflate が参照できる辞書は末尾の32KiBまで
+    max_dictionary = 32 * 1024
+    # 壊れたデータを展開したときの例外
+    errors = (zlib.error,)
+
+    def __init__(self, level: int):
+        self.level = level
+
+    def compress(self, data: bytes, dictionary: Optional[bytes]) -> bytes:
+        if dictionary:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15, zdict=dictionary)
+        else:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data: bytes, dictionary: Optional[bytes]) -> bytes:
+        if dictionary:
+            decompressor = zlib.decompressobj(-15, zdict=dictionary)
+        else:
+            decompressor = zlib.decompressobj(-15)
+        return decompressor.decompress(data) + decompressor.flush()
+
+    def train(self, samples: List[bytes], size: int) -> bytes:
+        return train_line_dictionary(samples, min(size, self.max_dictionary))
+
+    def load_dictionary(self, data: bytes) -> bytes:
+        return data
+
+
+class _ZstdCodec:
+    """zstandard パッケージ（学習済み辞書）"""
+    id = 2
+    name = "zstd"
+
+    def __init__(self, level: int):
+        import zstandard
+
+        self._zstd = zstandard
+        self.level = level
+        self.errors = (zstandard.ZstdError,)
+
+    def compress(self, data: bytes, dictionary: Any) -> bytes:
+        return self._zstd.ZstdCompressor(level=self.level, dict_data=dictionary).compress(data)
+
+    def decompress(self, data: bytes, dictionary: Any) -> bytes:
+        return self._zstd.ZstdDecompressor(dict_data=dictionary).decompress(data)
+
+    def train(self, samples: List[bytes], size: int) -> bytes:
+        return self._zstd.train_dictionary(size, samples).as_bytes()
+
+    def load_dictionary(self, data: bytes) -> Any:
+        return self._zstd.ZstdCompressionDict(data)
+
+
+def _zstd_available() -> bool:
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _make_codec(name: str, level: int):
+    """
+    コーデックを作成する
+
+    Args:
+        name: "zstd"・"zlib"・"auto"（zstandard があれば zstd、無ければ zlib）
+        level: 圧縮レベル（zlib は 1〜9、zstd は 1〜22）
+    """
+    if name == "auto":
+        name = "zstd" if _zstd_available() else "zlib"
+    if name == "zstd":
+        return _ZstdCodec(level)
+    if name == "zlib":
+        return _ZlibCodec(min(level, 9))
+    raise ValueError(f"Unknown snapshot codec: {name}")
+
+
+# ブロブに記録したコーデックIDとコーデックの名前の対応
+_CODEC_NAMES = {_ZlibCodec.id: _ZlibCodec.name, _ZstdCodec.id: _ZstdCodec.name}
+
+
+def train_line_dictionary(samples: Iterable[bytes], size: int) -> bytes:
+    """
+    zlib のプリセット辞書を標準ライブラリだけで作成する
+
+    複数のドキュメントに共通して現れる行（ナビゲーションや定型文）を、
+    出現するドキュメント数 × 長さの大きい順に size バイトまで集めます。
+    deflate は近い位置ほど短い符号で参照できるため、価値の高い行を辞書の末尾に置きます。
+    """
+    counts: Counter = Counter()
+    total = 0
+    for sample in samples:
+        total += 1
+        counts.update(set(line for line in sample.splitlines(keepends=True) if len(line) > 8))
+    if total < 2:
+        return b""
+    ranked = sorted(
+        (line for line, count in counts.items() if count >= 2),
+        key=lambda line: counts[line] * len(line),
+        reverse=True
+    )
+    chosen = []
+    used = 0
+    for line in ranked:
+        if used + len(line) > size:
+            continue
+        chosen.append(line)
+        used += len(line)
+    chosen.reverse()
+    return b"".join(chosen)
+
+
+def encode_document(doc: Document) -> bytes:
+    """
+    ドキュメントを保存用のバイト列に変換する
+
+    行単位の差分が効くよう、リンクは1行ずつ、本文はそのまま並べます。
+    URLは含めないため、リダイレクトなどで別のURLから取得した同じ内容は1つのブロブを共有します。
+    """
+    header = json.dumps(
+        {"title": doc.title, "description": doc.description, "links": len(doc.links)},
+        ensure_ascii=False
+    )
+    lines = [header] + doc.links
+    return ("\n".join(lines) + "\n" + doc.text).encode("utf-8")
+
+
+def decode_document(payload: bytes, url: str) -> Document:
+    """encode_document の逆変換"""
+    text = payload.decode("utf-8")
+    header_line, _, rest = text.partition("\n")
+    header = json.loads(header_line)
+    links = []
+    for _ in range(header["links"]):
+        link, _, rest = rest.partition("\n")
+        links.append(link)
+    return Document(
+        url=url,
+        title=header["title"],
+        description=header["description"],
+        text=rest,
+        links=links,
+    )
+
+
+def make_delta(base: bytes, target: bytes) -> bytes:
+    """基準から対象を復元する行単位の差分を作成する"""
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    matcher = SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    out = bytearray()
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            out += _COPY.pack(b"C", i1, i2)
+        elif tag in ("replace", "insert"):
+            data = b"".join(target_lines[j1:j2])
+            out += _INSERT.pack(b"I", len(data)) + data
+    return bytes(out)
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """make_delta で作成した差分を基準に適用する"""
+    base_lines = base.splitlines(keepends=True)
+    out = []
+    pos = 0
+    while pos < len(delta):
+        op = delta[pos:pos + 1]
+        if op == b"C":
+            _, i1, i2 = _COPY.unpack_from(delta, pos)
+            out.extend(base_lines[i1:i2])
+            pos += _COPY.size
+        elif op == b"I":
+            _, length = _INSERT.unpack_from(delta, pos)
+            pos += _INSERT.size
+            out.append(delta[pos:pos + length])
+            pos += length
+        else:
+            raise ValueError(f"Corrupt snapshot delta at byte {pos}")
+    return b"".join(out)
+
+
+class _BlobRef:
+    """ブロブの索引エントリ"""
+    __slots__ = ("offset", "digest", "base", "codec", "kind", "dict_id", "depth", "stored_len", "raw_len")
+
+    def __init__(self, offset, digest, base, codec, kind, dict_id, depth, stored_len, raw_len):
+        self.offset = offset
+        self.digest = digest
+        self.base = base
+        self.codec = codec
+        self.kind = kind
+        self.dict_id = dict_id
+        self.depth = depth
+        self.stored_len = stored_len
+        self.raw_len = raw_len
+
+    def pack(self) -> bytes:
+        return _BLOB.pack(
+            self.offset, self.digest, self.base, self.codec, self.kind,
+            self.dict_id, self.depth, self.stored_len, self.raw_len
+        )
+
+    @property
+    def end(self) -> int:
+        return self.offset + _BLOB.size + self.stored_len
+
+
+class Revision:
+    """URLの1つの版"""
+    def __init__(self, url: str, digest: str, stored_at: float, meta: Optional[Dict[str, Any]] = None):
+        self.url = url
+        # 内容のハッシュ（16進数）
+        self.digest = digest
+        # 保存した（または上流で変わっていないことを確認した）時刻（time.time() 基準）
+        self.stored_at = stored_at
+        # 取得時の付加情報（ETag・Last-Modified など）
+        self.meta = meta or {}
+
+    @property
+    def age(self) -> float:
+        """保存されてからの経過秒数"""
+        return max(0.0, time.time() - self.stored_at)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """版を辞書形式に変換"""
+        return {"url": self.url, "hash": self.digest, "time": self.stored_at, "meta": self.meta}
+
+
+class SnapshotStore:
+    """内容のハッシュで重複を排除し、版ごとの差分を保存する圧縮ストア"""
+    def __init__(
+        self,
+        directory: str,
+        codec: str = config.SNAPSHOT_CODEC,
+        level: int = config.SNAPSHOT_LEVEL,
+        dictionary_size: int = config.SNAPSHOT_DICT_SIZE,
+        train_samples: int = config.SNAPSHOT_TRAIN_SAMPLES,
+        max_delta_chain: int = config.SNAPSHOT_MAX_DELTA_CHAIN
+    ):
+        """
+        Args:
+            directory: 保存先のディレクトリ（無ければ作成する）
+            codec: "auto"・"zstd"・"zlib"
+            level: 圧縮レベル
+            dictionary_size: 学習する辞書の大きさ（バイト、zlib では32KiBまで）
+            train_samples: 辞書を自動で学習するまでに保存するドキュメント数（0の場合は自動で学習しない）
+            max_delta_chain: 差分を連ねる最大の段数（0の場合は差分を使わない）
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        # 書き込みに使うコーデック
+        self.codec = _make_codec(codec, level)
+        self.level = level
+        # 読み込みに使うコーデック（ブロブごとに、書き込んだときのコーデックで展開する）
+        self._codecs: Dict[int, Any] = {self.codec.id: self.codec}
+        self.dictionary_size = dictionary_size
+        self.train_samples = train_samples
+        self.max_delta_chain = max_delta_chain
+        self._lock = threading.Lock()
+        self._blobs: Dict[bytes, _BlobRef] = {}
+        self._revisions: Dict[str, List[Revision]] = {}
+        self._dictionaries: Dict[Tuple[int, int], Any] = {}
+        self._dict_id = 0
+        self._decoded: "OrderedDict[bytes, bytes]" = OrderedDict()
+        self._decoded_lock = threading.Lock()
+        # 辞書の自動学習を試みたかどうか
+        self._trained = False
+        self.dedup_hits = 0
+
+        self._load_dictionaries()
+        self._data = open(os.path.join(directory, "blobs.dat"), "a+b")
+        self._index = open(os.path.join(directory, "blobs.idx"), "a+b")
+        self._revision_log = open(os.path.join(directory, "revisions.log"), "a+", encoding="utf-8")
+        self._load_index()
+        self._load_revisions()
+
+    # ---- 読み込み -----------------------------------------------------------
+
+    def _load_dictionaries(self) -> None:
+        prefix = f"{self.codec.name}-"
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name.endswith(".dict"):
+                try:
+                    dict_id = int(name[len(prefix):-len(".dict")])
+                except ValueError:
+                    continue
+                self._dict_id = max(self._dict_id, dict_id)
+
+    def _codec(self, codec_id: int) -> Any:
+        """
+        ブロブに記録したコーデックIDのコーデック
+
+        MDN_SNAPSHOT_CODEC を変えたり zstandard を入れたりした後も、それまでに保存したブロブを読めるよう、
+        書き込みに使うコーデックとは別に作成します。
+        """
+        codec = self._codecs.get(codec_id)
+        if codec is None:
+            name = _CODEC_NAMES.get(codec_id)
+            if name is None:
+                raise ValueError(f"Snapshot blob uses unknown codec {codec_id}")
+            try:
+                codec = _make_codec(name, self.level)
+            except ImportError as e:
+                raise ValueError(f"Snapshot blob uses codec {name}, which is not available: {e}") from e
+            self._codecs.setdefault(codec_id, codec)
+        return codec
+
+    def _dictionary(self, codec_id: int, dict_id: int) -> Any:
+        """辞書を読み込む（辞書ID 0 は辞書なし）"""
+        if dict_id == 0:
+            return None
+        key = (codec_id, dict_id)
+        dictionary = self._dictionaries.get(key)
+        if dictionary is None:
+            codec = self._codec(codec_id)
+            path = os.path.join(self.directory, f"{codec.name}-{dict_id}.dict")
+            with open(path, "rb") as f:
+                dictionary = codec.load_dictionary(f.read())
+            self._dictionaries[key] = dictionary
+        return dictionary
+
+    def _load_index(self) -> None:
+        """索引を読み込み、索引に無いブロブ（書き込み途中で終了した場合）をデータファイルから補う"""
+        self._index.seek(0)
+        raw = self._index.read()
+        whole = len(raw) - len(raw) % _BLOB.size
+        end = 0
+        for pos in range(0, whole, _BLOB.size):
+            ref = _BlobRef(*_BLOB.unpack_from(raw, pos))
+            self._blobs[ref.digest] = ref
+            end = max(end, ref.end)
+        if whole != len(raw):
+            self._index.truncate(whole)
+
+        size = os.fstat(self._data.fileno()).st_size
+        while end + _BLOB.size <= size:
+            ref = _BlobRef(*_BLOB.unpack(os.pread(self._data.fileno(), _BLOB.size, end)))
+            if ref.offset != end or ref.end > size:
+                break
+            self._blobs[ref.digest] = ref
+            self._index.write(ref.pack())
+            end = ref.end
+        if end < size:
+            print(f"Discarding {size - end} bytes of incomplete snapshot data", file=sys.stderr)
+            self._data.truncate(end)
+        self._index.flush()
+
+    def _load_revisions(self) -> None:
+        self._revision_log.seek(0)
+        for line in self._revision_log:
+            try:
+                record = json.loads(line)
+                if record.get("removed"):
+                    self._revisions.pop(record["url"], None)
+                    continue
+                revision = Revision(record["url"], record["hash"], record["time"], record.get("meta"))
+            except (ValueError, KeyError):
+                # 書き込み途中で終了した最後の行
+                continue
+            if bytes.fromhex(revision.digest) in self._blobs:
+                self._add_revision(revision)
+
+    def _read_payload(self, digest: bytes, remember: bool = True) -> bytes:
+        """
+        ブロブを展開し、差分であれば基準に適用して内容を復元する
+
+        remember=False の場合は、展開した内容を展開済みのキャッシュに残しません（差分の基準は残す）。
+        """
+        with self._decoded_lock:
+            payload = self._decoded.get(digest)
+            if payload is not None:
+                self._decoded.move_to_end(digest)
+                return payload
+
+        ref = self._blobs[digest]
+        data = os.pread(self._data.fileno(), ref.stored_len, ref.offset + _BLOB.size)
+        codec = self._codec(ref.codec)
+        try:
+            payload = codec.decompress(data, self._dictionary(ref.codec, ref.dict_id))
+        except codec.errors as e:
+            raise ValueError(f"Corrupt snapshot blob {digest.hex()} ({codec.name}): {e}") from e
+        if ref.kind == DELTA:
+            payload = apply_delta(self._read_payload(ref.base), payload)
+        if not remember:
+            return payload
+
+        with self._decoded_lock:
+            self._decoded[digest] = payload
+            while len(self._decoded) > _DECODED_CACHE_SIZE:
+                self._decoded.popitem(last=False)
+        return payload
+
+    def get(self, url: str, revision: int = -1) -> Optional[Document]:
+        """
+        保存済みのドキュメントを取得する
+
+        Args:
+            url: ドキュメントのURL（キャッシュキー）
+            revision: 版の番号（負の値は新しい方から数える、既定は最新）
+
+        Returns:
+            ドキュメント（保存されていない場合はNone）
+        """
+        revisions = self._revisions.get(url)
+        if not revisions:
+            return None
+        try:
+            digest = revisions[revision].digest
+        except IndexError:
+            return None
+        return decode_document(self._read_payload(bytes.fromhex(digest)), url)
+
+    def iter_latest(self, select: Optional[Callable[[Revision], bool]] = None) -> Iterator[Tuple[Revision, Document]]:
+        """
+        各URLの最新の版を、データファイル内の位置の順に読み出す（一括エクスポート用）
+
+        URLの順に get() するよりディスクを先頭から順に読むことになり、差分の基準も
+        直前に展開済みであることが多くなります。読み出した内容は展開済みのキャッシュに残さないため、
+        配信中のリクエストが使う分を押し出しません。
+
+        Args:
+            select: 読み出す版を選ぶ関数（省略時は全URL、内容を展開する前に呼ぶ）
+        """
+        with self._lock:
+            latest = [revs[-1] for revs in self._revisions.values()]
+        if select is not None:
+            latest = [revision for revision in latest if select(revision)]
+        latest.sort(key=lambda revision: self._blobs[bytes.fromhex(revision.digest)].offset)
+        for revision in latest:
+            payload = self._read_payload(bytes.fromhex(revision.digest), remember=False)
+            yield revision, decode_document(payload, revision.url)
+
+    def latest(self, url: str) -> Optional[Revision]:
+        """最新の版の情報"""
+        revisions = self._revisions.get(url)
+        return revisions[-1] if revisions else None
+
+    def revisions(self, url: str) -> List[Revision]:
+        """URLの版の一覧（古い順）"""
+        return list(self._revisions.get(url, ()))
+
+    def urls(self) -> List[str]:
+        """保存済みのURLの一覧"""
+        return list(self._revisions)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._revisions
+
+    def __len__(self) -> int:
+        return len(self._revisions)
+
+    # ---- 書き込み -----------------------------------------------------------
+
+    def put(self, url: str, doc: Document, meta: Optional[Dict[str, Any]] = None) -> str:
+        """
+        ドキュメントを新しい版として保存する
+
+        内容と付加情報が最新の版と同じであれば何も書き込みません。他のURLと同じ内容であれば
+        ブロブは共有し、版の履歴だけを追記します。
+
+        Args:
+            url: ドキュメントのURL（キャッシュキー）
+            doc: 保存するドキュメント
+            meta: 版に付ける付加情報（直前の版の付加情報に上書きでマージする）
+
+        Returns:
+            内容のハッシュ（16進数）
+        """
+        payload = encode_document(doc)
+        digest = hashlib.sha256(payload).digest()
+        previous = self.latest(url)
+        meta = dict(previous.meta if previous is not None else {}, **(meta or {}))
+        if previous is not None and previous.digest == digest.hex() and previous.meta == meta:
+            return previous.digest
+
+        # 圧縮は時間がかかるため、ロックの外で行う
+        blob = None
+        if digest not in self._blobs:
+            blob = self._encode_blob(payload, previous)
+
+        with self._lock:
+            if digest in self._blobs:
+                if previous is None or previous.digest != digest.hex():
+                    self.dedup_hits += 1
+            else:
+                self._append_blob(digest, payload, *blob)
+            revision = self._append_revision(Revision(url, digest.hex(), time.time(), meta))
+            train = (
+                self.train_samples and not self._trained and self._dict_id == 0
+                and len(self._blobs) >= self.train_samples
+            )
+            if train:
+                self._trained = True
+        if train:
+            self.train()
+        return revision.digest
+
+    def update_meta(self, url: str, meta: Dict[str, Any]) -> bool:
+        """
+        内容を変えずに最新の版の付加情報を更新する（304 Not Modified を受け取った場合など）
+
+        Returns:
+            更新した場合はTrue（保存されていないURLや、付加情報が変わらない場合はFalse）
+        """
+        with self._lock:
+            previous = self.latest(url)
+            if previous is None:
+                return False
+            merged = dict(previous.meta, **meta)
+            if merged == previous.meta:
+                return False
+            self._append_revision(Revision(url, previous.digest, time.time(), merged))
+            return True
+
+    def remove(self, url: str) -> bool:
+        """
+        URLを削除する（履歴に削除の記録を追記し、以後は読み出しやエクスポートの対象にしない）
+
+        ブロブは他のURLや版と共有している場合があるため、データファイルには残します。
+
+        Returns:
+            削除した場合はTrue（保存されていないURLの場合はFalse）
+        """
+        with self._lock:
+            if url not in self._revisions:
+                return False
+            record = {"url": url, "removed": True, "time": time.time()}
+            self._revision_log.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._revision_log.flush()
+            del self._revisions[url]
+            return True
+
+    def _append_revision(self, revision: Revision) -> Revision:
+        self._revision_log.write(json.dumps(revision.to_dict(), ensure_ascii=False) + "\n")
+        self._revision_log.flush()
+        self._add_revision(revision)
+        return revision
+
+    def _add_revision(self, revision: Revision) -> None:
+        revisions = self._revisions.setdefault(revision.url, [])
+        if revisions and revisions[-1].digest == revision.digest:
+            # 内容が同じ版は履歴に積まず、付加情報と確認した時刻だけを置き換える
+            revisions[-1] = revision
+        else:
+            revisions.append(revision)
+
+    def _encode_blob(self, payload: bytes, previous: Optional[Revision]) -> Tuple[int, bytes, bytes, int, int]:
+        """
+        ブロブを圧縮する（直前の版があれば差分と全体のうち小さい方を選ぶ）
+
+        Returns:
+            (種類, 圧縮後の内容, 差分の基準のハッシュ, 辞書ID, 差分の段数)
+        """
+        dict_id = self._dict_id
+        dictionary = self._dictionary(self.codec.id, dict_id)
+        best = (FULL, self.codec.compress(payload, dictionary), _NO_BASE, dict_id, 0)
+        if previous is not None and self.max_delta_chain > 0:
+            base_digest = bytes.fromhex(previous.digest)
+            base_ref = self._blobs.get(base_digest)
+            if base_ref is not None and base_ref.depth < self.max_delta_chain:
+                delta = make_delta(self._read_payload(base_digest), payload)
+                compressed = self.codec.compress(delta, dictionary)
+                if len(compressed) < len(best[1]):
+                    best = (DELTA, compressed, base_digest, dict_id, base_ref.depth + 1)
+        return best
+
+    def _append_blob(self, digest: bytes, payload: bytes, kind: int, data: bytes, base: bytes, dict_id: int, depth: int) -> None:
+        self._data.seek(0, os.SEEK_END)
+        ref = _BlobRef(self._data.tell(), digest, base, self.codec.id, kind, dict_id, depth, len(data), len(payload))
+        header = ref.pack()
+        self._data.write(header + data)
+        self._data.flush()
+        self._index.write(header)
+        self._index.flush()
+        self._blobs[digest] = ref
+
+    def train(self, samples: Optional[List[bytes]] = None) -> int:
+        """
+        保存済みのドキュメントから圧縮辞書を学習する
+
+        以降に保存するブロブは新しい辞書で圧縮されます（保存済みのブロブはそのまま読めます）。
+
+        Args:
+            samples: 学習に使う内容（省略時は各URLの最新の版）
+
+        Returns:
+            新しい辞書のID（学習できなかった場合は現在の辞書のID）
+        """
+        if samples is None:
+            samples = [self._read_payload(bytes.fromhex(revs[-1].digest)) for revs in list(self._revisions.values())]
+        try:
+            data = self.codec.train(samples, self.dictionary_size)
+        except Exception as e:
+            # zstd は標本が少なすぎると学習に失敗する
+            print(f"Snapshot dictionary training failed: {e}", file=sys.stderr)
+            return self._dict_id
+        if not data:
+            return self._dict_id
+        with self._lock:
+            dict_id = self._dict_id + 1
+            path = os.path.join(self.directory, f"{self.codec.name}-{dict_id}.dict")
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+            self._dict_id = dict_id
+        return dict_id
+
+    def close(self) -> None:
+        """ファイルを閉じる"""
+        with self._lock:
+            self._data.close()
+            self._index.close()
+            self._revision_log.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """保存件数と圧縮率"""
+        with self._lock:
+            # 全ての版を圧縮せずに保存した場合の大きさ
+            raw = sum(
+                self._blobs[bytes.fromhex(revision.digest)].raw_len
+                for revs in self._revisions.values() for revision in revs
+            )
+            history = sum(len(revs) for revs in self._revisions.values())
+            stored = sum(_BLOB.size + ref.stored_len for ref in self._blobs.values())
+            return {
+                "codec": self.codec.name,
+                "dictionary": self._dict_id,
+                "urls": len(self._revisions),
+                "revisions": history,
+                "blobs": len(self._blobs),
+                "deltas": sum(ref.kind == DELTA for ref in self._blobs.values()),
+                "dedup_hits": self.dedup_hits,
+                "raw_bytes": raw,
+                "stored_bytes": stored,
+                "ratio": raw / stored if stored else None,
+            }
+
+
+_default_store: Optional[SnapshotStore] = None
+_default_lock = threading.Lock()
+
+
+def get_snapshot_store() -> Optional[SnapshotStore]:
+    """プロセス共通のスナップショットストアを取得する（MDN_SNAPSHOT_DIR が未設定の場合はNone）"""
+    global _default_store
+    if not config.SNAPSHOT_DIR:
+        return None
+    if _default_store is None:
+        with _default_lock:
+            if _default_store is None:
+                _default_store = SnapshotStore(config.SNAPSHOT_DIR)
+    return _default_store
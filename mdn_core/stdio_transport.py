@@ -0,0 +1,296 @@
+"""
+標準ライブラリのみで実装した MCP stdio トランスポート
+
+改行区切りの JSON-RPC 2.0 メッセージを stdin から読み込み、stdout へ応答します。
+Claude Desktop から直接起動でき、ループバックのTCP接続やHTTPの解析が不要で、
+ポートの競合も発生しません。
+
+リクエストはワーカースレッドで並行に処理され、完了した順に応答を返します
+（JSON-RPC の id で対応付けるため、応答の順序はリクエストの順序と一致しません）。
+"""
+
+import json
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, IO, Optional
+
+from .errors import DeadlineExceededError, MDNError
+from .pipeline import MDNPipeline, get_pipeline, is_mdn_url
+from .prefetch import navigation
+from .protocol import SERVER_NAME
+from .resolver import get_resolver, resource_url
+from .scheduler import INTERACTIVE, check_deadline, default_deadline
+from .tracing import annotate, stage, traced
+
+PROTOCOL_VERSION = "2024-11-05"
+
+# JSON-RPC エラーコード
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+# 実装定義のエラー（期限切れのため処理しなかったリクエスト）
+REQUEST_TIMEOUT = -32001
+
+# stdio で接続するクライアントは1つだけのため、先読みのページ遷移は1つの識別子で記録する
+STDIO_CLIENT = "stdio"
+
+TOOLS = [
+    {
+        "name": "fetch_mdn_page",
+        "description": "指定したURLのMDNページを取得して分析",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "url": {
+                    "type": "string",
+                    "description": "MDNドキュメントのURL（https://developer.mozilla.org/ で始まる必要があります）"
+                }
+            },
+            "required": ["url"]
+        }
+    },
+    {
+        "name": "resolve_mdn",
+        "description": "APIシンボル（例: Array.prototype.flatMap, fetch(), <dialog>）からMDNのURL候補を検索",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "シンボルまたはその先頭部分"
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "返す候補の最大数",
+                    "default": 10
+                }
+            },
+            "required": ["query"]
+        }
+    }
+]
+
+RESOURCE_TEMPLATES = [
+    {
+        "uriTemplate": "mdn://{path}",
+        "name": "get_mdn_doc",
+        "description": "MDNウェブドキュメントをリソースとして提供",
+        "mimeType": "text/plain"
+    }
+]
+
+
+class JSONRPCError(Exception):
+    """JSON-RPC のエラー応答として返す例外"""
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class StdioMCPServer:
+    """JSON-RPC over stdio の MCP サーバー"""
+    def __init__(
+        self,
+        pipeline: Optional[MDNPipeline] = None,
+        max_workers: int = 8,
+        stdin: Optional[IO[str]] = None,
+        stdout: Optional[IO[str]] = None
+    ):
+        self.pipeline = pipeline
+        self.stdin = stdin or sys.stdin
+        self.stdout = stdout or sys.stdout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mcp-stdio")
+        self._write_lock = threading.Lock()
+        self._pending: Dict[Any, Future] = {}
+        self._pending_lock = threading.Lock()
+        # 各メソッドは (params, 期限) を受け取る
+        self._methods: Dict[str, Callable[[Dict[str, Any], float], Any]] = {
+            "initialize": self._initialize,
+            "ping": lambda params, deadline: {},
+            "tools/list": lambda params, deadline: {"tools": TOOLS},
+            "tools/call": self._call_tool,
+            "resources/list": lambda params, deadline: {"resources": []},
+            "resources/templates/list": lambda params, deadline: {"resourceTemplates": RESOURCE_TEMPLATES},
+            "resources/read": self._read_resource,
+        }
+
+    def get_pipeline(self) -> MDNPipeline:
+        return self.pipeline or get_pipeline()
+
+    # --- メソッド実装 ---
+
+    def _initialize(self, params: Dict[str, Any], deadline: float) -> Dict[str, Any]:
+        return {
+            "protocolVersion": params.get("protocolVersion") or PROTOCOL_VERSION,
+            "capabilities": {"tools": {}, "resources": {}},
+            "serverInfo": {"name": SERVER_NAME, "version": "1.0.0"},
+        }
+
+    def _call_tool(self, params: Dict[str, Any], deadline: float) -> Dict[str, Any]:
+        name = params.get("name")
+        arguments = params.get("arguments") or {}
+        if name == "resolve_mdn":
+            return self._resolve(arguments)
+        if name != "fetch_mdn_page":
+            raise JSONRPCError(INVALID_PARAMS, f"Unknown tool: {name}")
+
+        url = arguments.get("url")
+        if not is_mdn_url(url):
+            return _tool_result("Error: URL must start with https://developer.mozilla.org/", is_error=True)
+        annotate(url=url)
+        try:
+            doc = self.get_pipeline().get_document(url, INTERACTIVE, deadline)
+            check_deadline(deadline, "serializing")
+        except DeadlineExceededError:
+            raise
+        except MDNError as e:
+            print(f"Error fetching {url}: {e}", file=sys.stderr)
+            return _tool_result(f"Failed to fetch or parse MDN document from {url}", is_error=True)
+        with stage("format"):
+            return _tool_result(doc.to_markdown())
+
+    def _resolve(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        query = arguments.get("query") or ""
+        matches = get_resolver().complete(query, int(arguments.get("limit") or 10))
+        if not matches:
+            return _tool_result(f"No MDN pages found for {query}", is_error=True)
+        return _tool_result("\n".join(f"{m['symbol']}: {m['url']}" for m in matches))
+
+    def _read_resource(self, params: Dict[str, Any], deadline: float) -> Dict[str, Any]:
+        uri = params.get("uri") or ""
+        if not uri.startswith("mdn://"):
+            raise JSONRPCError(INVALID_PARAMS, f"Unknown resource: {uri}")
+
+        url = resource_url(uri[len("mdn://"):])
+        try:
+            doc = self.get_pipeline().get_document(url, INTERACTIVE, deadline)
+            check_deadline(deadline, "serializing")
+            text = doc.to_markdown()
+        except DeadlineExceededError:
+            raise
+        except MDNError as e:
+            print(f"Error fetching {url}: {e}", file=sys.stderr)
+            text = f"Failed to fetch MDN document at {url}"
+        return {"contents": [{"uri": uri, "mimeType": "text/plain", "text": text}]}
+
+    # --- メッセージ処理 ---
+
+    def _write(self, message: Dict[str, Any]) -> None:
+        data = json.dumps(message, ensure_ascii=False)
+        with self._write_lock:
+            self.stdout.write(data + "\n")
+            self.stdout.flush()
+
+    def _respond(self, request_id: Any, method: str, params: Dict[str, Any], deadline: float) -> None:
+        with traced(f"stdio {method}"), navigation(STDIO_CLIENT):
+            self._respond_traced(request_id, method, params, deadline)
+
+    def _respond_traced(self, request_id: Any, method: str, params: Dict[str, Any], deadline: float) -> None:
+        try:
+            # ワーカーの空きを待つ間に期限を過ぎたリクエストは処理しない
+            check_deadline(deadline, method)
+            result = self._methods[method](params, deadline)
+            with stage("send"):
+                self._write({"jsonrpc": "2.0", "id": request_id, "result": result})
+        except JSONRPCError as e:
+            self._write(_error(request_id, e.code, e.message))
+        except DeadlineExceededError as e:
+            self._write(_error(request_id, REQUEST_TIMEOUT, str(e)))
+        except Exception as e:
+            print(f"Error processing {method}: {e}", file=sys.stderr)
+            self._write(_error(request_id, INTERNAL_ERROR, f"Internal server error: {e}"))
+        finally:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+
+    def handle_message(self, line: str) -> None:
+        """
+        1行分の JSON-RPC メッセージを処理する
+
+        リクエストはワーカースレッドに渡し、すぐに次の行の読み込みに戻ります。
+        """
+        try:
+            message = json.loads(line)
+        except ValueError:
+            self._write(_error(None, PARSE_ERROR, "Parse error"))
+            return
+
+        if isinstance(message, list):
+            # バッチリクエスト：各要素を個別に処理する
+            for item in message:
+                self._dispatch(item)
+        else:
+            self._dispatch(message)
+
+    def _dispatch(self, message: Any) -> None:
+        if not isinstance(message, dict) or not isinstance(message.get("method"), str):
+            # クライアントからの応答などは無視する
+            if isinstance(message, dict) and "id" in message and ("result" in message or "error" in message):
+                return
+            self._write(_error(None, INVALID_REQUEST, "Invalid Request"))
+            return
+
+        method = message["method"]
+        params = message.get("params") or {}
+
+        if "id" not in message:
+            # 通知には応答しない
+            if method == "notifications/cancelled":
+                self._cancel(params.get("requestId"))
+            return
+
+        request_id = message["id"]
+        deadline = default_deadline(INTERACTIVE)
+        if method not in self._methods:
+            self._write(_error(request_id, METHOD_NOT_FOUND, f"Method not found: {method}"))
+            return
+
+        with self._pending_lock:
+            self._pending[request_id] = self._executor.submit(self._respond, request_id, method, params, deadline)
+
+    def _cancel(self, request_id: Any) -> None:
+        """未実行のリクエストを取り消す（実行中のものは完了まで待つ）"""
+        with self._pending_lock:
+            future = self._pending.pop(request_id, None)
+        if future is not None:
+            future.cancel()
+
+    def serve_forever(self) -> None:
+        """stdin が閉じられるまでメッセージを処理する"""
+        try:
+            for line in self.stdin:
+                if line.strip():
+                    self.handle_message(line)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # 処理中のリクエストの応答を書き終えてから終了する
+            self._executor.shutdown(wait=True)
+
+
+def _tool_result(text: str, is_error: bool = False) -> Dict[str, Any]:
+    return {"content": [{"type": "text", "text": text}], "isError": is_error}
+
+
+def _error(request_id: Any, code: int, message: str) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+def serve_stdio(pipeline: Optional[MDNPipeline] = None) -> None:
+    """stdio MCPサーバーを起動する"""
+    # Windows でも UTF-8 で入出力する
+    for stream in (sys.stdin, sys.stdout):
+        if hasattr(stream, "reconfigure"):
+            stream.reconfigure(encoding="utf-8")
+    print(f"Starting {SERVER_NAME} MCP server on stdio", file=sys.stderr)
+    server = StdioMCPServer(pipeline=pipeline)
+    get_resolver()
+    server.get_pipeline().start_background_refresh()
+    try:
+        server.serve_forever()
+    finally:
+        server.get_pipeline().stop_background_refresh()
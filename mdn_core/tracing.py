@@ -0,0 +1,201 @@
+"""
+リクエストごとの段階別の時間計測と、遅いリクエストのログ
+
+トランスポートがリクエストの開始時に traced() で計測を始めると、パイプラインの各段階
+（受付の待ち・作業枠の待ち・上流からの取得・抽出・整形・送信など）が stage() で
+経過時間を記録します。リクエストの所要時間が MDN_SLOW_REQUEST_MS を超えた場合は、
+段階ごとの時間とリクエスト・レスポンスの大きさを stderr に出力し、直近の分を
+/debug/slow で参照できるように保持します。
+
+計測は contextvars で現在のリクエストに結び付けるため、asyncio.to_thread で
+ワーカースレッドに渡した処理も同じリクエストとして計測されます。
+計測中でないスレッド（裏での再取得など）の stage() は何もしません。
+
+MDN_MEMORY_TRACKING=true の場合は、リクエストごとのメモリ使用量のピークも記録します（memory.py）。
+"""
+
+import json
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from . import config
+from .memory import get_memory_tracker
+
+_current: ContextVar[Optional["RequestTrace"]] = ContextVar("mdn_request_trace", default=None)
+
+
+class RequestTrace:
+    """1つのリクエストの段階ごとの経過時間と付加情報"""
+    def __init__(self, name: str):
+        """
+        Args:
+            name: リクエストの名前（例: "POST /fetch-mdn"）
+        """
+        self.name = name
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.info: Dict[str, Any] = {}
+        # 一括取得では複数のスレッドから同時に記録される
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self) -> float:
+        """開始からの秒数"""
+        return time.perf_counter() - self._start
+
+    def add(self, stage: str, seconds: float) -> None:
+        """段階の経過時間を加算する"""
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def annotate(self, **info: Any) -> None:
+        """付加情報を記録する"""
+        with self._lock:
+            self.info.update(info)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """ログに出力する形式（時間はミリ秒）"""
+        with self._lock:
+            stages = {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+            info = dict(self.info)
+        return dict(
+            info,
+            request=self.name,
+            started_at=round(self.started_at, 3),
+            total_ms=round(self.elapsed * 1000, 3),
+            stages_ms=stages,
+        )
+
+
+class SlowRequestLog:
+    """所要時間がしきい値を超えたリクエストを記録する"""
+    def __init__(self, threshold_ms: float = config.SLOW_REQUEST_MS, size: int = config.SLOW_REQUEST_LOG_SIZE):
+        """
+        Args:
+            threshold_ms: 記録するリクエストの所要時間（ミリ秒、0の場合は記録しない）
+            size: 保持する直近のリクエスト数
+        """
+        self.threshold_ms = threshold_ms
+        self._entries: Deque[Dict[str, Any]] = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.slow = 0
+
+    def record(self, trace: RequestTrace) -> Optional[Dict[str, Any]]:
+        """
+        終了したリクエストを記録する
+
+        Returns:
+            しきい値を超えた場合はログに出力した内容、それ以外はNone
+        """
+        slow = self.threshold_ms > 0 and trace.elapsed * 1000 >= self.threshold_ms
+        with self._lock:
+            self.requests += 1
+            self.slow += slow
+        if not slow:
+            return None
+        entry = trace.to_dict()
+        with self._lock:
+            self._entries.append(entry)
+        print(f"Slow request: {json.dumps(entry, ensure_ascii=False)}", file=sys.stderr)
+        return entry
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """記録した直近の遅いリクエスト（新しい順）"""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def stats(self) -> Dict[str, Any]:
+        """遅いリクエストの統計情報"""
+        with self._lock:
+            return {"threshold_ms": self.threshold_ms, "requests": self.requests, "slow": self.slow}
+
+
+@contextmanager
+def traced(name: str, log: Optional["SlowRequestLog"] = None) -> Iterator[RequestTrace]:
+    """
+    リクエストの計測を開始し、終了時に遅いリクエストのログへ記録する
+
+    Args:
+        name: リクエストの名前
+        log: 記録先（省略時はプロセス共通のもの）
+    """
+    trace = RequestTrace(name)
+    token = _current.set(trace)
+    memory = get_memory_tracker().measure()
+    try:
+        with memory:
+            yield trace
+    finally:
+        _current.reset(token)
+        if memory.peak is not None:
+            trace.annotate(peak_memory_bytes=memory.peak)
+        (log or get_slow_log()).record(trace)
+
+
+class _Stage:
+    """1つの段階の経過時間を計測するコンテキストマネージャー"""
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace: RequestTrace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        self.trace.add(self.name, time.perf_counter() - self.start)
+
+
+class _NoStage:
+    """計測中でない場合のコンテキストマネージャー（何もしない）"""
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name: str):
+    """
+    現在のリクエストの1つの段階の経過時間を計測する（計測中でなければ何もしない）
+
+    全リクエストで常に計測するため、ジェネレーターを使わないコンテキストマネージャーで実装しています。
+    """
+    trace = _current.get()
+    if trace is None:
+        return _NO_STAGE
+    return _Stage(trace, name)
+
+
+def annotate(**info: Any) -> None:
+    """現在のリクエストに付加情報（URL・ステータス・バイト数など）を記録する"""
+    trace = _current.get()
+    if trace is not None:
+        trace.annotate(**info)
+
+
+_default_log: Optional[SlowRequestLog] = None
+_default_lock = threading.Lock()
+
+
+def get_slow_log() -> SlowRequestLog:
+    """プロセス共通の遅いリクエストのログを取得する"""
+    global _default_log
+    if _default_log is None:
+        with _default_lock:
+            if _default_log is None:
+                _default_log = SlowRequestLog()
+    return _default_log
@@ -1,28 +1,52 @@
 from contextlib import asynccontextmanager
+from typing import Dict, List
+from urllib.parse import parse_qs
+import asyncio
+import json
 import os
 
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
-# MCP SDK をインポート
-from mcp.server.fastmcp import FastMCP, Context
-
-from web_scraper import fetch_mdn_doc, create_mdn_context
+from mdn_core import CircuitOpenError, MDNError, build_fetch_response, default_manifest, get_pipeline, get_resolver, is_mdn_url
+from mdn_core.admission import QuotaExceededError, client_identity, get_admission, retry_after_header
+from mdn_core.batch import batch_cost, iter_batch, validate_batch
+from mdn_core.cluster import PEER_PATH, serve_peer_request
+from mdn_core.export import ExportFilter, get_exporter
+from mdn_core.prefetch import navigation
+from mdn_core.profiler import ProfilerBusyError, debug_allowed, format_collapsed, get_sampler, profile_filename
+from mdn_core.protocol import document_etag, etag_matches
+from mdn_core.scheduler import check_deadline, remaining, request_options
+from mdn_core.tracing import annotate, get_slow_log, stage, traced
+# MCPサーバー（ツール・リソース定義）は stdio 起動と共有する
+from mcp_app import mcp
 
 # リクエストモデル定義
 class MDNRequest(BaseModel):
     """MDNドキュメント取得リクエストのモデル"""
     url: str
 
+class MDNBatchRequest(BaseModel):
+    """MDNドキュメント一括取得リクエストのモデル"""
+    urls: List[str]
+    # クライアントが保持している版の ETag（一致したURLは本文を省略する）
+    etags: Dict[str, str] = {}
+
 # FastAPIアプリケーションの起動
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 起動時処理
     print("Starting MDN Document Scraper MCP Server...")
+    # よくアクセスされるページを期限切れ前に先回りして再取得する
+    pipeline = get_pipeline()
+    pipeline.start_background_refresh()
+    # シンボル索引を mmap で開いておく
+    get_resolver()
     yield
     # 終了時処理
+    pipeline.stop_background_refresh()
     print("Shutting down MDN Document Scraper MCP Server...")
 
 app = FastAPI(lifespan=lifespan)
@@ -34,100 +58,239 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After"],
 )
 
-# MCP サーバーの初期化
-mcp = FastMCP("MDN Web Scraper", 
-              description="MDNウェブドキュメントをスクレイピングして提供するMCPサーバー")
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """POST とノード間のリクエストの段階ごとの時間を計測し、遅いものを記録する"""
+    if request.method != "POST" and request.url.path != PEER_PATH:
+        return await call_next(request)
+    # 計測は contextvars で引き継がれるため、asyncio.to_thread で実行するパイプラインの段階も記録される
+    with traced(f"{request.method} {request.url.path}"):
+        annotate(request_bytes=int(request.headers.get("content-length") or 0))
+        response = await call_next(request)
+        annotate(status=response.status_code, response_bytes=int(response.headers.get("content-length") or 0))
+        return response
 
 @app.post("/fetch-mdn")
-async def fetch_mdn_endpoint(request: MDNRequest):
+async def fetch_mdn_endpoint(request: MDNRequest, http_request: Request):
     """
     MDNドキュメントを取得するエンドポイント
     
     Args:
         request: MDN URLを含むリクエスト
+        http_request: 優先度（X-Priority）と期限（X-Deadline-Ms）のヘッダーを含むリクエスト
         
     Returns:
-        文書内容
+        文書内容（ETag 付き。If-None-Match が一致した場合は 304）
     """
+    priority, deadline = request_options(http_request.headers)
     # MDN URLの検証
-    if not request.url.startswith("https://developer.mozilla.org/"):
+    if not is_mdn_url(request.url):
         raise HTTPException(
             status_code=400,
             detail="Invalid URL. Only MDN URLs (https://developer.mozilla.org/) are supported."
         )
     
-    # ドキュメントの取得
-    doc_content = await fetch_mdn_doc(request.url)
-    
-    if not doc_content:
+    # クライアントごとのクォータを確認し、公平なキューイングで処理の順番を待つ
+    admission = get_admission()
+    client = _client(http_request)
+    waiter = await _admit(admission, client, deadline)
+    annotate(url=request.url, priority=priority)
+
+    # ドキュメントの取得（取得・キャッシュ・抽出は共通パイプラインで行う）
+    sent = 0
+    try:
+        # 先読みのページ遷移はクライアントごとに記録する（asyncio.to_thread に引き継がれる）
+        with navigation(client):
+            doc = await asyncio.to_thread(get_pipeline().get_document, request.url, priority, deadline)
+        check_deadline(deadline, "serializing")
+        etag = document_etag(doc)
+        if etag_matches(http_request.headers.get("if-none-match"), etag):
+            # クライアントのキャッシュが最新であれば本文を送らない
+            return Response(status_code=304, headers={"ETag": etag})
+        # Markdown への整形（空行をまとめる正規表現を含む）
+        with stage("format"):
+            response = build_fetch_response(doc)
+        # 公平性の課金とバイト数のクォータには本文の大きさを使う
+        sent = len(response["content"].encode())
+        return JSONResponse(content=response, headers={"ETag": etag})
+    except CircuitOpenError as e:
+        # 上流の障害中で、古いコピーも無い場合
         raise HTTPException(
-            status_code=500,
+            status_code=e.status_code,
+            detail="MDN is currently unavailable.",
+            headers={"Retry-After": retry_after_header(e.retry_after)}
+        )
+    except MDNError as e:
+        raise HTTPException(
+            status_code=e.status_code,
             detail="Failed to fetch or parse MDN document."
         )
-    
-    # コンテキストの作成
-    context_data = create_mdn_context(doc_content, request.url)
-    
-    return {
-        "status": "success",
-        "content": context_data["content"],
-        "source": context_data["source"],
-        "url": context_data["url"]
-    }
+    finally:
+        admission.release(waiter, sent)
+
+@app.post("/fetch-mdn/batch")
+async def fetch_mdn_batch(request: MDNBatchRequest, http_request: Request):
+    """
+    複数のMDNドキュメントを一括取得するエンドポイント
+
+    URLごとの結果を、取得が終わった順に1行1件のJSON（NDJSON）でストリーミングします。
+
+    Args:
+        request: MDN URLの一覧と、クライアントが保持している版の ETag
+        http_request: 優先度（X-Priority）と期限（X-Deadline-Ms）のヘッダーを含むリクエスト
+    """
+    priority, deadline = request_options(http_request.headers)
+    try:
+        urls = validate_batch({"urls": request.urls})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    admission = get_admission()
+    waiter = await _admit(admission, _client(http_request), deadline, cost=batch_cost(urls))
+    sent = 0
+
+    def stream():
+        # StreamingResponse は同期ジェネレーターをスレッドプールで実行する
+        nonlocal sent
+        for item in iter_batch(urls, request.etags, priority, deadline):
+            line = (json.dumps(item) + "\n").encode()
+            sent += len(line)
+            yield line
+
+    return _ReleasingStreamingResponse(
+        stream(), lambda: admission.release(waiter, sent), media_type="application/x-ndjson"
+    )
+
+class _ReleasingStreamingResponse(StreamingResponse):
+    """
+    送信を終えた時点で、中断された場合も含めて必ず release を呼ぶ StreamingResponse
+
+    ジェネレーターの finally は、最初のチャンクを送る前にクライアントが切断すると実行されないため、
+    クォータやエクスポートの枠はレスポンスの外側で返す。
+    """
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # スレッドプールでの next() は取り消されても完了を待つため、ここで並行して読み出されることはない
+            self._release()
+
+def _client(http_request: Request) -> str:
+    """クォータ・公平なキューイング・先読みのページ遷移で使うクライアントの識別子"""
+    return client_identity(http_request.headers, http_request.client.host if http_request.client else "unknown")
+
+async def _admit(admission, client: str, deadline: float, cost: int = 1):
+    """クライアントごとのクォータを確認し、公平なキューイングで処理の順番を待つ（cost は一括取得のURLの数）"""
+    try:
+        with stage("admission"):
+            return await admission.acquire_async(client, timeout=remaining(deadline), cost=cost)
+    except QuotaExceededError as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail={"error": str(e), "retry_after": round(e.retry_after, 3)},
+            headers={"Retry-After": retry_after_header(e.retry_after)}
+        )
+
+@app.get(PEER_PATH)
+async def cluster_document(http_request: Request, url: str = ""):
+    """クラスターモードで他のノードから所有するURLのドキュメントを問い合わせるエンドポイント"""
+    priority, deadline = request_options(http_request.headers)
+    status, body = await asyncio.to_thread(
+        serve_peer_request, get_pipeline(), http_request.headers, url, priority, deadline
+    )
+    return JSONResponse(content=body, status_code=status)
+
+@app.get("/export")
+async def export_corpus(http_request: Request, format: str = "ndjson", source: str = "all"):
+    """
+    キャッシュ・ミラー済みのドキュメントを一括エクスポートするエンドポイント
+
+    読み出しながら逐次送信するため、コーパスの大きさによらずメモリ使用量は一定です。
+
+    Args:
+        format: "ndjson"・"arrow"・"parquet"（Arrow / Parquet は pyarrow が必要）
+        source: "all"・"snapshot"・"cache"
+        http_request: 絞り込み（prefix・locale・since・until）のクエリパラメーターを含むリクエスト
+    """
+    pipeline = get_pipeline()
+    try:
+        filters = ExportFilter.from_query(parse_qs(http_request.url.query))
+        export = get_exporter().open(pipeline.snapshots, pipeline.cache, format, filters, source)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except MDNError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    # StreamingResponse は同期イテレーターをスレッドプールで実行する
+    return _ReleasingStreamingResponse(export, export.close, media_type=export.content_type, headers={
+        "Content-Disposition": f'attachment; filename="{export.filename}"',
+    })
+
+@app.get("/mcp-manifest.json")
+async def manifest():
+    """MCPマニフェスト（クライアントSDKが一括取得や再検証に対応しているかを判断するのに使う）"""
+    return JSONResponse(content=default_manifest())
 
 @app.get("/health")
 async def health_check():
     """ヘルスチェックエンドポイント"""
     return JSONResponse(content={"status": "healthy"})
 
-# MCPリソースの定義
-@mcp.resource("mdn://{path}")
-async def get_mdn_doc(path: str) -> str:
-    """
-    MDNウェブドキュメントをリソースとして提供
-    
-    Args:
-        path: ドキュメントのパス
-        
-    Returns:
-        ドキュメントの内容
-    """
-    url = f"https://developer.mozilla.org/{path}"
-    doc_content = await fetch_mdn_doc(url)
-    
-    if not doc_content:
-        return f"Failed to fetch MDN document at {url}"
-    
-    return doc_content
+@app.get("/resolve")
+async def resolve(q: str, limit: int = 10):
+    """APIシンボルからMDNのURL候補を検索するエンドポイント"""
+    return {"matches": get_resolver().complete(q, limit)}
+
+@app.get("/metrics")
+async def metrics():
+    """キャッシュ・先回り更新・先読み・クライアントごとの統計情報"""
+    return JSONResponse(content=dict(
+        get_pipeline().stats(),
+        admission=get_admission().stats(),
+        export=get_exporter().stats(),
+        slow_requests=get_slow_log().stats(),
+    ))
+
+def _check_debug(http_request: Request):
+    """/debug/ 以下は MDN_DEBUG_TOKEN（未設定の場合はループバックからのアクセス）で保護する"""
+    if not debug_allowed(http_request.headers, http_request.client.host if http_request.client else None):
+        raise HTTPException(status_code=403, detail="Forbidden")
 
-# MCPツールの定義
-@mcp.tool()
-async def fetch_mdn_page(url: str, ctx: Context) -> str:
+@app.get("/debug/profile")
+async def debug_profile(http_request: Request, seconds: float = 10, idle: bool = False):
     """
-    指定したURLのMDNページを取得して分析
-    
+    全スレッドのスタックを指定した秒数だけ採取し、collapsed 形式（flamegraph.pl / speedscope 用）で返す
+
     Args:
-        url: MDNドキュメントのURL（https://developer.mozilla.org/ で始まる必要があります）
-        
-    Returns:
-        取得したドキュメントの内容
+        seconds: 採取する秒数（MDN_PROFILE_MAX_SECONDS まで）
+        idle: ロックや select の待ちで止まっているスタックも含めるか
     """
-    # URLの検証
-    if not url.startswith("https://developer.mozilla.org/"):
-        return "Error: URL must start with https://developer.mozilla.org/"
-    
-    # 進捗報告
-    ctx.info(f"Fetching document from {url}")
-    
-    # ドキュメント取得
-    doc_content = await fetch_mdn_doc(url)
-    
-    if not doc_content:
-        return f"Failed to fetch or parse MDN document from {url}"
-    
-    return doc_content
+    _check_debug(http_request)
+    try:
+        counts, samples = await asyncio.to_thread(get_sampler().profile, seconds, idle)
+    except ValueError as e:
+        # nan・inf は採取が終わらなくなるため受け付けない
+        raise HTTPException(status_code=400, detail=str(e))
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return PlainTextResponse(format_collapsed(counts), headers={
+        "Content-Disposition": f'attachment; filename="{profile_filename()}"',
+        "X-Profile-Samples": str(samples),
+    })
+
+@app.get("/debug/slow")
+async def debug_slow(http_request: Request):
+    """所要時間が MDN_SLOW_REQUEST_MS を超えた直近のリクエストと、その段階ごとの時間"""
+    _check_debug(http_request)
+    log = get_slow_log()
+    return JSONResponse(content={"threshold_ms": log.threshold_ms, "requests": log.entries()})
 
 # FastAPI アプリに MCP サーバーをマウント
 app.mount("/mcp", mcp.sse_app())
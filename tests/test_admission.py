@@ -0,0 +1,140 @@
+"""クライアントごとの公平なキューイングとクォータ"""
+
+import asyncio
+import unittest
+from unittest import mock
+
+from benchmark import StubUpstream
+from mdn_core import TTLCache, admission as admission_module, get_pipeline, set_pipeline
+from mdn_core.admission import AdmissionController, QuotaExceededError, client_identity
+from mdn_core.batch import batch_cost
+from mdn_core.fetch import Fetcher
+from mdn_core.pipeline import MDNPipeline
+
+
+class CancelledWaiterTest(unittest.TestCase):
+    def test_cancelled_waiter_does_not_leak_a_slot(self):
+        admission = AdmissionController(slots=1, requests_per_minute=0, bytes_per_minute=0)
+
+        async def scenario():
+            first = await admission.acquire_async("ip:a")
+            task = asyncio.ensure_future(admission.acquire_async("ip:b", timeout=5))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            admission.release(first)
+            self.assertEqual(admission.stats()["running"], 0)
+            # 後続のリクエストは待たずに枠を得られる
+            waiter = await admission.acquire_async("ip:c", timeout=0.5)
+            admission.release(waiter)
+
+        asyncio.run(scenario())
+        self.assertEqual(admission.stats()["running"], 0)
+
+    def test_waiter_cancelled_after_grant_releases_the_slot(self):
+        admission = AdmissionController(slots=1, requests_per_minute=0, bytes_per_minute=0)
+
+        async def scenario():
+            first = await admission.acquire_async("ip:a")
+            task = asyncio.ensure_future(admission.acquire_async("ip:b", timeout=5))
+            await asyncio.sleep(0.01)
+            # 枠が割り当てられた直後、待っていたタスクが再開する前に取り消される
+            admission.release(first)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(scenario())
+        self.assertEqual(admission.stats()["running"], 0)
+
+
+class BatchCostTest(unittest.TestCase):
+    def test_batch_consumes_one_request_per_url(self):
+        admission = AdmissionController(slots=0, requests_per_minute=10, bytes_per_minute=0)
+        urls = [f"https://developer.mozilla.org/en-US/docs/Web/{i}" for i in range(10)]
+        admission.release(admission.acquire("ip:a", cost=batch_cost(urls + urls[:3])))
+        with self.assertRaises(QuotaExceededError):
+            admission.acquire("ip:a")
+
+    def test_batch_larger_than_quota_is_charged_in_full(self):
+        admission = AdmissionController(slots=0, requests_per_minute=10, bytes_per_minute=0)
+        admission.release(admission.acquire("ip:a", cost=40))
+        with self.assertRaises(QuotaExceededError) as raised:
+            admission.acquire("ip:a")
+        # 超過した 30 件分を返済し、さらに1件分が貯まるまで待つ（10件/分 = 6秒/件）
+        self.assertAlmostEqual(raised.exception.retry_after, 31 * 6, delta=1)
+
+
+class IdentityTest(unittest.TestCase):
+    def test_only_configured_api_keys_identify_a_client(self):
+        with mock.patch.object(admission_module.config, "CLIENT_API_KEYS", "good-key"):
+            self.assertTrue(client_identity({"X-API-Key": "good-key"}, "10.0.0.1").startswith("key:"))
+            self.assertEqual(client_identity({"Authorization": "Bearer forged"}, "10.0.0.1"), "ip:10.0.0.1")
+
+    def test_sessions_are_scoped_under_the_peer(self):
+        self.assertEqual(client_identity({"X-Client-Id": "s1"}, "10.0.0.1"), "ip:10.0.0.1/session:s1")
+        self.assertNotEqual(
+            client_identity({"Mcp-Session-Id": "s1"}, "10.0.0.1"),
+            client_identity({"Mcp-Session-Id": "s1"}, "10.0.0.2"),
+        )
+
+    def test_new_session_ids_do_not_get_fresh_quota(self):
+        admission = AdmissionController(slots=0, requests_per_minute=3, bytes_per_minute=0)
+        for i in range(3):
+            admission.release(admission.acquire(client_identity({"X-Client-Id": f"s{i}"}, "10.0.0.1")))
+        with self.assertRaises(QuotaExceededError):
+            admission.acquire(client_identity({"X-Client-Id": "s-new"}, "10.0.0.1"))
+        # 他の接続元アドレスには影響しない
+        admission.release(admission.acquire(client_identity({"X-Client-Id": "s-new"}, "10.0.0.2")))
+
+
+class QuotaRefundTest(unittest.TestCase):
+    def test_requests_rejected_by_a_full_queue_do_not_spend_quota(self):
+        admission = AdmissionController(slots=1, max_queue=1, requests_per_minute=3, bytes_per_minute=0)
+        first = admission.acquire("ip:a")
+        queued = admission.enqueue("ip:a", lambda: None)
+        for _ in range(5):
+            with self.assertRaisesRegex(QuotaExceededError, "queued"):
+                admission.enqueue("ip:a", lambda: None)
+        admission.release(first)
+        admission.release(queued)
+        # 3件目はクォータの範囲内
+        admission.release(admission.acquire("ip:a"))
+
+    def test_cancelled_waiter_is_refunded(self):
+        admission = AdmissionController(slots=1, requests_per_minute=2, bytes_per_minute=0)
+        first = admission.acquire("ip:a")
+        with self.assertRaisesRegex(QuotaExceededError, "Timed out"):
+            admission.acquire("ip:a", timeout=0.01)
+        admission.release(first)
+        admission.release(admission.acquire("ip:a"))
+
+
+class MCPAdmissionTest(unittest.TestCase):
+    def test_fetch_with_client_applies_quota(self):
+        from web_scraper import fetch_mdn_doc
+
+        admission = AdmissionController(slots=1, requests_per_minute=1, bytes_per_minute=0)
+        url = "https://developer.mozilla.org/en-US/docs/Web/API/Quota"
+        with StubUpstream(paragraphs=2) as upstream, \
+                mock.patch.object(admission_module, "_default_admission", admission):
+            previous = get_pipeline()
+            set_pipeline(MDNPipeline(
+                fetcher=Fetcher(origin=upstream.origin, hedge=False),
+                cache=TTLCache(max_entries=4, ttl=60),
+                snapshots=None,
+            ))
+            try:
+                self.assertIn("Quota", asyncio.run(fetch_mdn_doc(url, client="ip:mcp")))
+                with self.assertRaises(QuotaExceededError):
+                    asyncio.run(fetch_mdn_doc(url, client="ip:mcp"))
+                # クライアントを指定しない呼び出し（stdio）はクォータを通さない
+                self.assertIsNotNone(asyncio.run(fetch_mdn_doc(url)))
+            finally:
+                set_pipeline(previous)
+        self.assertEqual(admission.stats()["running"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
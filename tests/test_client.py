@@ -0,0 +1,76 @@
+"""クライアントSDKの壊れたレスポンスの扱い"""
+
+import asyncio
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import mdn_client
+except ImportError:
+    # httpx が無い環境
+    mdn_client = None
+
+URLS = [f"https://developer.mozilla.org/en-US/docs/Web/API/Page{i}" for i in range(3)]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # POST のパスごとの応答（ステータスコード、本文）
+    responses = {}
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.reply(200, json.dumps({"endpoints": {"fetch": "/fetch-mdn", "batch": "/fetch-mdn/batch"}}))
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.reply(*self.responses[self.path])
+
+
+@unittest.skipIf(mdn_client is None, "httpx is not installed")
+class MalformedResponseTest(unittest.TestCase):
+    def setUp(self):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.server_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def fetch_many(self, responses, urls):
+        _Handler.responses = responses
+
+        async def run():
+            async with mdn_client.MDNClient(self.server_url, retries=0) as client:
+                return await asyncio.wait_for(client.fetch_many(urls, return_exceptions=True), 10)
+
+        return asyncio.run(run())
+
+    def test_malformed_batch_line_fails_every_remaining_url(self):
+        first = json.dumps({"url": URLS[0], "status": "success", "title": "Page0"})
+        for line in ("{not json", json.dumps({"status": "success"}), "[]"):
+            results = self.fetch_many({"/fetch-mdn/batch": (200, first + "\n" + line + "\n")}, URLS)
+            self.assertEqual(results[0]["title"], "Page0")
+            for result in results[1:]:
+                self.assertIsInstance(result, mdn_client.MDNClientError)
+
+    def test_non_object_json_is_an_error(self):
+        for status in (200, 500):
+            results = self.fetch_many({"/fetch-mdn": (status, "[1, 2]")}, URLS[:1])
+            self.assertIsInstance(results[0], mdn_client.MDNClientError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+"""クラスターモードの共有シークレット"""
+
+import unittest
+from unittest import mock
+
+from mdn_core import cluster as cluster_module
+from mdn_core.cluster import SECRET_HEADER, Cluster, get_cluster, serve_peer_request
+
+SELF = "http://127.0.0.1:8001"
+PEERS = [SELF, "http://127.0.0.1:8002"]
+
+
+class _Pipeline:
+    def __init__(self, cluster):
+        self.cluster = cluster
+
+
+class SecretTest(unittest.TestCase):
+    def test_cluster_requires_secret(self):
+        with self.assertRaises(ValueError):
+            Cluster(SELF, PEERS, secret="")
+
+    def test_cluster_mode_is_disabled_without_secret(self):
+        with mock.patch.multiple(
+            cluster_module.config, CLUSTER_PEERS=",".join(PEERS), CLUSTER_SELF=SELF, CLUSTER_SECRET=""
+        ), mock.patch.object(cluster_module, "_default_cluster", None), \
+                mock.patch.object(cluster_module, "_warned_no_secret", True):
+            self.assertIsNone(get_cluster())
+
+    def test_peer_request_without_secret_is_rejected(self):
+        pipeline = _Pipeline(Cluster(SELF, PEERS, secret="s3cret"))
+        url = "https://developer.mozilla.org/en-US/docs/Web/API"
+        for headers in ({}, {SECRET_HEADER: ""}, {SECRET_HEADER: "wrong"}):
+            status, _ = serve_peer_request(pipeline, headers, url, "interactive", 0.0)
+            self.assertEqual(status, 403)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+"""段階ごとの期限の追従"""
+
+import unittest
+
+from benchmark import StubUpstream
+from mdn_core.errors import FetchError
+from mdn_core.fetch import Fetcher
+
+URL = "https://developer.mozilla.org/en-US/docs/Web/API/Fetch_API"
+
+
+class StageTimeoutTest(unittest.TestCase):
+    def test_stage_timeout_recovers_after_upstream_slows_down(self):
+        with StubUpstream(paragraphs=3) as upstream:
+            fetcher = Fetcher(origin=upstream.origin, hedge=False, timeout=10)
+            for _ in range(40):
+                fetcher.fetch(URL)
+            self.assertLess(fetcher.stage_timeout("first_byte"), 0.8)
+
+            # 上流が定常的に期限（p99の数倍）より遅くなる
+            upstream.delay = 0.8
+            results = []
+            for _ in range(4):
+                try:
+                    fetcher.fetch(URL)
+                    results.append("ok")
+                except FetchError:
+                    results.append("timeout")
+
+        # 期限切れも記録するため、最初の期限切れの後は期限が延びて取得できる
+        self.assertLessEqual(results.count("timeout"), 1)
+        self.assertEqual(results[-2:], ["ok", "ok"])
+        self.assertGreater(fetcher.stage_timeout("first_byte"), 0.8)
+
+
+if __name__ == "__main__":
+    unittest.main()
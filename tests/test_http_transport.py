@@ -0,0 +1,53 @@
+"""標準ライブラリ版HTTPサーバーのリクエストボディの上限"""
+
+import socket
+import threading
+import unittest
+
+from mdn_core.http_transport import MCPRequestHandler, create_server
+
+
+class RequestBodyTest(unittest.TestCase):
+    def setUp(self):
+        handler = type("Handler", (MCPRequestHandler,), {"log_message": lambda *args: None, "max_body": 64})
+        self.httpd = create_server("127.0.0.1", 0, handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def post(self, headers: str, body: bytes) -> bytes:
+        """リクエストを送り、サーバーが接続を閉じるまでの応答を返す"""
+        with socket.create_connection(self.httpd.server_address, timeout=5) as sock:
+            sock.sendall(b"POST /fetch-mdn HTTP/1.1\r\nHost: localhost\r\n" + headers.encode() + b"\r\n" + body)
+            response = b""
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    return response
+                response += data
+
+    def assert_closed_with(self, response: bytes, status: int):
+        self.assertTrue(response.startswith(b"HTTP/1.1 %d " % status), response[:64])
+        self.assertIn(b"Connection: close", response)
+
+    def test_content_length_over_limit(self):
+        self.assert_closed_with(self.post("Content-Length: 1000000\r\n", b"{}"), 413)
+
+    def test_chunked_body_over_limit(self):
+        body = b"40\r\n" + b"x" * 64 + b"\r\n" + b"1\r\nx\r\n" + b"0\r\n\r\n"
+        self.assert_closed_with(self.post("Transfer-Encoding: chunked\r\n", body), 413)
+
+    def test_malformed_chunk_size(self):
+        for size_line in (b"zz\r\n", b"-1\r\n"):
+            self.assert_closed_with(self.post("Transfer-Encoding: chunked\r\n", size_line + b"x\r\n0\r\n\r\n"), 400)
+
+    def test_body_within_limit(self):
+        response = self.post("Transfer-Encoding: chunked\r\nConnection: close\r\n", b"2\r\n{}\r\n0\r\n\r\n")
+        # ボディは読めたうえで、URLが無いため 400 になる
+        self.assertIn(b"URL parameter is required", response)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+"""起動時に読み込むモジュール（stdio 起動の時間を抑えるため）"""
+
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loaded_modules(statement):
+    code = f"import sys; {statement}; print(' '.join(sys.modules))"
+    return set(subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True, text=True).stdout.split())
+
+
+class DeferredImportTest(unittest.TestCase):
+    def test_package_import_loads_no_submodules(self):
+        modules = loaded_modules("import mdn_core")
+        self.assertNotIn("mdn_core.pipeline", modules)
+        self.assertNotIn("http.client", modules)
+
+    def test_stdio_path_does_not_load_http_client(self):
+        modules = loaded_modules("import claude_desktop_mcp")
+        self.assertIn("mdn_core.pipeline", modules)
+        self.assertNotIn("http.client", modules)
+        self.assertNotIn("ssl", modules)
+
+    def test_exports_resolve(self):
+        import mdn_core
+
+        for name in mdn_core.__all__:
+            self.assertIsNotNone(getattr(mdn_core, name))
+
+
+if __name__ == "__main__":
+    unittest.main()
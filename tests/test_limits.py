@@ -0,0 +1,39 @@
+"""巨大なページの上限（バイト数と要素数）"""
+
+import unittest
+
+from benchmark import StubUpstream
+from mdn_core.errors import DocumentTooLargeError
+from mdn_core.extract import extract_document
+from mdn_core.fetch import Fetcher
+
+URL = "https://developer.mozilla.org/en-US/docs/Web/API/"
+
+
+class LimitTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.upstream = StubUpstream(paragraphs=3, huge_paragraphs=2000).__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.upstream.__exit__(None, None, None)
+
+    def test_response_over_byte_cap_is_rejected(self):
+        fetcher = Fetcher(origin=self.upstream.origin, hedge=False, max_bytes=64 * 1024)
+        self.assertLess(len(fetcher.fetch(URL + "Small").body), 64 * 1024)
+        with self.assertRaises(DocumentTooLargeError):
+            fetcher.fetch(URL + "Huge")
+        self.assertEqual(fetcher.too_large, 1)
+
+    def test_page_over_element_cap_is_rejected(self):
+        html = self.upstream.render("/en-US/docs/Web/API/Huge")
+        with self.assertRaises(DocumentTooLargeError):
+            extract_document(html.encode(), URL + "Huge", max_elements=1000)
+        with self.assertRaises(DocumentTooLargeError):
+            extract_document(html, URL + "Huge", max_elements=1000)
+        self.assertTrue(extract_document(html, URL + "Huge", max_elements=0).text)
+
+
+if __name__ == "__main__":
+    unittest.main()
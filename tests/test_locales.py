@@ -0,0 +1,61 @@
+"""上流の障害中のロケールのフォールバック"""
+
+import socket
+import unittest
+
+from mdn_core import TTLCache
+from mdn_core.errors import FetchError
+from mdn_core.extract import FALLBACK_MISSING, FALLBACK_UNAVAILABLE, Document
+from mdn_core.fetch import Fetcher
+from mdn_core.locales import LocaleFallback
+from mdn_core.pipeline import MDNPipeline
+
+EN_URL = "https://developer.mozilla.org/en-US/docs/Web/API/Fetch_API"
+JA_URL = "https://developer.mozilla.org/ja/docs/Web/API/Fetch_API"
+
+
+def closed_origin():
+    """接続を拒否するオリジン（上流の障害を模す）"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+class UnavailableUpstreamTest(unittest.TestCase):
+    def setUp(self):
+        self.pipeline = MDNPipeline(
+            fetcher=Fetcher(origin=closed_origin(), hedge=False),
+            cache=TTLCache(max_entries=16, ttl=60),
+            snapshots=None,
+            locales=LocaleFallback(fallbacks={}, default_locale="en-US", enabled=True)
+        )
+
+    def test_cached_fallback_is_served_when_translation_is_unreachable(self):
+        self.pipeline.cache.set(EN_URL, Document(EN_URL, "Fetch API", "", "English text"))
+
+        doc = self.pipeline.get_document(JA_URL)
+
+        self.assertEqual(doc.text, "English text")
+        self.assertEqual(doc.requested_url, JA_URL)
+        # 障害で確かめられなかった翻訳は、存在しないとは記録しない
+        self.assertIsNone(self.pipeline.locales.map.known("docs/Web/API/Fetch_API", "ja"))
+        # 注記は翻訳が無いとは伝えず、障害中であることを伝える
+        self.assertEqual(doc.fallback_reason, FALLBACK_UNAVAILABLE)
+        markdown = doc.to_markdown()
+        self.assertNotIn("not available in ja", markdown)
+        self.assertIn("MDN is currently unavailable", markdown)
+
+    def test_missing_translation_note(self):
+        doc = Document(EN_URL, "Fetch API", "", "English text").as_fallback(JA_URL)
+
+        self.assertEqual(doc.fallback_reason, FALLBACK_MISSING)
+        self.assertIn("This page is not available in ja", doc.to_markdown())
+
+    def test_unavailable_error_is_raised_when_nothing_can_be_served(self):
+        with self.assertRaises(FetchError) as raised:
+            self.pipeline.get_document(JA_URL)
+        self.assertIsNone(raised.exception.upstream_status)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+"""サイトマップにもとづくミラーの差分更新"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from urllib.parse import urlsplit
+
+from benchmark import StubUpstream, write_sitemap
+from mdn_core import TTLCache
+from mdn_core.fetch import Fetcher
+from mdn_core.pipeline import MDNPipeline
+from mdn_core.resolver import get_resolver
+from mdn_core.snapshot import SnapshotStore
+
+BASE = "https://developer.mozilla.org/en-US/docs/Web/API/MirrorTest"
+OLD = "2024-01-01T00:00:00Z"
+NEW = "2024-02-01T00:00:00Z"
+
+
+class MirrorRefreshTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="mdn-mirror-test-")
+        self.sitemap = os.path.join(self.directory, "sitemap.xml.gz")
+        self.upstream = StubUpstream(paragraphs=3).__enter__()
+        self.store = SnapshotStore(os.path.join(self.directory, "store"), train_samples=0)
+        self.pipeline = MDNPipeline(
+            fetcher=Fetcher(origin=self.upstream.origin, hedge=False),
+            cache=TTLCache(max_entries=16, ttl=60),
+            snapshots=self.store
+        )
+
+    def tearDown(self):
+        self.store.close()
+        self.upstream.__exit__(None, None, None)
+        shutil.rmtree(self.directory)
+
+    def refresh(self, entries):
+        write_sitemap(self.sitemap, entries)
+        requests = self.upstream.requests
+        result = self.pipeline.mirror.refresh(self.sitemap)
+        return result, self.upstream.requests - requests
+
+    def test_new_changed_unchanged_and_removed(self):
+        entries = {f"{BASE}{i}": OLD for i in range(3)}
+        result, _ = self.refresh(entries)
+        self.assertEqual(result["new"], 3)
+        self.assertEqual(get_resolver().resolve("MirrorTest2"), f"{BASE}2")
+        self.pipeline.get_document(f"{BASE}2")
+
+        # 0 は内容が変わり、1 は変わらず、2 はサイトマップから消え、3 が追加される
+        self.upstream.versions[urlsplit(f"{BASE}0").path] = 1
+        entries[f"{BASE}0"] = NEW
+        del entries[f"{BASE}2"]
+        entries[f"{BASE}3"] = NEW
+        result, requests = self.refresh(entries)
+
+        self.assertEqual(result["new"], 1)
+        self.assertEqual(result["updated"], 1)
+        self.assertEqual(result["unchanged"], 1)
+        self.assertEqual(result["removed"], 1)
+        self.assertEqual(requests, 2)
+
+        # 削除したURLはストア・キャッシュ・リゾルバー・エクスポートの対象から外れる
+        self.assertNotIn(f"{BASE}2", self.store)
+        self.assertIsNone(self.pipeline.cache.get_entry(f"{BASE}2"))
+        self.assertIsNone(get_resolver().resolve("MirrorTest2"))
+        exported = {revision.url for revision, _ in self.store.iter_latest()}
+        self.assertEqual(exported, {f"{BASE}0", f"{BASE}1", f"{BASE}3"})
+
+        # 削除は再起動後も残る
+        self.store.close()
+        reopened = SnapshotStore(os.path.join(self.directory, "store"), train_samples=0)
+        try:
+            self.assertEqual(sorted(reopened.urls()), [f"{BASE}0", f"{BASE}1", f"{BASE}3"])
+        finally:
+            reopened.close()
+        self.store = SnapshotStore(os.path.join(self.directory, "store"), train_samples=0)
+
+    def test_page_fetched_on_demand_is_not_refetched_or_removed(self):
+        url = f"{BASE}OnDemand"
+        self.pipeline.get_document(url)
+        self.assertIsNone(self.store.latest(url).meta.get("lastmod"))
+
+        # 保存した時刻より前の lastmod であれば、取得し直さない
+        result, requests = self.refresh({url: OLD})
+        self.assertEqual(result["unchanged"], 1)
+        self.assertEqual(requests, 0)
+
+        # サイトマップに載っていない、通常の取得だけで保存したページは削除しない
+        self.pipeline.get_document(f"{BASE}Other")
+        result, _ = self.refresh({url: OLD})
+        self.assertEqual(result["removed"], 0)
+        self.assertIn(f"{BASE}Other", self.store)
+
+
+if __name__ == "__main__":
+    unittest.main()
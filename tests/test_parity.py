@@ -0,0 +1,116 @@
+"""
+全フロントエンド（FastAPI版・標準ライブラリ版HTTP・stdio）が同じ上流から同じ応答を返すことの確認
+
+上流は benchmark.py のスタブサーバーを使うため、MDN 本体にはアクセスしません。
+FastAPI版は fastapi と httpx（TestClient）が無い環境ではスキップします。
+"""
+
+import http.client
+import io
+import json
+import threading
+import unittest
+
+from benchmark import StubUpstream
+from mdn_core import TTLCache, get_pipeline, set_pipeline
+from mdn_core.admission import AdmissionController
+from mdn_core.fetch import Fetcher
+from mdn_core.http_transport import MCPRequestHandler, create_server
+from mdn_core.pipeline import MDNPipeline
+from mdn_core.stdio_transport import StdioMCPServer
+
+try:
+    from fastapi.testclient import TestClient
+    import server
+except ImportError:
+    server = None
+
+URL = "https://developer.mozilla.org/en-US/docs/Web/API/Parity"
+
+
+class FrontendParityTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.upstream = StubUpstream(paragraphs=5).__enter__()
+        cls.pipeline = MDNPipeline(
+            fetcher=Fetcher(origin=cls.upstream.origin, hedge=False),
+            cache=TTLCache(max_entries=16, ttl=60),
+            snapshots=None,
+        )
+        cls.previous = get_pipeline()
+        set_pipeline(cls.pipeline)
+
+    @classmethod
+    def tearDownClass(cls):
+        set_pipeline(cls.previous)
+        cls.upstream.__exit__(None, None, None)
+
+    def http_transport(self, path, payload):
+        handler = type("Handler", (MCPRequestHandler,), {
+            "pipeline": self.pipeline, "admission": AdmissionController(), "log_message": lambda *args: None,
+        })
+        httpd = create_server("127.0.0.1", 0, handler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1])
+            conn.request("POST", path, body=json.dumps(payload), headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            body = json.loads(response.read())
+            conn.close()
+            return response.status, response.getheader("ETag"), body
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+    def stdio_transport(self, *messages):
+        stdout = io.StringIO()
+        stdin = io.StringIO("".join(json.dumps(message) + "\n" for message in messages))
+        StdioMCPServer(pipeline=self.pipeline, stdin=stdin, stdout=stdout).serve_forever()
+        responses = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        return {response["id"]: response for response in responses}
+
+    def test_fetch_and_tool_content_match(self):
+        status, etag, fetched = self.http_transport("/fetch-mdn", {"url": URL})
+        self.assertEqual(status, 200)
+        self.assertEqual(fetched["url"], URL)
+        self.assertEqual(fetched["title"], "Parity")
+
+        _, mcp_etag, mcp = self.http_transport("/mcp", {"parameters": {"url": URL}})
+        self.assertEqual(mcp["contexts"][0]["content"]["content"], fetched["content"])
+        self.assertEqual(mcp_etag, etag)
+
+        responses = self.stdio_transport(
+            {"jsonrpc": "2.0", "id": 1, "method": "tools/call",
+             "params": {"name": "fetch_mdn_page", "arguments": {"url": URL}}},
+            {"jsonrpc": "2.0", "id": 2, "method": "resources/read",
+             "params": {"uri": "mdn://en-US/docs/Web/API/Parity"}},
+        )
+        self.assertFalse(responses[1]["result"]["isError"])
+        self.assertEqual(responses[1]["result"]["content"][0]["text"], fetched["content"])
+        self.assertEqual(responses[2]["result"]["contents"][0]["text"], fetched["content"])
+
+    def test_invalid_url_is_rejected_everywhere(self):
+        status, _, body = self.http_transport("/fetch-mdn", {"url": "https://example.com/"})
+        self.assertEqual(status, 400)
+        self.assertIn("error", body)
+        responses = self.stdio_transport({
+            "jsonrpc": "2.0", "id": 1, "method": "tools/call",
+            "params": {"name": "fetch_mdn_page", "arguments": {"url": "https://example.com/"}},
+        })
+        self.assertTrue(responses[1]["result"]["isError"])
+
+    @unittest.skipIf(server is None, "fastapi / httpx is not installed")
+    def test_fastapi_matches_http_transport(self):
+        status, etag, expected = self.http_transport("/fetch-mdn", {"url": URL})
+        with TestClient(server.app) as client:
+            response = client.post("/fetch-mdn", json={"url": URL})
+            self.assertEqual(response.status_code, status)
+            self.assertEqual(response.json(), expected)
+            self.assertEqual(response.headers["ETag"], etag)
+            revalidated = client.post("/fetch-mdn", json={"url": URL}, headers={"If-None-Match": etag})
+            self.assertEqual(revalidated.status_code, 304)
+            self.assertEqual(client.post("/fetch-mdn", json={"url": "https://example.com/"}).status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+"""先読みのページ遷移の記録"""
+
+import threading
+import unittest
+
+from mdn_core.cache import TTLCache
+from mdn_core.extract import Document
+from mdn_core.prefetch import Prefetcher, navigation
+
+BASE = "https://developer.mozilla.org/en-US/docs/Web/"
+
+
+def page(name):
+    return Document(BASE + name, name, "", "text")
+
+
+class TransitionTest(unittest.TestCase):
+    def setUp(self):
+        self.prefetcher = Prefetcher(TTLCache(max_entries=16, ttl=60), load=lambda key: None, enabled=False)
+
+    def access(self, client, name):
+        with navigation(client):
+            self.prefetcher.on_access(BASE + name, page(name))
+
+    def test_interleaved_clients_do_not_mix(self):
+        self.access("ip:10.0.0.1", "Array")
+        self.access("ip:10.0.0.2", "Promise")
+        self.access("ip:10.0.0.1", "Array/map")
+        self.access("ip:10.0.0.2", "Promise/then")
+        self.assertEqual(self.prefetcher.predict(BASE + "Array", page("Array")), [BASE + "Array/map"])
+        self.assertEqual(self.prefetcher.predict(BASE + "Promise", page("Promise")), [BASE + "Promise/then"])
+
+    def test_concurrent_clients_do_not_mix(self):
+        def navigate(client, first, second):
+            for _ in range(200):
+                self.access(client, first)
+                self.access(client, second)
+
+        threads = [
+            threading.Thread(target=navigate, args=(f"session:{i}", f"A{i}", f"B{i}")) for i in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for i in range(4):
+            predicted = self.prefetcher.predict(BASE + f"A{i}", page(f"A{i}"))
+            self.assertEqual(predicted, [BASE + f"B{i}"])
+
+    def test_accesses_without_client_are_not_recorded(self):
+        self.prefetcher.on_access(BASE + "Array", page("Array"))
+        self.prefetcher.on_access(BASE + "Array/map", page("Array/map"))
+        self.assertEqual(self.prefetcher.predict(BASE + "Array", page("Array")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
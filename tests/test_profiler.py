@@ -0,0 +1,43 @@
+"""スタックの採取の秒数の検証"""
+
+import http.client
+import threading
+import unittest
+from unittest import mock
+
+from mdn_core import profiler
+from mdn_core.http_transport import MCPRequestHandler, create_server
+from mdn_core.profiler import StackSampler
+
+
+class SecondsTest(unittest.TestCase):
+    def test_non_finite_seconds_are_rejected(self):
+        sampler = StackSampler(interval=0.01, max_seconds=1)
+        for seconds in (float("nan"), float("inf"), float("-inf")):
+            with self.assertRaises(ValueError):
+                sampler.profile(seconds)
+        # 拒否した後も採取中のままにならない
+        _, samples = sampler.profile(0.05)
+        self.assertGreater(samples, 0)
+
+    def test_http_transport_answers_400(self):
+        handler = type("Handler", (MCPRequestHandler,), {"log_message": lambda *args: None})
+        httpd = create_server("127.0.0.1", 0, handler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        sampler = StackSampler(interval=0.01, max_seconds=1)
+        try:
+            with mock.patch.object(profiler, "_default_sampler", sampler):
+                for value in ("nan", "inf", "abc"):
+                    conn = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1])
+                    conn.request("GET", f"/debug/profile?seconds={value}")
+                    response = conn.getresponse()
+                    response.read()
+                    conn.close()
+                    self.assertEqual(response.status, 400)
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
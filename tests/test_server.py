@@ -0,0 +1,53 @@
+"""FastAPI サーバーのストリーミング応答"""
+
+import asyncio
+import unittest
+
+try:
+    import server
+except ImportError:
+    # fastapi・mcp が無い環境
+    server = None
+
+
+@unittest.skipIf(server is None, "fastapi is not installed")
+class ReleasingStreamingResponseTest(unittest.TestCase):
+    def run_response(self, send, released, started):
+        def chunks():
+            started.append(True)
+            yield b"chunk"
+
+        response = server._ReleasingStreamingResponse(chunks(), lambda: released.append(True))
+
+        async def receive():
+            await asyncio.sleep(3600)
+            return {"type": "http.disconnect"}
+
+        scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+        asyncio.run(response(scope, receive, send))
+
+    def test_released_when_client_disconnects_before_first_chunk(self):
+        async def send(message):
+            raise OSError("client disconnected")
+
+        released, started = [], []
+        # Starlette は送信の OSError を ClientDisconnect に変換する（バージョンによってはそのまま送出する）
+        with self.assertRaises(Exception):
+            self.run_response(send, released, started)
+        self.assertEqual(released, [True])
+        self.assertEqual(started, [])
+
+    def test_released_once_after_complete_response(self):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        released = []
+        self.run_response(send, released, [])
+        self.assertEqual(released, [True])
+        self.assertEqual(messages[-1], {"type": "http.response.body", "body": b"", "more_body": False})
+
+
+if __name__ == "__main__":
+    unittest.main()
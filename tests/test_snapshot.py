@@ -0,0 +1,103 @@
+"""スナップショットストアのコーデック"""
+
+import os
+import tempfile
+import unittest
+
+from benchmark import StubUpstream
+from mdn_core import TTLCache
+from mdn_core.extract import Document
+from mdn_core.fetch import Fetcher
+from mdn_core.pipeline import MDNPipeline
+from mdn_core.snapshot import SnapshotStore, _ZlibCodec, _zstd_available
+
+URL = "https://developer.mozilla.org/en-US/docs/Web/API/Fetch_API"
+
+
+def document(url=URL):
+    name = url.rsplit("/", 1)[-1]
+    return Document(url, name, "", f"The {name} provides an interface.\n" + "Shared navigation line\n" * 20)
+
+
+class _OtherCodec(_ZlibCodec):
+    """既定のコーデックが変わったことを模した、別のIDのコーデック"""
+    id = 99
+    name = "other"
+
+
+class CodecTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_blobs_are_read_with_the_codec_they_were_written_with(self):
+        store = SnapshotStore(self.directory, codec="zlib", train_samples=0)
+        store.put(URL, document())
+        store.close()
+
+        store = SnapshotStore(self.directory, codec="zlib", train_samples=0)
+        store.codec = _OtherCodec(6)
+        try:
+            self.assertEqual(store.get(URL).text, document().text)
+        finally:
+            store.close()
+
+    def test_trained_dictionary_of_previous_codec_is_used(self):
+        other = URL.replace("Fetch_API", "URL_API")
+        store = SnapshotStore(self.directory, codec="zlib", train_samples=0)
+        store.put(URL, document())
+        store.put(URL.replace("Fetch_API", "Streams_API"), document(URL.replace("Fetch_API", "Streams_API")))
+        self.assertEqual(store.train(), 1)
+        store.put(other, document(other))
+        store.close()
+
+        store = SnapshotStore(self.directory, codec="zlib", train_samples=0)
+        store.codec = _OtherCodec(6)
+        try:
+            self.assertEqual(store.get(other).text, document(other).text)
+        finally:
+            store.close()
+
+    @unittest.skipIf(_zstd_available(), "zstandard is installed")
+    def test_unavailable_codec_is_a_value_error(self):
+        store = SnapshotStore(self.directory, codec="zlib", train_samples=0)
+        store.put(URL, document())
+        ref = next(iter(store._blobs.values()))
+        ref.codec = 2
+        store._decoded.clear()
+        try:
+            with self.assertRaises(ValueError):
+                store.get(URL)
+        finally:
+            store.close()
+
+
+class CorruptSnapshotTest(unittest.TestCase):
+    def test_corrupt_blob_is_a_cache_miss(self):
+        with tempfile.TemporaryDirectory() as directory, StubUpstream(paragraphs=3) as upstream:
+            url = URL
+            store = SnapshotStore(directory, codec="zlib", train_samples=0)
+            pipeline = MDNPipeline(
+                fetcher=Fetcher(origin=upstream.origin, hedge=False),
+                cache=TTLCache(max_entries=16, ttl=60),
+                snapshots=store
+            )
+            try:
+                expected = pipeline.get_document(url).text
+                ref = next(iter(store._blobs.values()))
+                with open(os.path.join(directory, "blobs.dat"), "r+b") as f:
+                    f.seek(ref.end - ref.stored_len)
+                    f.write(b"\xff" * ref.stored_len)
+                store._decoded.clear()
+                pipeline.cache.clear()
+
+                self.assertEqual(pipeline.get_document(url).text, expected)
+            finally:
+                store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""Generic web scraper server"""
+
+import unittest
+from unittest import mock
+
+try:
+    import web_scraper_server
+except ImportError:
+    # requests, bs4 and modelcontextprotocol are optional
+    web_scraper_server = None
+
+URL = "https://example.com/"
+
+
+@unittest.skipIf(web_scraper_server is None, "web scraper dependencies are not installed")
+class ScrapeTest(unittest.TestCase):
+    def scrape(self, html, selector):
+        with mock.patch.object(web_scraper_server, "_download", return_value=html.encode()):
+            return web_scraper_server.scrape_website(URL, selector)
+
+    def test_nested_matches_keep_their_content(self):
+        result = self.scrape("<html><body><div><div>inner</div></div></body></html>", "div")
+        self.assertEqual(result["count"], 2)
+        self.assertEqual(result["results"][0], {"text": "inner", "html": "<div><div>inner</div></div>"})
+        self.assertEqual(result["results"][1], {"text": "inner", "html": "<div>inner</div>"})
+
+
+class _Response:
+    def __init__(self, chunks, headers=None):
+        self.chunks = chunks
+        self.headers = headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        return iter(self.chunks)
+
+
+@unittest.skipIf(web_scraper_server is None, "web scraper dependencies are not installed")
+class DownloadTest(unittest.TestCase):
+    def download(self, chunks, headers=None):
+        with mock.patch.object(web_scraper_server.requests, "get", return_value=_Response(chunks, headers)):
+            return web_scraper_server._download(URL, {})
+
+    def test_body_over_byte_cap_is_rejected(self):
+        with mock.patch.object(web_scraper_server, "MAX_RESPONSE_BYTES", 10):
+            with self.assertRaisesRegex(ValueError, "larger than 10 bytes"):
+                self.download([b"<p>hello</p>", b"<p>world</p>"])
+            with self.assertRaisesRegex(ValueError, "larger than 10 bytes"):
+                self.download([b"<p></p>"], {"Content-Length": "100"})
+            self.assertEqual(self.download([b"<p>hi</p>"]), b"<p>hi</p>")
+
+    def test_tags_split_across_chunks_are_counted(self):
+        with mock.patch.object(web_scraper_server, "MAX_ELEMENTS", 2):
+            self.assertEqual(self.download([b"<a><", b"b>"]), b"<a><b>")
+            with self.assertRaisesRegex(ValueError, "more than 2 elements"):
+                self.download([b"<a><", b"b><", b"c>"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,81 +1,52 @@
-import httpx
-from bs4 import BeautifulSoup
-import re
-from typing import Dict, Any, Optional
+import asyncio
+import sys
+from contextlib import nullcontext
+from typing import Optional
 
-async def fetch_mdn_doc(url: str) -> Optional[str]:
+from mdn_core import MDNError, get_pipeline
+from mdn_core.admission import QuotaExceededError, get_admission
+from mdn_core.prefetch import navigation
+from mdn_core.protocol import create_mdn_context
+from mdn_core.scheduler import INTERACTIVE, default_deadline, remaining
+
+__all__ = ["fetch_mdn_doc", "create_mdn_context"]
+
+async def fetch_mdn_doc(url: str, client: Optional[str] = None) -> Optional[str]:
     """
     MDNのドキュメントページを取得し、メインコンテンツを抽出する
-    
+
+    取得・キャッシュ・抽出は mdn_core のパイプラインで行います。
+    ブロッキングI/Oはワーカースレッドで実行し、イベントループを止めません。
+
     Args:
         url: MDNドキュメントのURL
-        
+        client: client_identity() の識別子（指定した場合はHTTPのエンドポイントと同じく
+            クライアントごとのクォータと公平なキューイングを通す）
+
     Returns:
         抽出されたドキュメントのテキスト内容、取得失敗時はNone
+
+    Raises:
+        QuotaExceededError: client を指定し、クォータを超えた場合
     """
-    # URLがMDNのものか確認
-    if not url.startswith("https://developer.mozilla.org/"):
-        return None
-    
+    # ワーカースレッドの空きを待つ時間も期限に含める
+    deadline = default_deadline(INTERACTIVE)
+    admission = get_admission() if client is not None else None
+    waiter = await admission.acquire_async(client, timeout=remaining(deadline)) if admission else None
+    sent = 0
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            
-            # BeautifulSoupでHTMLを解析
-            soup = BeautifulSoup(response.text, "html.parser")
-            
-            # メインコンテンツを抽出（MDNのメインコンテンツは通常article要素内にある）
-            main_content = soup.select_one("article.main-page-content")
-            if not main_content:
-                # 古いページやレイアウトが変わっている場合の対応
-                main_content = soup.select_one("main#content")
-            
-            if not main_content:
-                return None
-            
-            # 不要な要素を削除（ナビゲーション、広告など）
-            for element in main_content.select(".sidebar, .newsletter-container, .prevnext-container"):
-                element.decompose()
-            
-            # タイトルを取得
-            title = soup.select_one("h1").text.strip() if soup.select_one("h1") else "MDN Document"
-            
-            # メタ情報を取得
-            meta_desc = soup.select_one('meta[name="description"]')
-            description = meta_desc["content"] if meta_desc else ""
-            
-            # 整形された内容を返す
-            content = f"# {title}\n\n{description}\n\n{main_content.get_text(separator='\n', strip=True)}"
-            
-            # 余分な空行を削除
-            content = re.sub(r'\n{3,}', '\n\n', content)
-            
-            return content
-    
-    except Exception as e:
-        print(f"Error fetching MDN document: {e}")
+        # 先読みのページ遷移もクライアントごとに記録する（省略時は呼び出し元の設定を使う）
+        with navigation(client) if client is not None else nullcontext():
+            doc = await asyncio.to_thread(get_pipeline().get_document, url, INTERACTIVE, deadline)
+        content = doc.to_markdown()
+        sent = len(content.encode())
+        return content
+    except QuotaExceededError:
+        raise
+    except MDNError as e:
+        # stdio モードでは stdout がプロトコル用のため stderr に出力する
+        print(f"Error fetching MDN document: {e}", file=sys.stderr)
         return None
-
-def create_mdn_context(doc_content: str, url: str) -> Dict[str, Any]:
-    """
-    MCPに渡すためのコンテキスト辞書を作成
-    
-    Args:
-        doc_content: 抽出されたドキュメントのテキスト内容
-        url: 元のMDN URL
-        
-    Returns:
-        MCP用のコンテキスト辞書
-    """
-    # MDN URLからIDを生成
-    doc_id = url.split("/")[-1] if "/" in url else "mdn-doc"
-    
-    # MCPの標準フォーマットに合わせたコンテキスト構造
-    return {
-        "type": "mdn_document",
-        "url": url,
-        "content": doc_content,
-        "source": "Mozilla Developer Network (MDN)",
-        "instruction": "以下はMDNから取得したドキュメントです。開発者の質問に答える際にこの情報を参照してください。"
-    }
+    finally:
+        if waiter is not None:
+            admission.release(waiter, sent)
@@ -3,14 +3,29 @@ import requests
 from bs4 import BeautifulSoup
 import json
 import logging
+import re
+
+from mdn_core import config
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Size limits shared with the MDN pipeline (MDN_FETCH_MAX_BYTES, MDN_EXTRACT_MAX_ELEMENTS)
+MAX_RESPONSE_BYTES = config.FETCH_MAX_BYTES
+MAX_ELEMENTS = config.EXTRACT_MAX_ELEMENTS
+# Maximum number of selector matches returned in one response
+MAX_MATCHES = 200
+
+_START_TAG = re.compile(rb"<[A-Za-z]")
+
 def scrape_website(url, selector=None):
     """
     Scrape content from a website
-    
+
+    The response is streamed and rejected as soon as it exceeds MAX_RESPONSE_BYTES
+    or appears to contain more than MAX_ELEMENTS tags, so a huge page never gets
+    parsed into a DOM. The DOM is decomposed once the result is built.
+
     Args:
         url (str): The URL of the website to scrape
         selector (str, optional): CSS selector to target specific elements
@@ -18,27 +33,31 @@ def scrape_website(url, selector=None):
     Returns:
         dict: Scraped content
     """
+    soup = None
     try:
         # Set a user agent to avoid being blocked
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
         
-        # Make the request
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        
-        # Parse the HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
+        # Make the request, reading at most MAX_RESPONSE_BYTES of the body
+        body = _download(url, headers)
+
+        # Parse the HTML, then drop the raw bytes so only the DOM stays alive
+        soup = BeautifulSoup(body, 'html.parser')
+        del body
         
         # If a selector is provided, extract content from those elements
         if selector:
-            elements = soup.select(selector)
+            elements = soup.select(selector, limit=MAX_MATCHES + 1)
+            truncated = len(elements) > MAX_MATCHES
+            elements = elements[:MAX_MATCHES]
             
             # If multiple elements are selected, return an array of their text/html
             if len(elements) > 1:
                 results = []
                 
+                # Matches can be nested, so the tree is only freed after all of them are serialized
                 for element in elements:
                     results.append({
                         'text': element.get_text().strip(),
@@ -49,6 +68,7 @@ def scrape_website(url, selector=None):
                     'url': url,
                     'selector': selector,
                     'count': len(elements),
+                    'truncated': truncated,
                     'results': results
                 }
             
@@ -93,6 +113,39 @@ def scrape_website(url, selector=None):
             'success': False,
             'error': f"Failed to scrape {url}: {str(e)}"
         }
+    finally:
+        # Free the whole tree now instead of waiting for the garbage collector
+        if soup is not None:
+            soup.decompose()
+
+def _download(url, headers):
+    """
+    Download a page, enforcing the size limits while the body streams in
+
+    Raises:
+        ValueError: If the response is larger than MAX_RESPONSE_BYTES or has more than MAX_ELEMENTS tags
+        requests.RequestException: If the request fails
+    """
+    with requests.get(url, headers=headers, stream=True, timeout=config.FETCH_TIMEOUT) as response:
+        response.raise_for_status()  # Raise an exception for HTTP errors
+        declared = response.headers.get('Content-Length')
+        if declared and declared.isdigit() and int(declared) > MAX_RESPONSE_BYTES:
+            raise ValueError(f"Response is larger than {MAX_RESPONSE_BYTES} bytes")
+
+        body = bytearray()
+        tags = 0
+        tail = b''
+        for chunk in response.iter_content(64 * 1024):
+            body += chunk
+            if len(body) > MAX_RESPONSE_BYTES:
+                raise ValueError(f"Response is larger than {MAX_RESPONSE_BYTES} bytes")
+            # Count start tags as they arrive so a huge DOM is rejected before it is built.
+            # The last byte of the previous chunk is rescanned so a "<x" split across chunks still counts.
+            tags += len(_START_TAG.findall(tail + chunk))
+            tail = chunk[-1:] or tail
+            if tags > MAX_ELEMENTS:
+                raise ValueError(f"Page has more than {MAX_ELEMENTS} elements")
+        return bytes(body)
 
 def main():
     # Initialize the MCP Server